@@ -0,0 +1,83 @@
+"""
+Time to first message: the sequential first-load chain vs. POST /bootstrap.
+
+Seeds a database (benchmarks/seed_data.py) and, for a member of a workspace,
+times the four requests the UI used to make one after another (POST
+/users/me, GET /workspaces/my, GET /channels, GET /messages) against the
+single POST /bootstrap, in-process. Adds --rtt-ms per round trip to show
+what a high-latency link sees; SQL statements per load are counted too.
+
+Usage (from Backend/):
+    python benchmarks/bootstrap.py --rtt-ms 0 50 150 --iterations 200
+"""
+
+import argparse
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from fastapi.testclient import TestClient
+from sqlalchemy import event
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from seed_data import seed_database  # noqa: E402
+
+
+def sequential(client: TestClient, login):
+    user = client.post("/users/me", json=login).json()
+    workspaces = client.get("/workspaces/my", params={"user_id": user["id"]}).json()
+    channels = client.get("/channels", params={"workspace_id": workspaces[0]["id"]}).json()
+    return client.get("/messages", params={"channel_id": channels[0]["id"]}).json()
+
+
+def bootstrap(client: TestClient, login):
+    return client.post("/bootstrap", json=login).json()["page"]
+
+
+def run(rtts, iterations: int):
+    db_path = Path(tempfile.mkdtemp()) / "bootstrap.db"
+    seed_database(
+        db_path, users=200, workspaces=5, channels_per_workspace=10, messages_per_channel=500,
+    )
+    import main
+
+    statements = [0]
+    event.listen(
+        main.engine, "before_cursor_execute", lambda *args: statements.__setitem__(0, statements[0] + 1)
+    )
+    # user0 owns workspace0 (seed_data), so it has workspaces to load
+    login = {"name": "user0", "email": "user0@example.com"}
+
+    results = {}
+    with TestClient(main.app) as client:
+        user_id = client.post("/users/me", json=login).json()["id"]
+        assert sequential(client, login) == bootstrap(client, login)
+        for name, load, round_trips in (("sequential", sequential, 4), ("bootstrap", bootstrap, 1)):
+            statements[0] = 0
+            start = time.perf_counter()
+            for _ in range(iterations):
+                # Cold per-user cache, as on a first load
+                main.my_workspaces_cache.invalidate(user_id)
+                load(client, login)
+            elapsed = (time.perf_counter() - start) / iterations
+            results[name] = (elapsed, round_trips, statements[0] / iterations)
+
+    header = " ".join(f"{f'@{rtt:g}ms rtt':>12}" for rtt in rtts)
+    print(f"{'load':<12} {'round trips':>11} {'SQL':>5} {'server ms':>10} {header}")
+    for name, (elapsed, round_trips, sql) in results.items():
+        totals = " ".join(f"{elapsed * 1000 + round_trips * rtt:>10.1f}ms" for rtt in rtts)
+        print(f"{name:<12} {round_trips:>11} {sql:>5.0f} {elapsed * 1000:>10.2f} {totals}")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--rtt-ms", type=float, nargs="+", default=[0, 50, 150])
+    parser.add_argument("--iterations", type=int, default=200)
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    run(args.rtt_ms, args.iterations)
@@ -0,0 +1,122 @@
+"""
+Reconnect catch-up: reloading the channel vs. GET /channels/{id}/changes.
+
+Seeds a database (benchmarks/seed_data.py), records the channel's seq as a
+client would, applies a few changes (new messages, reaction toggles, pins)
+as if they happened during a network blip, then compares what the client
+downloads to catch up: the reload it used to do (GET /messages, one page or
+the whole history), the coalesced change feed, and the in-memory replay
+buffer that switch_channel serves on reconnect (None when it can't reach
+back far enough, with the default REPLAY_BUFFER_EVENTS).
+
+Usage (from Backend/):
+    python benchmarks/channel_resync.py --messages-per-channel 2000 --changes 5 20 100
+"""
+
+import argparse
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from fastapi.testclient import TestClient
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from seed_data import seed_database  # noqa: E402
+
+
+def timed_get(client: TestClient, url: str, **params):
+    start = time.perf_counter()
+    response = client.get(url, params=params)
+    response.raise_for_status()
+    return response, time.perf_counter() - start
+
+
+def full_history(client: TestClient, channel_id: str):
+    total_bytes, total_time, cursor = 0, 0.0, None
+    while True:
+        params = {"channel_id": channel_id, "limit": 200}
+        if cursor:
+            params["before"] = cursor
+        response, elapsed = timed_get(client, "/messages", **params)
+        total_bytes += len(response.content)
+        total_time += elapsed
+        cursor = response.json()["next_cursor"]
+        if not cursor:
+            return total_bytes, total_time
+
+
+def run(messages_per_channel: int, change_counts):
+    db_path = Path(tempfile.mkdtemp()) / "resync.db"
+    manifest = seed_database(
+        db_path, users=50, workspaces=1, channels_per_workspace=1,
+        messages_per_channel=messages_per_channel,
+    )
+    import main
+
+    workspace = manifest["workspaces"][0]
+    channel_id, members = workspace["channels"][0], workspace["members"]
+    rng = random.Random(3)
+
+    print(
+        f"{'changes':>8} {'reload page':>18} {'reload history':>18} "
+        f"{'changes feed':>18} {'replay buffer':>18}"
+    )
+    with TestClient(main.app) as client:
+        for count in change_counts:
+            page = client.get("/messages", params={"channel_id": channel_id}).json()
+            since = page["seq"]
+            recent = [m["id"] for m in page["messages"]]
+
+            for i in range(count):
+                kind = rng.choice(["message", "reaction", "reaction", "pin"])
+                if kind == "message":
+                    client.post(
+                        "/messages",
+                        json={"channel_id": channel_id, "user_id": rng.choice(members), "content": f"blip {i}"},
+                    )
+                elif kind == "reaction":
+                    client.post(
+                        "/reactions",
+                        json={"message_id": rng.choice(recent), "user_id": rng.choice(members), "emoji": "👍"},
+                    )
+                else:
+                    client.patch(
+                        f"/messages/{rng.choice(recent)}/pin",
+                        json={"is_pinned": True, "user_id": rng.choice(members)},
+                    )
+
+            reload, reload_time = timed_get(client, "/messages", channel_id=channel_id)
+            history_bytes, history_time = full_history(client, channel_id)
+            changes, changes_time = timed_get(
+                client, f"/channels/{channel_id}/changes", since=since
+            )
+            start = time.perf_counter()
+            missed = main.replay_buffer.events_after(channel_id, since)
+            replay_time = time.perf_counter() - start
+            replay = (
+                f"{sum(len(p.body) for _, p in missed) / 1024:>8.1f}KiB {replay_time * 1000:>5.2f}ms"
+                if missed is not None
+                else f"{'None':>18}"
+            )
+            print(
+                f"{count:>8} "
+                f"{len(reload.content) / 1024:>8.1f}KiB {reload_time * 1000:>5.1f}ms "
+                f"{history_bytes / 1024:>8.1f}KiB {history_time * 1000:>5.1f}ms "
+                f"{len(changes.content) / 1024:>8.1f}KiB {changes_time * 1000:>5.1f}ms "
+                f"{replay}"
+            )
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--messages-per-channel", type=int, default=2000)
+    parser.add_argument("--changes", type=int, nargs="+", default=[5, 20, 100])
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    run(args.messages_per_channel, args.changes)
@@ -0,0 +1,153 @@
+"""
+Engine profiles under concurrency: the default engine vs. the tuned SQLite profile.
+
+Seeds a SQLite file (benchmarks/seed_data.py) and copies it once per
+configuration: the "default" profile (rollback journal, SQLAlchemy defaults),
+"tuned" without the in-process writer queue (WAL, synchronous=NORMAL,
+busy_timeout) and "tuned" with it. --threads workers then run a mix of
+message page reads (load_message_page) and message inserts (insert_message)
+for --seconds against each engine built by build_engine. Reports throughput,
+read/write latency percentiles and "database is locked" failures.
+
+The Postgres profile (pool sizing, LIFO checkout, statement_timeout) needs a
+server and is not covered here.
+
+Usage (from Backend/):
+    python benchmarks/engine_profiles.py --threads 4 16 --write-ratio 0.2 --seconds 5
+"""
+
+import argparse
+import random
+import shutil
+import sqlite3
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import sessionmaker
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from seed_data import seed_database  # noqa: E402
+
+
+def percentile(samples, pct: float) -> float:
+    if not samples:
+        return 0.0
+    return statistics.quantiles(samples, n=100)[int(pct) - 1] if len(samples) > 1 else samples[0]
+
+
+def workload(main, session_factory, manifest, threads: int, write_ratio: float, seconds: float):
+    workspace = manifest["workspaces"][0]
+    channels, members = workspace["channels"], workspace["members"]
+    reads, writes, locked = [], [], [0]
+    lock = threading.Lock()
+    deadline = time.perf_counter() + seconds
+
+    def worker(seed: int):
+        rng = random.Random(seed)
+        my_reads, my_writes, my_locked = [], [], 0
+        while time.perf_counter() < deadline:
+            channel_id = rng.choice(channels)
+            write = rng.random() < write_ratio
+            start = time.perf_counter()
+            try:
+                with session_factory() as db:
+                    if write:
+                        main.insert_message(
+                            db,
+                            main.MessageCreate(
+                                channel_id=channel_id, user_id=rng.choice(members), content="load test"
+                            ),
+                        )
+                    else:
+                        main.load_message_page(db, channel_id)
+            except OperationalError as exc:
+                if "locked" not in str(exc):
+                    raise
+                my_locked += 1
+                continue
+            (my_writes if write else my_reads).append(time.perf_counter() - start)
+        with lock:
+            reads.extend(my_reads)
+            writes.extend(my_writes)
+            locked[0] += my_locked
+
+    workers = [threading.Thread(target=worker, args=(seed,)) for seed in range(threads)]
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    return reads, writes, locked[0]
+
+
+def sqlite_configs(db_path: Path):
+    """
+    (name, url, profile, writer queue) per configuration, each on its own copy
+    of the seeded file.
+    """
+    configs = []
+    for name, profile, queue in (
+        ("default", "default", False),
+        ("tuned, no writer queue", "tuned", False),
+        ("tuned", "tuned", True),
+    ):
+        copy = db_path.with_name(f"{profile}-{int(queue)}.db")
+        shutil.copy(db_path, copy)
+        if profile == "default":
+            # journal_mode=WAL is persistent in the file; put the copy back on
+            # the rollback journal an untuned engine would be running on
+            conn = sqlite3.connect(copy)
+            conn.execute("PRAGMA journal_mode=DELETE")
+            conn.close()
+        configs.append((name, f"sqlite:///{copy}", profile, queue))
+    return configs
+
+
+def run(thread_counts, write_ratio: float, seconds: float):
+    db_path = Path(tempfile.mkdtemp()) / "engines.db"
+    manifest = seed_database(
+        db_path, users=100, workspaces=1, channels_per_workspace=10, messages_per_channel=1000,
+    )
+    import main
+
+    main.engine.dispose()
+    configs = sqlite_configs(db_path)
+
+    print(f"write ratio {write_ratio:.0%}, {seconds:g}s per run")
+    print(
+        f"{'threads':>7} {'profile':<24} {'ops/s':>8} {'read p50':>9} {'read p99':>9} "
+        f"{'write p50':>10} {'write p99':>10} {'locked':>7}"
+    )
+    for threads in thread_counts:
+        for name, config_url, profile, queue in configs:
+            main.SQLITE_WRITER_QUEUE = queue
+            engine = main.build_engine(config_url, profile)
+            session_factory = sessionmaker(bind=engine, autoflush=False, autocommit=False)
+            reads, writes, locked = workload(
+                main, session_factory, manifest, threads, write_ratio, seconds
+            )
+            engine.dispose()
+            print(
+                f"{threads:>7} {name:<24} {(len(reads) + len(writes)) / seconds:>8.0f} "
+                f"{percentile(reads, 50) * 1000:>7.1f}ms {percentile(reads, 99) * 1000:>7.1f}ms "
+                f"{percentile(writes, 50) * 1000:>8.1f}ms {percentile(writes, 99) * 1000:>8.1f}ms "
+                f"{locked:>7}"
+            )
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--threads", type=int, nargs="+", default=[4, 16])
+    parser.add_argument("--write-ratio", type=float, default=0.2)
+    parser.add_argument("--seconds", type=float, default=5)
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    run(args.threads, args.write_ratio, args.seconds)
@@ -0,0 +1,131 @@
+"""
+History export/import: memory and throughput of the streaming NDJSON path.
+
+Seeds a database (benchmarks/seed_data.py) with one channel per history
+size and, for each, compares the peak Python memory (tracemalloc) of
+materializing the channel the way GET /messages serializes a page against
+streaming it with export_history (server-side cursor, EXPORT_BATCH rows at
+a time). The streaming peak should stay flat as the history grows. Then
+deletes the channel's messages and times POST /import/workspaces/{id}
+putting the gzip export back. Timings run under tracemalloc, so compare
+them with each other rather than with production numbers.
+
+Usage (from Backend/):
+    python benchmarks/history_export.py --sizes 5000 50000 --batch 1000
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+from fastapi.testclient import TestClient
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from seed_data import seed_database  # noqa: E402
+
+
+def peak_memory(fn):
+    tracemalloc.start()
+    start = time.perf_counter()
+    try:
+        result = fn()
+        return result, time.perf_counter() - start, tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def materialize(main, channel_id: str) -> int:
+    with main.SessionLocal() as db:
+        msgs = (
+            db.query(main.Message)
+            .filter(main.Message.channel_id == channel_id)
+            .order_by(main.Message.created_at, main.Message.id)
+            .all()
+        )
+        return len(main.dumps_json(main.serialize_messages(db, msgs)))
+
+
+def stream(main, channel_id: str) -> int:
+    return sum(len(chunk) for chunk in main.export_history([channel_id]))
+
+
+def trim_channel(main, channel_id: str, keep: int):
+    """
+    Delete all but the channel's `keep` oldest messages (and their reactions).
+    """
+    with main.SessionLocal() as db:
+        message_ids = [
+            message_id
+            for (message_id,) in db.query(main.Message.id)
+            .filter(main.Message.channel_id == channel_id)
+            .order_by(main.Message.created_at, main.Message.id)
+            .offset(keep)
+        ]
+    with main.engine.begin() as conn:
+        for offset in range(0, len(message_ids), 500):
+            chunk = message_ids[offset:offset + 500]
+            for table in (main.MessageReaction, main.MessageReactionCount, main.ChannelChange):
+                conn.execute(table.__table__.delete().where(table.message_id.in_(chunk)))
+            conn.execute(main.Message.__table__.delete().where(main.Message.id.in_(chunk)))
+
+
+def run(sizes, batch: int):
+    os.environ["ADMIN_TOKEN"] = os.environ.get("ADMIN_TOKEN") or "benchmark"
+    headers = {"X-Admin-Token": os.environ["ADMIN_TOKEN"]}
+    db_path = Path(tempfile.mkdtemp()) / "export.db"
+    manifest = seed_database(
+        db_path, users=200, workspaces=1, channels_per_workspace=len(sizes),
+        messages_per_channel=max(sizes),
+    )
+    workspace_id = manifest["workspaces"][0]["id"]
+    import main
+
+    main.EXPORT_BATCH = batch
+
+    print(f"EXPORT_BATCH={batch}")
+    print(
+        f"{'messages':>9} {'materialize peak':>17} {'stream peak':>12} "
+        f"{'stream msg/s':>13} {'gzip MiB':>9} {'import msg/s':>13}"
+    )
+    for size, channel_id in zip(sizes, manifest["workspaces"][0]["channels"]):
+        trim_channel(main, channel_id, size)
+
+        _, _, materialize_peak = peak_memory(lambda: materialize(main, channel_id))
+        _, stream_time, stream_peak = peak_memory(lambda: stream(main, channel_id))
+
+        with TestClient(main.app) as client:
+            exported = client.get(
+                f"/export/channels/{channel_id}", params={"gzip": True}, headers=headers
+            ).content
+            trim_channel(main, channel_id, 0)
+            start = time.perf_counter()
+            response = client.post(
+                f"/import/workspaces/{workspace_id}",
+                content=exported,
+                headers={**headers, "Content-Type": "application/gzip"},
+            )
+            import_time = time.perf_counter() - start
+            response.raise_for_status()
+            assert response.json()["messages"] == size
+
+        print(
+            f"{size:>9} {materialize_peak / 2**20:>15.1f}Mi {stream_peak / 2**20:>10.1f}Mi "
+            f"{size / stream_time:>13.0f} {len(exported) / 2**20:>9.2f} {size / import_time:>13.0f}"
+        )
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[5000, 50000])
+    parser.add_argument("--batch", type=int, default=1000, help="EXPORT_BATCH for the run")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    run(args.sizes, args.batch)
@@ -0,0 +1,333 @@
+"""
+Load test for the chat backend: HTTP + Socket.IO, with baseline comparison.
+
+Seeds a SQLite database (benchmarks/seed_data.py), starts `uvicorn main:app`
+on it (or targets --url), then runs --concurrency asyncio virtual users for
+--duration seconds. Each one picks operations from a fixed, seeded mix:
+
+    messages   GET  /messages (latest page, sometimes one page back)
+    send       POST /messages (delivery is timed on Socket.IO listeners)
+    react      POST /reactions
+    workspaces GET  /workspaces/my
+
+Reports p50/p95/p99 latency and throughput per operation and Socket.IO
+delivery latency. --save-baseline writes the results as JSON; --baseline
+compares against a stored run and exits non-zero when a latency percentile
+or throughput regresses by more than --tolerance.
+
+Needs httpx (pip install httpx). Usage (from Backend/):
+    python benchmarks/load_test.py --scale small --duration 20 --save-baseline baseline.json
+    python benchmarks/load_test.py --scale small --duration 20 --baseline baseline.json
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, List
+
+import httpx
+import socketio
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from seed_data import SCALES, seed_database  # noqa: E402
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+OPERATION_MIX = {"messages": 50, "send": 15, "react": 20, "workspaces": 15}
+
+
+def percentile(sorted_values: List[float], pct: float) -> float:
+    if not sorted_values:
+        return 0.0
+    rank = max(0, min(len(sorted_values) - 1, round(pct / 100 * len(sorted_values) + 0.5) - 1))
+    return sorted_values[rank]
+
+
+def summarize(latencies: List[float], duration: float, errors: int = 0) -> Dict[str, float]:
+    values = sorted(latencies)
+    return {
+        "count": len(values),
+        "errors": errors,
+        "throughput_rps": round(len(values) / duration, 2),
+        "p50_ms": round(percentile(values, 50) * 1000, 3),
+        "p95_ms": round(percentile(values, 95) * 1000, 3),
+        "p99_ms": round(percentile(values, 99) * 1000, 3),
+    }
+
+
+def start_server(db_path: Path, port: int) -> subprocess.Popen:
+    env = {**os.environ, "DATABASE_URL": f"sqlite:///{db_path}"}
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--log-level", "warning",
+         # Lingering Socket.IO long-polls would otherwise hold up shutdown
+         "--timeout-graceful-shutdown", "2"],
+        cwd=BACKEND_DIR,
+        env=env,
+        stdout=subprocess.DEVNULL,
+    )
+    for _ in range(100):
+        try:
+            httpx.get(f"http://127.0.0.1:{port}/", timeout=1)
+            return proc
+        except httpx.TransportError:
+            time.sleep(0.1)
+    proc.terminate()
+    raise RuntimeError("server did not start")
+
+
+class DeliveryListeners:
+    """
+    Socket.IO clients (polling transport, one thread each) joined to the
+    channels that receive POST /messages, recording delivery latency.
+    """
+
+    def __init__(self, url: str, channel_ids: List[str], count: int):
+        self.sent_at: Dict[str, float] = {}
+        self.latencies: List[float] = []
+        self.lock = threading.Lock()
+        self.clients = []
+        for i in range(count):
+            client = socketio.Client()
+            client.on("new-message", self.on_message)
+            client.connect(url, transports=["polling"], wait_timeout=10)
+            client.emit("join_channel", channel_ids[i % len(channel_ids)])
+            self.clients.append(client)
+
+    def on_message(self, data):
+        received = time.perf_counter()
+        with self.lock:
+            sent = self.sent_at.get(data.get("content"))
+            if sent is not None:
+                self.latencies.append(received - sent)
+
+    def close(self):
+        # abort: don't wait out each client's pending long-poll in turn
+        for client in self.clients:
+            client.eio.disconnect(abort=True)
+
+
+async def virtual_user(
+    index: int,
+    client: httpx.AsyncClient,
+    manifest: Dict[str, Any],
+    hot_channels: List[str],
+    listeners: DeliveryListeners,
+    deadline: float,
+    results: Dict[str, List[float]],
+    errors: Dict[str, int],
+    seed: int,
+):
+    rng = random.Random(seed * 1000 + index)
+    operations, weights = zip(*OPERATION_MIX.items())
+    sent = 0
+
+    while time.perf_counter() < deadline:
+        workspace = rng.choice(manifest["workspaces"])
+        user_id = rng.choice(workspace["members"])
+        operation = rng.choices(operations, weights)[0]
+        start = time.perf_counter()
+
+        if operation == "messages":
+            channel_id = rng.choice(workspace["channels"])
+            response = await client.get("/messages", params={"channel_id": channel_id})
+            cursor = response.json().get("next_cursor") if response.status_code == 200 else None
+            if cursor and rng.random() < 0.3:
+                response = await client.get(
+                    "/messages", params={"channel_id": channel_id, "before": cursor}
+                )
+        elif operation == "send":
+            content = f"load {index}-{sent}"
+            sent += 1
+            listeners.sent_at[content] = time.perf_counter()
+            response = await client.post(
+                "/messages",
+                json={"channel_id": rng.choice(hot_channels), "user_id": user_id, "content": content},
+            )
+        elif operation == "react":
+            page = await client.get(
+                "/messages", params={"channel_id": rng.choice(workspace["channels"]), "limit": 20}
+            )
+            messages = page.json().get("messages", [])
+            start = time.perf_counter()
+            if not messages:
+                continue
+            response = await client.post(
+                "/reactions",
+                json={
+                    "message_id": rng.choice(messages)["id"],
+                    "user_id": user_id,
+                    "emoji": rng.choice(["👍", "🎉", "🔥"]),
+                },
+            )
+        else:
+            response = await client.get("/workspaces/my", params={"user_id": user_id})
+
+        elapsed = time.perf_counter() - start
+        if response.status_code >= 400:
+            errors[operation] = errors.get(operation, 0) + 1
+        else:
+            results.setdefault(operation, []).append(elapsed)
+
+
+async def drive(url: str, manifest: Dict[str, Any], args) -> Dict[str, Any]:
+    rng = random.Random(args.seed)
+    all_channels = [c for w in manifest["workspaces"] for c in w["channels"]]
+    hot_channels = rng.sample(all_channels, min(len(all_channels), args.hot_channels))
+    listeners = DeliveryListeners(url, hot_channels, args.socket_clients)
+
+    results: Dict[str, List[float]] = {}
+    errors: Dict[str, int] = {}
+    limits = httpx.Limits(max_connections=args.concurrency)
+    try:
+        async with httpx.AsyncClient(base_url=url, limits=limits, timeout=30) as client:
+            # Warm-up: a few requests so imports, caches and pools are hot
+            for workspace in manifest["workspaces"][:5]:
+                await client.get("/messages", params={"channel_id": workspace["channels"][0]})
+
+            deadline = time.perf_counter() + args.duration
+            started = time.perf_counter()
+            await asyncio.gather(
+                *(
+                    virtual_user(
+                        i, client, manifest, hot_channels, listeners, deadline, results, errors, args.seed
+                    )
+                    for i in range(args.concurrency)
+                )
+            )
+            duration = time.perf_counter() - started
+        await asyncio.sleep(1)  # let the last socket deliveries land
+    finally:
+        listeners.close()
+
+    operations = {
+        operation: summarize(results.get(operation, []), duration, errors.get(operation, 0))
+        for operation in OPERATION_MIX
+    }
+    all_latencies = [value for values in results.values() for value in values]
+    delivery = summarize(listeners.latencies, duration)
+
+    return {
+        "environment": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "commit": git_commit(),
+        },
+        "config": {
+            "scale": manifest["scale"],
+            "seed": args.seed,
+            "concurrency": args.concurrency,
+            "duration": args.duration,
+            "socket_clients": args.socket_clients,
+            "hot_channels": len(hot_channels),
+            "mix": OPERATION_MIX,
+        },
+        "operations": operations,
+        "total": summarize(all_latencies, duration, sum(errors.values())),
+        "socket_delivery": delivery,
+    }
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR, text=True
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def print_report(report: Dict[str, Any]):
+    print(f"{'operation':<16} {'count':>7} {'err':>5} {'rps':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+    rows = [*report["operations"].items(), ("total", report["total"]), ("socket delivery", report["socket_delivery"])]
+    for name, s in rows:
+        print(
+            f"{name:<16} {s['count']:>7} {s['errors']:>5} {s['throughput_rps']:>9.1f} "
+            f"{s['p50_ms']:>9.2f} {s['p95_ms']:>9.2f} {s['p99_ms']:>9.2f}"
+        )
+
+
+def compare(report: Dict[str, Any], baseline: Dict[str, Any], tolerance: float) -> bool:
+    """
+    Print deltas against the baseline; True if nothing regressed beyond tolerance.
+    """
+    if baseline.get("config") != report["config"]:
+        print("⚠️  baseline was recorded with a different config; deltas are indicative only")
+
+    print(f"\n{'vs baseline':<16} {'rps':>9} {'p50':>10} {'p95':>10} {'p99':>10}")
+    ok = True
+    current_rows = {**report["operations"], "total": report["total"], "socket delivery": report["socket_delivery"]}
+    baseline_rows = {**baseline["operations"], "total": baseline["total"], "socket delivery": baseline["socket_delivery"]}
+    for name, current in current_rows.items():
+        previous = baseline_rows.get(name)
+        if not previous or not previous["count"]:
+            continue
+        cells = []
+        for key, higher_is_better in (("throughput_rps", True), ("p50_ms", False), ("p95_ms", False), ("p99_ms", False)):
+            delta = (current[key] - previous[key]) / previous[key] if previous[key] else 0.0
+            regressed = -delta > tolerance if higher_is_better else delta > tolerance
+            ok = ok and not regressed
+            cells.append(f"{delta:+8.1%}{'!' if regressed else ' '}")
+        print(f"{name:<16} " + " ".join(cells))
+    return ok
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--scale", choices=sorted(SCALES), default="small")
+    parser.add_argument("--db", type=Path, help="Reuse a database seeded by seed_data.py")
+    parser.add_argument("--url", help="Target a running server instead of starting one (needs --db's manifest)")
+    parser.add_argument("--port", type=int, default=8900)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--duration", type=float, default=20)
+    parser.add_argument("--socket-clients", type=int, default=20)
+    parser.add_argument("--hot-channels", type=int, default=10)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--save-baseline", type=Path)
+    parser.add_argument("--baseline", type=Path)
+    parser.add_argument("--tolerance", type=float, default=0.15)
+    parser.add_argument("--json", type=Path, help="Also write this run's report here")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+
+    if args.db and args.db.with_suffix(".manifest.json").exists():
+        manifest = json.loads(args.db.with_suffix(".manifest.json").read_text())
+        db_path = args.db
+    else:
+        db_path = args.db or Path(tempfile.mkdtemp()) / "load.db"
+        print(f"seeding {args.scale} dataset into {db_path} ...")
+        manifest = seed_database(db_path, **SCALES[args.scale], seed=args.seed)
+
+    server = None if args.url else start_server(db_path, args.port)
+    url = args.url or f"http://127.0.0.1:{args.port}"
+    try:
+        report = asyncio.run(drive(url, manifest, args))
+    finally:
+        if server:
+            server.terminate()
+            server.wait()
+
+    print_report(report)
+    for path in (args.json, args.save_baseline):
+        if path:
+            path.write_text(json.dumps(report, indent=2))
+
+    if args.baseline:
+        if not compare(report, json.loads(args.baseline.read_text()), args.tolerance):
+            sys.exit("performance regressed beyond tolerance")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+"""
+Message ids: random uuid4 vs. time-ordered UUIDv7 (Uuid7Generator).
+
+Creates the messages table with its indexes in a fresh SQLite file per
+scheme and inserts --messages rows in --batch sized transactions spread over
+--channels channels, minting ids as the rows arrive. Reports insert
+throughput and the size of each index (SQLite's dbstat).
+
+Usage (from Backend/):
+    python benchmarks/message_ids.py --messages 500000 --batch 1000
+"""
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+import uuid
+from datetime import datetime, timedelta
+from pathlib import Path
+
+from sqlalchemy import create_engine, text
+
+# Never touch the real database when importing the app
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import main  # noqa: E402
+
+
+def id_minter(scheme: str):
+    if scheme == "uuid7":
+        generator = main.Uuid7Generator()
+        return lambda at: generator.next(at)[0]
+    return lambda at: str(uuid.uuid4())
+
+
+def fill(scheme: str, messages: int, batch: int, channels: int):
+    engine = create_engine(f"sqlite:///{Path(tempfile.mkdtemp()) / 'ids.db'}")
+    main.Message.__table__.create(engine)
+    table = main.Message.__table__
+
+    rng = random.Random(1)
+    channel_ids = [str(uuid.UUID(int=rng.getrandbits(128), version=4)) for _ in range(channels)]
+    mint = id_minter(scheme)
+    start_time = datetime(2024, 1, 1)
+
+    started = time.perf_counter()
+    for offset in range(0, messages, batch):
+        rows = []
+        for k in range(offset, min(messages, offset + batch)):
+            created_at = start_time + timedelta(milliseconds=k * 7)
+            rows.append(
+                {
+                    "id": mint(created_at),
+                    "channel_id": rng.choice(channel_ids),
+                    "user_id": "u",
+                    "content": "x" * rng.randint(10, 120),
+                    "created_at": created_at,
+                    "is_pinned": False,
+                }
+            )
+        with engine.begin() as conn:
+            conn.execute(table.insert(), rows)
+    elapsed = time.perf_counter() - started
+
+    with engine.connect() as conn:
+        sizes = dict(
+            conn.execute(
+                text("SELECT name, SUM(pgsize) FROM dbstat WHERE name != 'messages' GROUP BY name")
+            ).all()
+        )
+    engine.dispose()
+    return messages / elapsed, sizes
+
+
+def run(messages: int, batch: int, channels: int):
+    results = {scheme: fill(scheme, messages, batch, channels) for scheme in ("uuid4", "uuid7")}
+    indexes = sorted(set(results["uuid4"][1]) - {"sqlite_schema"})
+
+    print(f"{messages} messages, {batch} per transaction, {channels} channels")
+    print(f"{'':<34} {'uuid4':>10} {'uuid7':>10}")
+    print(f"{'inserts/s':<34} {results['uuid4'][0]:>10.0f} {results['uuid7'][0]:>10.0f}")
+    for name in indexes:
+        before, after = (results[scheme][1].get(name, 0) / 2**20 for scheme in ("uuid4", "uuid7"))
+        print(f"{name + ' MiB':<34} {before:>10.2f} {after:>10.2f}")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--messages", type=int, default=200000)
+    parser.add_argument("--batch", type=int, default=1000)
+    parser.add_argument("--channels", type=int, default=50)
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    run(args.messages, args.batch, args.channels)
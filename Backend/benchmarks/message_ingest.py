@@ -0,0 +1,111 @@
+"""
+Message ingestion: per-request commits vs. group commit (MESSAGE_GROUP_COMMIT).
+
+Seeds a SQLite file database (benchmarks/seed_data.py), then has
+--concurrency senders POST /messages as fast as they can for --duration
+seconds, in-process over httpx's ASGI transport, once with a commit per
+message and once through MessageBatcher. Both modes acknowledge a message
+only after its transaction commits with the database's normal durability
+settings (SQLite's default synchronous=FULL rollback journal here), so the
+comparison is at equal durability. Reports messages/s, p50/p99 latency and
+the average batch size.
+
+Usage (from Backend/):
+    python benchmarks/message_ingest.py --concurrency 1 16 64 --duration 5
+"""
+
+import argparse
+import asyncio
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import httpx
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from seed_data import seed_database  # noqa: E402
+from load_test import percentile  # noqa: E402
+
+
+async def send_for(main, channel_ids, members, concurrency: int, duration: float):
+    latencies, errors = [], 0
+    transport = httpx.ASGITransport(app=main.fastapi_app)
+
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        deadline = time.perf_counter() + duration
+
+        async def sender(index: int):
+            nonlocal errors
+            sent = 0
+            while time.perf_counter() < deadline:
+                start = time.perf_counter()
+                response = await client.post(
+                    "/messages",
+                    json={
+                        "channel_id": channel_ids[index % len(channel_ids)],
+                        "user_id": members[index % len(members)],
+                        "content": f"ingest {index}-{sent}",
+                    },
+                )
+                sent += 1
+                if response.status_code == 200:
+                    latencies.append(time.perf_counter() - start)
+                else:
+                    errors += 1
+
+        started = time.perf_counter()
+        await asyncio.gather(*(sender(i) for i in range(concurrency)))
+        return sorted(latencies), errors, time.perf_counter() - started
+
+
+def batch_stats(main):
+    series = main.message_commit_batch_size._series.get((), [None, 0.0, 0])
+    return series[1], series[2]
+
+
+def run(concurrencies, duration: float, window_ms: float, max_batch: int):
+    db_path = Path(tempfile.mkdtemp()) / "ingest.db"
+    manifest = seed_database(
+        db_path, users=100, workspaces=1, channels_per_workspace=10, messages_per_channel=100,
+    )
+    import main
+
+    workspace = manifest["workspaces"][0]
+    print(f"group commit window {window_ms}ms, max batch {max_batch}")
+    print(
+        f"{'mode':<10} {'senders':>8} {'msg/s':>9} {'p50 ms':>8} {'p99 ms':>8} "
+        f"{'errors':>7} {'avg batch':>10}"
+    )
+    for concurrency in concurrencies:
+        for mode in ("per-request", "group"):
+            main.message_batcher = (
+                main.MessageBatcher(window_ms / 1000, max_batch) if mode == "group" else None
+            )
+            total_before, count_before = batch_stats(main)
+            latencies, errors, elapsed = asyncio.run(
+                send_for(main, workspace["channels"], workspace["members"], concurrency, duration)
+            )
+            total, count = batch_stats(main)
+            batches = count - count_before
+            avg_batch = (total - total_before) / batches if batches else 1.0
+            print(
+                f"{mode:<10} {concurrency:>8} {len(latencies) / elapsed:>9.0f} "
+                f"{percentile(latencies, 50) * 1000:>8.2f} {percentile(latencies, 99) * 1000:>8.2f} "
+                f"{errors:>7} {avg_batch:>10.1f}"
+            )
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 16, 64])
+    parser.add_argument("--duration", type=float, default=5)
+    parser.add_argument("--window-ms", type=float, default=0)
+    parser.add_argument("--max-batch", type=int, default=100)
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    run(args.concurrency, args.duration, args.window_ms, args.max_batch)
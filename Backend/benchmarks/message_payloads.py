@@ -0,0 +1,121 @@
+"""
+Message payload encoding: jsonable_encoder + stdlib JSON vs. serialize-once.
+
+"before" is what FastAPI and python-socketio did for a returned dict:
+jsonable_encoder, then JSONResponse's stdlib json.dumps for the HTTP body,
+and for broadcasts a second json.dumps inside the Socket.IO packet. "after"
+is FastJSONResponse for pages, and EncodedPayload encoded once and reused
+by both the response and the packet for POST /messages.
+
+Usage (from Backend/):
+    python benchmarks/message_payloads.py --page-sizes 50 200 --reactions 3
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+from pathlib import Path
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from socketio import packet
+
+# Never touch the real database when importing the app
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import main  # noqa: E402
+
+
+class StdlibPacket(packet.Packet):
+    """Socket.IO packet with the library's default JSON module."""
+
+    json = main.engineio_json
+
+
+def make_message(i: int, reactions: int) -> dict:
+    return {
+        "id": f"00000000-0000-4000-8000-{i:012d}",
+        "content": f"message {i}: the game plan for today's review — ship it 🚀",
+        "timestamp": "2025-01-01T12:00:00.000000",
+        "user": {
+            "id": f"10000000-0000-4000-8000-{i % 40:012d}",
+            "name": f"User {i % 40}",
+            "email": f"user{i % 40}@example.com",
+            "avatar": "",
+            "status": "online",
+        },
+        "reactions": [
+            {"emoji": emoji, "count": 2, "users": ["u1", "u2"]}
+            for emoji in ["👍", "🎉", "🔥", "❤️"][:reactions]
+        ],
+        "isPinned": False,
+        "pinnedBy": None,
+    }
+
+
+def timed(fn, iterations: int) -> float:
+    start = time.perf_counter()
+    for _ in range(iterations):
+        fn()
+    return (time.perf_counter() - start) / iterations
+
+
+def page_before(page):
+    return JSONResponse(jsonable_encoder(page)).body
+
+
+def page_after(page):
+    return main.FastJSONResponse(page).body
+
+
+def send_before(message):
+    body = JSONResponse(jsonable_encoder(message)).body
+    frame = StdlibPacket(packet.EVENT, data=["new-message", message]).encode()
+    return body, frame
+
+
+def send_after(message):
+    payload = main.EncodedPayload(message)
+    frame = main.sio.packet_class(packet.EVENT, data=["new-message", payload]).encode()
+    return main.FastJSONResponse(payload).body, frame
+
+
+def run(page_sizes, reactions: int, iterations: int):
+    print(f"encoder: {'orjson' if main.orjson is not None else 'stdlib json (orjson not installed)'}")
+    print(f"{'case':<22} {'before µs':>11} {'after µs':>11} {'speedup':>9}")
+
+    message = make_message(0, reactions)
+    # Same JSON either way (the stdlib packet escapes non-ASCII, orjson doesn't)
+    assert json.loads(send_before(message)[1][1:]) == json.loads(send_after(message)[1][1:])
+    before = timed(lambda: send_before(message), iterations)
+    after = timed(lambda: send_after(message), iterations)
+    print(f"{'POST /messages + emit':<22} {before * 1e6:>11.1f} {after * 1e6:>11.1f} {before / after:>8.1f}x")
+
+    for size in page_sizes:
+        page = {
+            "messages": [make_message(i, reactions) for i in range(size)],
+            "next_cursor": "MjAyNS0wMS0wMVQxMjowMDowMHwwMDAw",
+            "has_more": True,
+        }
+        assert page_before(page) == page_after(page)
+        n = max(1, iterations // size)
+        before = timed(lambda: page_before(page), n)
+        after = timed(lambda: page_after(page), n)
+        label = f"GET /messages ({size})"
+        print(f"{label:<22} {before * 1e6:>11.1f} {after * 1e6:>11.1f} {before / after:>8.1f}x")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--page-sizes", type=int, nargs="+", default=[50, 200])
+    parser.add_argument("--reactions", type=int, default=2, help="Distinct emojis per message")
+    parser.add_argument("--iterations", type=int, default=5000)
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    run(args.page_sizes, args.reactions, args.iterations)
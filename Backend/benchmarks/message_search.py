@@ -0,0 +1,133 @@
+"""
+Message search benchmark: indexed /search vs. scanning the channel with LIKE.
+
+Seeds a synthetic corpus (words drawn from a Zipf-like vocabulary, spread over
+a few workspaces and channels) into a temporary SQLite database, then times
+the FTS5-backed search_message_ids() against the LIKE scan a client-side
+search effectively amounts to.
+
+Usage (from Backend/):
+    python benchmarks/message_search.py --messages 1000000 --channels 200
+"""
+
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+import uuid
+from datetime import datetime, timedelta
+from pathlib import Path
+
+_db_file = Path(tempfile.mkdtemp()) / "bench.db"
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{_db_file}")
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from sqlalchemy import text  # noqa: E402
+
+import main  # noqa: E402
+
+VOCABULARY = [f"word{i}" for i in range(5000)]
+WEIGHTS = [1 / (rank + 1) for rank in range(len(VOCABULARY))]
+QUERIES = ["word3", "word42", "word512", "word4999", "word7 word90"]
+
+
+def seed(messages: int, channels: int, batch: int = 20000):
+    rng = random.Random(42)
+    channel_ids = [str(uuid.uuid4()) for _ in range(channels)]
+    workspace_ids = [str(uuid.uuid4()) for _ in range(max(1, channels // 20))]
+    start = datetime(2024, 1, 1)
+
+    main.init_db()
+    with main.engine.begin() as conn:
+        conn.execute(
+            main.Channel.__table__.insert(),
+            [
+                {"id": cid, "workspace_id": workspace_ids[i % len(workspace_ids)], "name": f"c{i}"}
+                for i, cid in enumerate(channel_ids)
+            ],
+        )
+
+    for offset in range(0, messages, batch):
+        rows = [
+            {
+                "id": str(uuid.uuid4()),
+                "channel_id": channel_ids[(offset + i) % channels],
+                "user_id": None,
+                "content": " ".join(rng.choices(VOCABULARY, WEIGHTS, k=rng.randint(4, 20))),
+                "created_at": start + timedelta(seconds=offset + i),
+                "is_pinned": False,
+            }
+            for i in range(min(batch, messages - offset))
+        ]
+        # The messages_fts triggers index every row as it is inserted
+        with main.engine.begin() as conn:
+            conn.execute(main.Message.__table__.insert(), rows)
+
+    return workspace_ids[0], channel_ids[0]
+
+
+def time_calls(fn, repeat: int):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings)
+
+
+def run(messages: int, channels: int, limit: int, repeat: int):
+    start = time.perf_counter()
+    workspace_id, channel_id = seed(messages, channels)
+    print(f"seeded {messages} messages in {time.perf_counter() - start:.1f}s ({_db_file})")
+
+    scopes = {
+        "channel": ("m.channel_id = :channel_id", {"channel_id": channel_id}),
+        "workspace": (
+            "m.channel_id IN (SELECT id FROM channels WHERE workspace_id = :workspace_id)",
+            {"workspace_id": workspace_id},
+        ),
+    }
+
+    print(f"{'query':<14} {'scope':<10} {'index (ms)':>11} {'LIKE scan (ms)':>15} {'speedup':>8}")
+    db = main.SessionLocal()
+    try:
+        for q in QUERIES:
+            for scope, (scope_sql, params) in scopes.items():
+                indexed = time_calls(
+                    lambda: main.search_message_ids(db, q, scope_sql, params, None, limit), repeat
+                )
+                like_sql = " AND ".join(f"m.content LIKE :t{i}" for i in range(len(q.split())))
+                like_params = {f"t{i}": f"%{t}%" for i, t in enumerate(q.split())}
+                scan = time_calls(
+                    lambda: db.execute(
+                        text(
+                            f"SELECT m.id FROM messages m WHERE {like_sql} AND {scope_sql} "
+                            "ORDER BY m.created_at DESC LIMIT :limit"
+                        ),
+                        {**params, **like_params, "limit": limit},
+                    ).all(),
+                    repeat,
+                )
+                print(
+                    f"{q:<14} {scope:<10} {indexed * 1000:>11.2f} {scan * 1000:>15.2f} "
+                    f"{scan / indexed if indexed else float('inf'):>7.1f}x"
+                )
+    finally:
+        db.close()
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--messages", type=int, default=200000)
+    parser.add_argument("--channels", type=int, default=200)
+    parser.add_argument("--limit", type=int, default=main.SEARCH_PAGE_SIZE)
+    parser.add_argument("--repeat", type=int, default=5)
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    run(args.messages, args.channels, args.limit, args.repeat)
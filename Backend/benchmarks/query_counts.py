@@ -0,0 +1,147 @@
+"""
+Statements per list request: fails if any grows with the page size.
+
+Seeds a database (benchmarks/seed_data.py) where every message has reactions
+and an attachment, then counts the SQL statements (before_cursor_execute)
+that each endpoint returning a list of messages runs for a page of 1 and a
+page of --page-size messages: GET /messages, GET /search and
+GET /channels/{id}/changes. Serialization loads authors and reactions for
+the whole page at once (serialize_messages), so the counts must be equal;
+the script exits with status 1 otherwise. Only statements run on behalf of
+a request (current_request_stats set) count, so background loops started
+with the app don't skew them.
+
+Usage (from Backend/):
+    python benchmarks/query_counts.py --page-size 50
+"""
+
+import argparse
+import collections
+import hashlib
+import sys
+import tempfile
+from pathlib import Path
+
+from fastapi.testclient import TestClient
+from sqlalchemy import event
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from seed_data import seed_database  # noqa: E402
+
+
+def attach_files(main, channel_id: str):
+    """
+    Link an attachment to every message of the channel (rows only; list
+    endpoints never read the blob).
+    """
+    sha256 = hashlib.sha256(b"query counts").hexdigest()
+    with main.engine.begin() as conn:
+        message_ids = [
+            message_id
+            for (message_id,) in conn.execute(
+                main.Message.__table__.select()
+                .with_only_columns(main.Message.id)
+                .where(main.Message.channel_id == channel_id)
+            )
+        ]
+        conn.execute(
+            main.AttachmentBlob.__table__.insert(),
+            [{"sha256": sha256, "size": 12, "ref_count": len(message_ids)}],
+        )
+        conn.execute(
+            main.Attachment.__table__.insert(),
+            [
+                {"id": main.new_id(), "sha256": sha256, "name": "notes.txt", "message_id": message_id}
+                for message_id in message_ids
+            ],
+        )
+
+
+def run(page_size: int) -> int:
+    db_path = Path(tempfile.mkdtemp()) / "counts.db"
+    manifest = seed_database(
+        db_path, users=50, workspaces=1, channels_per_workspace=1,
+        messages_per_channel=page_size * 4, reaction_ratio=1.0,
+    )
+    import main
+
+    channel_id = manifest["workspaces"][0]["channels"][0]
+    user_id = manifest["workspaces"][0]["members"][0]
+
+    with TestClient(main.app) as client:
+        # New messages (and reactions on them) for the change feed to page through
+        since = client.get("/messages", params={"channel_id": channel_id, "limit": 1}).json()["seq"]
+        new_messages = [
+            client.post(
+                "/messages", json={"channel_id": channel_id, "user_id": user_id, "content": f"count {i}"}
+            ).json()
+            for i in range(page_size)
+        ]
+        for message in new_messages:
+            client.post(
+                "/reactions", json={"message_id": message["id"], "user_id": user_id, "emoji": "🧮"}
+            )
+    attach_files(main, channel_id)
+
+    # The channel's most common word, so a search page can fill up
+    with main.engine.connect() as conn:
+        words = collections.Counter(
+            word
+            for (content,) in conn.execute(
+                main.Message.__table__.select()
+                .with_only_columns(main.Message.content)
+                .where(main.Message.channel_id == channel_id)
+            )
+            for word in set(content.split())
+        )
+    word = words.most_common(1)[0][0]
+
+    requests = {
+        "GET /messages": lambda limit: ("/messages", {"channel_id": channel_id, "limit": limit}),
+        "GET /search": lambda limit: (
+            "/search", {"q": word, "channel_id": channel_id, "limit": limit},
+        ),
+        "GET /channels/{id}/changes": lambda limit: (
+            f"/channels/{channel_id}/changes", {"since": since, "limit": limit},
+        ),
+    }
+
+    statements = [0]
+
+    def count(*args):
+        if main.current_request_stats.get() is not None:
+            statements[0] += 1
+
+    failures = 0
+    print(f"{'request':<28} {'1 message':>10} {f'{page_size} messages':>13}")
+    # Listening before startup: background loops may already be running queries
+    event.listen(main.engine, "before_cursor_execute", count)
+    with TestClient(main.app) as client:
+        for name, request in requests.items():
+            counts, sizes = [], []
+            for limit in (1, page_size):
+                url, params = request(limit)
+                statements[0] = 0
+                response = client.get(url, params=params)
+                response.raise_for_status()
+                counts.append(statements[0])
+                sizes.append(len(response.json()["messages"]))
+            if sizes != [1, page_size]:
+                raise SystemExit(f"{name}: expected pages of 1 and {page_size}, got {sizes}")
+            failures += counts[0] != counts[1]
+            flag = "" if counts[0] == counts[1] else "  FAIL: grows with the page"
+            print(f"{name:<28} {counts[0]:>10} {counts[1]:>13}{flag}")
+    event.remove(main.engine, "before_cursor_execute", count)
+
+    return 1 if failures else 0
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--page-size", type=int, default=50)
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    sys.exit(run(parse_args().page_size))
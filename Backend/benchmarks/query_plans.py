@@ -0,0 +1,153 @@
+"""
+Query plans of the hot request paths: fails if any of them scans a whole table.
+
+Seeds a database (benchmarks/seed_data.py), migrated to head, and drives the
+requests every client makes through the app in-process: the first-load chain
+(/users/me, /workspaces/my, /channels, /messages), joining a workspace,
+creating a channel under an existing name, toggling a reaction, the change
+feed and sending a message. Every statement they run is captured and put
+through EXPLAIN QUERY PLAN; a plan step that scans a table rather than
+searching one of its indexes is reported, and the script exits with status 1.
+
+Usage (from Backend/):
+    python benchmarks/query_plans.py --verbose
+"""
+
+import argparse
+import sys
+import tempfile
+from pathlib import Path
+
+from fastapi.testclient import TestClient
+from sqlalchemy import event
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from seed_data import seed_database  # noqa: E402
+
+
+def hot_paths(main, client: TestClient, manifest):
+    """
+    (name, request) pairs; each request runs against the seeded data.
+    """
+    workspace = manifest["workspaces"][0]
+    channel_id, members = workspace["channels"][0], workspace["members"]
+    login = {"name": "user0", "email": "user0@example.com"}
+    user_id = client.post("/users/me", json=login).json()["id"]
+    invite_code = client.get(f"/workspaces/{workspace['id']}").json()["invite_code"]
+    page = client.get("/messages", params={"channel_id": channel_id}).json()
+    message_id = page["messages"][-1]["id"]
+    channel_name = client.get("/channels", params={"workspace_id": workspace["id"]}).json()[0]["name"]
+
+    def my_workspaces():
+        # Cold per-user cache, so the query runs
+        main.my_workspaces_cache.invalidate(user_id)
+        return client.get("/workspaces/my", params={"user_id": user_id})
+
+    return [
+        ("POST /users/me", lambda: client.post("/users/me", json=login)),
+        ("GET /workspaces/my", my_workspaces),
+        ("GET /channels", lambda: client.get("/channels", params={"workspace_id": workspace["id"]})),
+        ("GET /messages", lambda: client.get("/messages", params={"channel_id": channel_id})),
+        (
+            "GET /messages?before=",
+            lambda: client.get(
+                "/messages", params={"channel_id": channel_id, "before": page["next_cursor"]}
+            ),
+        ),
+        (
+            "POST /workspaces/join",
+            lambda: client.post(
+                "/workspaces/join", json={"invite_code": invite_code, "user_id": members[1]}
+            ),
+        ),
+        (
+            "POST /channels (existing name)",
+            lambda: client.post(
+                "/channels", json={"workspace_id": workspace["id"], "name": channel_name}
+            ),
+        ),
+        (
+            "POST /reactions",
+            lambda: client.post(
+                "/reactions", json={"message_id": message_id, "user_id": members[1], "emoji": "👍"}
+            ),
+        ),
+        (
+            "GET /channels/{id}/changes",
+            lambda: client.get(f"/channels/{channel_id}/changes", params={"since": page["seq"]}),
+        ),
+        (
+            "POST /messages",
+            lambda: client.post(
+                "/messages",
+                json={"channel_id": channel_id, "user_id": members[1], "content": "plan check"},
+            ),
+        ),
+    ]
+
+
+def table_scans(plan) -> list:
+    """
+    Plan steps that read a whole table: "SCAN <table>" without an index.
+    Scans of subquery results and constant rows are not table reads.
+    """
+    return [
+        detail
+        for detail in plan
+        if detail.startswith("SCAN ")
+        and " USING " not in detail
+        and not detail.startswith(("SCAN CONSTANT ROW", "SCAN (subquery"))
+    ]
+
+
+def run(verbose: bool) -> int:
+    db_path = Path(tempfile.mkdtemp()) / "plans.db"
+    manifest = seed_database(
+        db_path, users=200, workspaces=5, channels_per_workspace=10, messages_per_channel=500,
+    )
+    import main
+
+    statements = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        if not executemany and statement.lstrip().upper().startswith(("SELECT", "UPDATE", "DELETE")):
+            statements.append((statement, parameters))
+
+    failures = 0
+    with TestClient(main.app) as client:
+        paths = hot_paths(main, client, manifest)
+        event.listen(main.engine, "before_cursor_execute", capture)
+        for name, request in paths:
+            statements.clear()
+            # Creating a channel under an existing name is a 400 by design
+            assert request().status_code < 500, name
+            captured = list(statements)
+
+            with main.engine.connect() as conn:
+                for statement, parameters in captured:
+                    plan = [
+                        row[-1]
+                        for row in conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {statement}", parameters)
+                    ]
+                    scans = table_scans(plan)
+                    failures += bool(scans)
+                    if scans or verbose:
+                        print(f"{'FAIL' if scans else 'ok':<5} {name}")
+                        print("      " + " ".join(statement.split())[:160])
+                        for detail in plan:
+                            print(f"        {detail}")
+        event.remove(main.engine, "before_cursor_execute", capture)
+
+    print(f"{failures} statement(s) scan a whole table" if failures else "all hot-path statements use an index")
+    return 1 if failures else 0
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--verbose", action="store_true", help="print every plan, not only failures")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    sys.exit(run(parse_args().verbose))
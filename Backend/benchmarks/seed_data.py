@@ -0,0 +1,205 @@
+"""
+Synthetic chat data generator for load tests and benchmarks.
+
+Seeds users, workspaces (with memberships), channels, messages and reactions
+into a SQLite database through the app's own schema, deterministically for a
+given --seed. Writes a manifest (JSON) next to the database with the ids the
+load driver needs.
+
+Usage (from Backend/):
+    python benchmarks/seed_data.py --db /tmp/load.db --users 500 --workspaces 20 \
+        --channels-per-workspace 10 --messages-per-channel 2000
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+import time
+import uuid
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Any, Dict
+
+SCALES = {
+    "small": dict(users=100, workspaces=5, channels_per_workspace=5, messages_per_channel=200),
+    "medium": dict(users=500, workspaces=20, channels_per_workspace=10, messages_per_channel=2000),
+    "large": dict(users=2000, workspaces=50, channels_per_workspace=20, messages_per_channel=10000),
+}
+
+EMOJIS = ["👍", "🎉", "❤️", "😂", "🔥", "👀"]
+WORDS = (
+    "the game plan meeting today tomorrow review ship deploy fix bug design sync "
+    "standup notes doc update team launch ready blocked done thanks please check"
+).split()
+
+
+def uid(rng: random.Random) -> str:
+    return str(uuid.UUID(int=rng.getrandbits(128), version=4))
+
+
+def seed_database(
+    db_path: Path,
+    users: int,
+    workspaces: int,
+    channels_per_workspace: int,
+    messages_per_channel: int,
+    members_per_workspace: int = 50,
+    reaction_ratio: float = 0.2,
+    seed: int = 1,
+    batch: int = 20000,
+) -> Dict[str, Any]:
+    """
+    Create a fresh database at db_path and fill it. Returns the manifest.
+    """
+    if db_path.exists():
+        db_path.unlink()
+    os.environ["DATABASE_URL"] = f"sqlite:///{db_path}"
+    sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+    import main
+
+    main.init_db()
+    rng = random.Random(seed)
+    start = datetime(2024, 1, 1)
+    user_ids = [uid(rng) for _ in range(users)]
+    workspace_ids = [uid(rng) for _ in range(workspaces)]
+    channels: Dict[str, list] = {}
+    members: Dict[str, list] = {}
+
+    with main.engine.begin() as conn:
+        conn.execute(
+            main.User.__table__.insert(),
+            [
+                {"id": u, "name": f"user{i}", "email": f"user{i}@example.com", "status": "online"}
+                for i, u in enumerate(user_ids)
+            ],
+        )
+        conn.execute(
+            main.Workspace.__table__.insert(),
+            [
+                {
+                    "id": w,
+                    "name": f"workspace{i}",
+                    "owner_id": user_ids[i % users],
+                    "is_personal": False,
+                    "invite_code": f"INV{i:07d}",
+                }
+                for i, w in enumerate(workspace_ids)
+            ],
+        )
+
+        member_rows, channel_rows = [], []
+        for i, w in enumerate(workspace_ids):
+            owner = user_ids[i % users]
+            others = rng.sample(user_ids, min(users, members_per_workspace))
+            members[w] = [owner] + [u for u in others if u != owner]
+            member_rows += [
+                {"workspace_id": w, "user_id": u, "role": "owner" if u == owner else "member"}
+                for u in members[w]
+            ]
+            channels[w] = [uid(rng) for _ in range(channels_per_workspace)]
+            channel_rows += [
+                {"id": c, "workspace_id": w, "name": f"channel{j}", "is_private": False}
+                for j, c in enumerate(channels[w])
+            ]
+        conn.execute(main.WorkspaceMember.__table__.insert(), member_rows)
+        conn.execute(main.Channel.__table__.insert(), channel_rows)
+
+    message_rows, reaction_rows, counts = [], [], {}
+
+    def flush():
+        with main.engine.begin() as conn:
+            if message_rows:
+                conn.execute(main.Message.__table__.insert(), message_rows)
+            if reaction_rows:
+                conn.execute(main.MessageReaction.__table__.insert(), reaction_rows)
+        message_rows.clear()
+        reaction_rows.clear()
+
+    for w in workspace_ids:
+        for c in channels[w]:
+            for k in range(messages_per_channel):
+                message_id = uid(rng)
+                message_rows.append(
+                    {
+                        "id": message_id,
+                        "channel_id": c,
+                        "user_id": rng.choice(members[w]),
+                        "content": " ".join(rng.choices(WORDS, k=rng.randint(3, 25))),
+                        "created_at": start + timedelta(seconds=k * 30),
+                        "is_pinned": False,
+                    }
+                )
+                if rng.random() < reaction_ratio:
+                    for user_id in rng.sample(members[w], min(len(members[w]), rng.randint(1, 4))):
+                        emoji = rng.choice(EMOJIS)
+                        reaction_rows.append(
+                            {"message_id": message_id, "user_id": user_id, "emoji": emoji}
+                        )
+                        counts[(message_id, emoji)] = counts.get((message_id, emoji), 0) + 1
+                if len(message_rows) >= batch:
+                    flush()
+    flush()
+
+    with main.engine.begin() as conn:
+        rows = [{"message_id": m, "emoji": e, "count": n} for (m, e), n in counts.items()]
+        for offset in range(0, len(rows), batch):
+            conn.execute(main.MessageReactionCount.__table__.insert(), rows[offset:offset + batch])
+
+    main.engine.dispose()
+
+    manifest = {
+        "db": str(db_path),
+        "seed": seed,
+        "scale": {
+            "users": users,
+            "workspaces": workspaces,
+            "channels_per_workspace": channels_per_workspace,
+            "messages_per_channel": messages_per_channel,
+            "members_per_workspace": members_per_workspace,
+            "reaction_ratio": reaction_ratio,
+        },
+        "workspaces": [
+            {"id": w, "channels": channels[w], "members": members[w]} for w in workspace_ids
+        ],
+    }
+    db_path.with_suffix(".manifest.json").write_text(json.dumps(manifest))
+    return manifest
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--db", type=Path, default=Path("/tmp/gameplan-load.db"))
+    parser.add_argument("--scale", choices=sorted(SCALES), help="Preset; explicit flags override it")
+    parser.add_argument("--users", type=int)
+    parser.add_argument("--workspaces", type=int)
+    parser.add_argument("--channels-per-workspace", type=int)
+    parser.add_argument("--messages-per-channel", type=int)
+    parser.add_argument("--members-per-workspace", type=int, default=50)
+    parser.add_argument("--reaction-ratio", type=float, default=0.2)
+    parser.add_argument("--seed", type=int, default=1)
+    return parser.parse_args()
+
+
+def scale_from_args(args) -> Dict[str, int]:
+    scale = dict(SCALES[args.scale or "small"])
+    for key in scale:
+        if getattr(args, key) is not None:
+            scale[key] = getattr(args, key)
+    return scale
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    started = time.perf_counter()
+    manifest = seed_database(
+        args.db,
+        **scale_from_args(args),
+        members_per_workspace=args.members_per_workspace,
+        reaction_ratio=args.reaction_ratio,
+        seed=args.seed,
+    )
+    scale = manifest["scale"]
+    total = scale["workspaces"] * scale["channels_per_workspace"] * scale["messages_per_channel"]
+    print(f"seeded {total} messages into {args.db} in {time.perf_counter() - started:.1f}s")
@@ -0,0 +1,112 @@
+"""
+Event-loop latency under a slow database.
+
+Fires concurrent POST /messages requests while every commit is artificially
+delayed, and samples how late a periodic timer on the event loop fires. That
+lag is what every Socket.IO connection on the worker experiences.
+
+Runs twice: once with DB work inline on the loop (the old behaviour) and once
+through run_db()'s bounded executor.
+
+Usage (from Backend/):
+    python benchmarks/slow_db_latency.py --requests 50 --commit-delay 0.05
+"""
+
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+_db_file = Path(tempfile.mkdtemp()) / "bench.db"
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{_db_file}")
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import httpx  # noqa: E402
+from sqlalchemy import event  # noqa: E402
+
+import main  # noqa: E402
+
+
+async def run_inline(fn, *args):
+    """The pre-executor behaviour: blocking Session calls on the loop."""
+    db = main.SessionLocal()
+    try:
+        return fn(db, *args)
+    finally:
+        db.close()
+
+
+async def sample_loop_lag(stop: asyncio.Event, interval: float = 0.005):
+    lags = []
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(interval)
+        lags.append(time.perf_counter() - start - interval)
+    return lags
+
+
+async def scenario(run_db, requests: int, channel_id: str, user_id: str):
+    main.run_db = run_db
+    stop = asyncio.Event()
+    sampler = asyncio.create_task(sample_loop_lag(stop))
+
+    transport = httpx.ASGITransport(app=main.fastapi_app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        start = time.perf_counter()
+        await asyncio.gather(
+            *(
+                client.post(
+                    "/messages",
+                    json={"channel_id": channel_id, "user_id": user_id, "content": f"m{i}"},
+                )
+                for i in range(requests)
+            )
+        )
+        elapsed = time.perf_counter() - start
+
+    stop.set()
+    lags = sorted(await sampler)
+    return elapsed, lags
+
+
+def report(name: str, elapsed: float, lags):
+    p99 = lags[int(len(lags) * 0.99) - 1] if lags else 0.0
+    print(
+        f"{name:<10} total {elapsed:6.2f}s  loop lag p50 {statistics.median(lags) * 1000:7.1f}ms  "
+        f"p99 {p99 * 1000:7.1f}ms  max {lags[-1] * 1000:7.1f}ms"
+    )
+
+
+async def run(requests: int, commit_delay: float):
+    main.init_db()
+    db = main.SessionLocal()
+    db.add_all(
+        [
+            main.User(id="bench-user", name="bench", email="bench@example.com"),
+            main.Channel(id="bench-channel", workspace_id=None, name="bench"),
+        ]
+    )
+    db.commit()
+    db.close()
+
+    event.listen(main.engine, "commit", lambda conn: time.sleep(commit_delay))
+
+    executor_run_db = main.run_db
+    report("inline", *await scenario(run_inline, requests, "bench-channel", "bench-user"))
+    report("executor", *await scenario(executor_run_db, requests, "bench-channel", "bench-user"))
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--requests", type=int, default=50)
+    parser.add_argument("--commit-delay", type=float, default=0.05)
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    asyncio.run(run(args.requests, args.commit_delay))
@@ -0,0 +1,83 @@
+"""
+Socket.IO fan-out benchmark: cost of one "new-message" emit vs. connected clients.
+
+Compares the old global broadcast with the channel-room emit used by
+create_message. Clients are registered directly with the Socket.IO manager
+and Engine.IO delivery is stubbed out, so the numbers isolate server-side
+fan-out work (participant lookup + per-recipient send tasks).
+
+Usage (from Backend/):
+    python benchmarks/socket_fanout.py --clients 100 1000 5000 --channels 50
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import time
+from pathlib import Path
+
+# Never touch the real database when importing the app
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import main  # noqa: E402
+
+PAYLOAD = {
+    "id": "bench",
+    "content": "hello world",
+    "timestamp": "2025-01-01T00:00:00",
+    "user": None,
+    "reactions": [],
+    "isPinned": False,
+    "pinnedBy": None,
+}
+
+
+async def setup_clients(total: int, channels: int) -> int:
+    sent = 0
+
+    async def send_packet(eio_sid, pkt):
+        nonlocal sent
+        sent += 1
+
+    main.sio.eio.send_packet = send_packet
+    for i in range(total):
+        sid = await main.sio.manager.connect(f"eio-{i}", "/")
+        await main.sio.enter_room(sid, main.channel_room(f"ch-{i % channels}"))
+    return total
+
+
+async def time_emit(room, iterations: int) -> float:
+    start = time.perf_counter()
+    for _ in range(iterations):
+        await main.sio.emit("new-message", PAYLOAD, room=room)
+    return (time.perf_counter() - start) / iterations
+
+
+async def run(clients, channels: int, iterations: int):
+    print(f"{'clients':>8} {'broadcast (ms)':>15} {'room (ms)':>10} {'speedup':>8}")
+    for total in clients:
+        main.sio.manager.rooms.clear()
+        main.sio.manager.eio_to_sid.clear()
+        await setup_clients(total, channels)
+
+        broadcast = await time_emit(None, iterations)
+        room = await time_emit(main.channel_room("ch-0"), iterations)
+        print(
+            f"{total:>8} {broadcast * 1000:>15.3f} {room * 1000:>10.3f} "
+            f"{broadcast / room if room else float('inf'):>7.1f}x"
+        )
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--clients", type=int, nargs="+", default=[100, 1000, 5000])
+    parser.add_argument("--channels", type=int, default=50)
+    parser.add_argument("--iterations", type=int, default=20)
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    asyncio.run(run(args.clients, args.channels, args.iterations))
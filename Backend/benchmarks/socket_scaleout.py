@@ -0,0 +1,138 @@
+"""
+Cross-worker Socket.IO delivery: post on one worker, receive on another.
+
+Starts N uvicorn processes of main:app on consecutive ports, sharing one
+SQLite database and a SOCKETIO_MESSAGE_QUEUE (local:// Unix sockets by
+default, so no broker is needed). A Socket.IO client joins a channel room on
+every worker; messages are POSTed round-robin and each client must receive
+every "new-message", whichever worker handled the POST. Exits non-zero on a
+missing delivery, and reports cross-worker delivery latency.
+
+Usage (from Backend/):
+    python benchmarks/socket_scaleout.py --workers 2 --messages 200
+    python benchmarks/socket_scaleout.py --queue redis://localhost:6379/0
+"""
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+import requests
+import socketio
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+
+
+def wait_until_up(url: str):
+    for _ in range(100):
+        try:
+            requests.get(url, timeout=1)
+            return
+        except requests.ConnectionError:
+            time.sleep(0.1)
+    raise RuntimeError(f"worker at {url} did not start")
+
+
+def start_workers(count: int, base_port: int, queue: str, database_url: str):
+    env = {**os.environ, "DATABASE_URL": database_url, "SOCKETIO_MESSAGE_QUEUE": queue}
+    workers, urls = [], []
+    # One at a time: the first worker creates the SQLite schema on import
+    for i in range(count):
+        workers.append(
+            subprocess.Popen(
+                [sys.executable, "-m", "uvicorn", "main:app", "--port", str(base_port + i)],
+                cwd=BACKEND_DIR,
+                env=env,
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.DEVNULL,
+            )
+        )
+        urls.append(f"http://127.0.0.1:{base_port + i}")
+        wait_until_up(urls[-1])
+    return workers, urls
+
+
+def seed(url: str):
+    user = requests.post(f"{url}/users/me", json={"name": "bench", "email": "bench@example.com"}).json()
+    workspace = requests.get(f"{url}/workspaces/my", params={"user_id": user["id"]}).json()[0]
+    channel = requests.post(
+        f"{url}/channels", json={"workspace_id": workspace["id"], "name": "scaleout"}
+    ).json()
+    return user["id"], channel["id"]
+
+
+class Listener:
+    def __init__(self, url: str, channel_id: str):
+        self.received = {}
+        self.lock = threading.Lock()
+        self.client = socketio.Client()
+        self.client.on("new-message", self.on_message)
+        self.client.connect(url, transports=["polling"], wait_timeout=10)
+        self.client.emit("join_channel", channel_id)
+
+    def on_message(self, data):
+        with self.lock:
+            self.received[data["content"]] = time.perf_counter()
+
+
+def run(workers: int, messages: int, base_port: int, queue: str):
+    database_url = f"sqlite:///{Path(tempfile.mkdtemp()) / 'bench.db'}"
+    procs, urls = start_workers(workers, base_port, queue, database_url)
+    try:
+        user_id, channel_id = seed(urls[0])
+        listeners = [Listener(url, channel_id) for url in urls]
+        time.sleep(0.5)  # let room joins settle
+
+        sent = {}
+        for i in range(messages):
+            content = f"m{i}"
+            sent[content] = time.perf_counter()
+            requests.post(
+                f"{urls[i % workers]}/messages",
+                json={"channel_id": channel_id, "user_id": user_id, "content": content},
+                timeout=10,
+            ).raise_for_status()
+
+        deadline = time.time() + 10
+        while time.time() < deadline and any(len(l.received) < messages for l in listeners):
+            time.sleep(0.05)
+
+        failed = False
+        for worker, listener in enumerate(listeners):
+            missing = messages - len(listener.received)
+            latencies = sorted(listener.received[c] - sent[c] for c in listener.received)
+            p95 = latencies[int(len(latencies) * 0.95) - 1] if latencies else 0.0
+            print(
+                f"client on worker {worker}: {len(listener.received)}/{messages} delivered  "
+                f"latency p50 {statistics.median(latencies or [0]) * 1000:6.1f}ms  "
+                f"p95 {p95 * 1000:6.1f}ms"
+            )
+            failed = failed or missing > 0
+            listener.client.disconnect()
+
+        if failed:
+            sys.exit("messages were not delivered across workers")
+    finally:
+        for proc in procs:
+            proc.terminate()
+            proc.wait()
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--messages", type=int, default=200)
+    parser.add_argument("--port", type=int, default=8100)
+    parser.add_argument("--queue", default=f"local://{tempfile.mkdtemp()}")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    run(args.workers, args.messages, args.port, args.queue)
@@ -0,0 +1,131 @@
+"""
+Typing storm: Socket.IO frames sent for typing indicators, before vs. after coalescing.
+
+Simulates `typists` users spread over `channels` channel rooms (each room also
+holding `watchers` idle clients), every typist sending a "typing" event per
+keystroke in bursts. "before" relays every keystroke to the room (the old
+handler); "after" feeds the same events to TypingTracker and emits its
+snapshots every TYPING_FLUSH_INTERVAL. Time is simulated, so the run is fast
+and deterministic; Engine.IO delivery is stubbed out and counted.
+
+Usage (from Backend/):
+    python benchmarks/typing_storm.py --typists 300 --channels 20 --seconds 30
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import sys
+from pathlib import Path
+
+# Never touch the real database when importing the app
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import main  # noqa: E402
+
+
+def keystroke_events(typists: int, channels: int, seconds: float, cps: float):
+    """
+    (time, typist, channel) per keystroke: typists alternate bursts of
+    typing at `cps` characters per second with pauses.
+    """
+    rng = random.Random(7)
+    events = []
+    for typist in range(typists):
+        channel = typist % channels
+        t = rng.uniform(0, 3)
+        while t < seconds:
+            burst_end = min(seconds, t + rng.uniform(2, 8))
+            while t < burst_end:
+                events.append((t, typist, channel))
+                t += rng.expovariate(cps)
+            t = burst_end + rng.uniform(1, 10)
+    events.sort()
+    return events
+
+
+async def setup_clients(typists: int, channels: int, watchers: int):
+    sent = 0
+
+    async def send_packet(eio_sid, pkt):
+        nonlocal sent
+        sent += 1
+
+    main.sio.eio.send_packet = send_packet
+    main.sio.manager.rooms.clear()
+    main.sio.manager.eio_to_sid.clear()
+
+    sids = []
+    for i in range(typists):
+        sid = await main.sio.manager.connect(f"typist-{i}", "/")
+        await main.sio.enter_room(sid, main.channel_room(f"ch-{i % channels}"))
+        sids.append(sid)
+    for i in range(watchers * channels):
+        sid = await main.sio.manager.connect(f"watcher-{i}", "/")
+        await main.sio.enter_room(sid, main.channel_room(f"ch-{i % channels}"))
+
+    return sids, lambda: sent
+
+
+async def run_before(events, sids, sent):
+    start = sent()
+    for _, typist, channel in events:
+        data = {"channel_id": f"ch-{channel}", "id": f"user-{typist}", "name": f"User {typist}"}
+        await main.sio.emit(
+            "user_typing", data, room=main.channel_room(data["channel_id"]), skip_sid=sids[typist]
+        )
+    return sent() - start
+
+
+async def run_after(events, sids, sent, seconds: float):
+    tracker = main.TypingTracker(ttl=main.TYPING_TTL, throttle=main.TYPING_THROTTLE)
+    start = sent()
+    next_flush = main.TYPING_FLUSH_INTERVAL
+
+    async def flush(now):
+        for channel_id, snapshot in tracker.flush(now):
+            await main.sio.emit("typing_users", snapshot, room=main.channel_room(channel_id))
+
+    for t, typist, channel in events:
+        while next_flush <= t:
+            await flush(next_flush)
+            next_flush += main.TYPING_FLUSH_INTERVAL
+        data = {"channel_id": f"ch-{channel}", "id": f"user-{typist}", "name": f"User {typist}"}
+        tracker.record(sids[typist], data, t)
+
+    while next_flush <= seconds + main.TYPING_TTL + main.TYPING_FLUSH_INTERVAL:
+        await flush(next_flush)
+        next_flush += main.TYPING_FLUSH_INTERVAL
+
+    return sent() - start
+
+
+async def run(typists: int, channels: int, watchers: int, seconds: float, cps: float):
+    events = keystroke_events(typists, channels, seconds, cps)
+    sids, sent = await setup_clients(typists, channels, watchers)
+
+    before = await run_before(events, sids, sent)
+    after = await run_after(events, sids, sent, seconds)
+
+    print(f"{len(events)} keystroke events from {typists} typists in {channels} channels over {seconds:.0f}s")
+    print(f"{'mode':<8} {'frames':>10} {'frames/s':>10}")
+    print(f"{'before':<8} {before:>10} {before / seconds:>10.0f}")
+    print(f"{'after':<8} {after:>10} {after / seconds:>10.0f}")
+    print(f"reduction {before / after if after else float('inf'):.1f}x")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--typists", type=int, default=300)
+    parser.add_argument("--channels", type=int, default=20)
+    parser.add_argument("--watchers", type=int, default=10, help="Idle clients per channel")
+    parser.add_argument("--seconds", type=float, default=30)
+    parser.add_argument("--cps", type=float, default=5, help="Keystrokes per second while typing")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    asyncio.run(run(args.typists, args.channels, args.watchers, args.seconds, args.cps))
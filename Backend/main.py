@@ -4,45 +4,111 @@
 Frontend expectations it supports:
 
 REST:
+- POST /bootstrap                         -> user, workspaces, channels and first message page in one call
 - POST /users/me                          -> create or return backend user
 - GET  /workspaces/my?user_id=...        -> list user's workspaces
 - GET  /workspaces/{workspace_id}        -> workspace details
 - POST /workspaces/create?user_id=...    -> create workspace
 - POST /workspaces/join                  -> join via invite_code
+- DELETE /workspaces/{workspace_id}       -> start background deletion, returns a job id
+- GET  /workspaces/deletion-jobs/{job_id} -> deletion progress
+- POST /workspaces/deletion-jobs/{job_id}/resume -> restart a failed deletion
 - GET  /channels?workspace_id=...        -> list channels
 - POST /channels                         -> create channel
-- GET  /messages?channel_id=...          -> list messages in channel
+- GET  /channels/{channel_id}/changes?since=<seq> -> what changed since a change sequence
+- GET  /messages?channel_id=...          -> page of messages in channel (before/after/limit cursors)
 - POST /messages                         -> create message
+- GET  /search?q=...&channel_id=|workspace_id= -> ranked full-text message search
 - PATCH /messages/{message_id}/pin       -> pin / unpin message
 - POST /reactions                        -> toggle reaction on a message
 - POST /files/upload                     -> upload attachments for messages
-
-Socket.IO events (server -> client):
-- "new-message"      -> broadcast new message payload
-- "message-pinned"   -> broadcast pin state changes
-- "reaction-added"   -> broadcast new message reaction state
-
-Socket.IO events (client -> server, optional / future-ready):
-- "join_workspace"   -> join a workspace room
-- "typing"           -> emit typing state (currently not used by FE)
+- GET  /files/{attachment_id}            -> download an attachment (content-addressed blob)
+- GET  /metrics                          -> Prometheus metrics for this worker
+- GET|PUT /admin/profiling               -> request/SQL profiler settings and reports (X-Admin-Token)
+- POST /admin/migrations/message-ids     -> start re-keying pre-UUIDv7 messages with time-ordered ids, returns a job (X-Admin-Token)
+- GET  /admin/migrations/message-ids/{job_id} -> migration progress (X-Admin-Token)
+- GET  /export/channels/{channel_id}     -> channel history as NDJSON, ?gzip=true (X-Admin-Token)
+- GET  /export/workspaces/{workspace_id} -> all channels' history as NDJSON, ?gzip=true (X-Admin-Token)
+- POST /import/workspaces/{workspace_id} -> bulk import of an NDJSON export, gzip or not (X-Admin-Token)
+
+Socket.IO events (server -> client, sent to the channel room "channel:<id>"):
+- "new-message"      -> new message payload (+ seq)
+- "message-pinned"   -> pin state changes { message_id, is_pinned, pinned_by, seq }
+- "reaction-added"   -> reaction delta { message_id, emoji, user_id, action, count, seq }
+- "typing_users"     -> coalesced snapshot of who is typing { channel_id, users }
+
+Socket.IO events (server -> client, sent to the workspace room "workspace:<id>"):
+- "presence"         -> batched status changes { changes: [{ user_id, status }] }
+
+Socket.IO events (client -> server):
+- "join_workspace"   -> join the workspace room "workspace:<id>"
+- "leave_workspace"  -> leave a workspace room
+- "join_channel"     -> join the channel room "channel:<id>"
+- "leave_channel"    -> leave a channel room
+- "switch_channel"   -> leave current channel rooms and join { workspace_id?, channel_id, since? }
+                        (with since: replays missed channel events from memory, see ReplayBuffer)
+- "typing"           -> typing state { channel_id, id, name, is_typing? } (throttled, coalesced)
+- "heartbeat"        -> presence { user_id, idle? } (or connect with auth { user_id })
+
+Multiple workers / nodes: set SOCKETIO_MESSAGE_QUEUE (see create_client_manager)
+so rooms and emits are shared across processes.
+
+Schema: Alembic migrations in migrations/versions (`alembic upgrade head` from
+Backend/), applied at startup unless DB_MIGRATE_ON_STARTUP=0. Check that the
+hot request paths stay on indexes with benchmarks/query_plans.py.
 """
 
 import os
 import enum
+import asyncio
+import bisect
+import contextvars
+import cProfile
+import functools
+import pstats
+import random
+import re
 import uuid
+import base64
+import json
+import hashlib
+import tempfile
 import secrets
+import socket
+import sqlite3
 import string
+import sys
+import threading
+import time
+import zlib
+from collections import OrderedDict, deque
 from pathlib import Path
-from datetime import datetime
-from typing import Optional, Dict, Any, List
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Dict, Any, List, Tuple, Callable, TypeVar, Iterable, Iterator, AsyncIterator
 
+from typing_extensions import TypedDict
+
+from alembic import command as alembic_command
+from alembic.config import Config as AlembicConfig
 from dotenv import load_dotenv
-from fastapi import FastAPI, Depends, HTTPException, Query, UploadFile, File, Form
+from fastapi import FastAPI, Depends, HTTPException, Header, Query, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.concurrency import run_in_threadpool
 from fastapi.staticfiles import StaticFiles
+from fastapi.responses import FileResponse, JSONResponse, PlainTextResponse, StreamingResponse
+from fastapi.routing import APIRoute
 from pydantic import BaseModel
+from python_multipart.multipart import MultipartParser, parse_options_header
+from python_multipart.exceptions import MultipartParseError
 from sqlalchemy import (
     create_engine,
+    event,
+    and_,
+    or_,
+    case,
+    text,
     Column,
     Integer,
     String,
@@ -50,7 +116,14 @@ from sqlalchemy import (
     Boolean,
     DateTime,
     ForeignKey,
+    Index,
+    UniqueConstraint,
     Enum as SQLEnum,
+    exists,
+    func,
+    select,
+    bindparam,
+    tuple_,
 )
 from sqlalchemy.orm import (
     declarative_base,
@@ -58,8 +131,18 @@ from sqlalchemy.orm import (
     Session,
     relationship,
 )
+from sqlalchemy.engine import make_url
 from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm.exc import StaleDataError
 import socketio
+from socketio.async_pubsub_manager import AsyncPubSubManager
+from engineio import json as engineio_json
+
+# orjson is optional: without it responses use the stdlib encoder
+try:
+    import orjson
+except ImportError:
+    orjson = None
 
 # ------------------------------------------------------
 # ENV & DATABASE CONFIG
@@ -68,6 +151,11 @@ import socketio
 # load environment variables from .env
 load_dotenv()
 
+
+def env_flag(name: str, default: str = "0") -> bool:
+    return os.getenv(name, default).strip().lower() in ("1", "true", "yes", "on")
+
+
 BASE_DIR = Path(__file__).resolve().parent
 DEFAULT_SQLITE_URL = f"sqlite:///{BASE_DIR / 'gameplan.db'}"
 
@@ -93,7 +181,145 @@ if not DATABASE_URL:
 
 print(f"🔌 Using database: {DATABASE_URL}")
 
-engine = create_engine(DATABASE_URL, pool_pre_ping=True)
+# Identifies this process in state shared by the workers (presence rows,
+# background job ownership)
+WORKER_ID = str(uuid.uuid4())
+
+# "tuned": per-backend settings below; "default": plain create_engine with
+# pool_pre_ping, as before engine profiles existed
+ENGINE_PROFILES = ("tuned", "default")
+DB_ENGINE_PROFILE = os.getenv("DB_ENGINE_PROFILE", "tuned").strip().lower()
+
+# Connection pool (Postgres and file-based SQLite)
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "10"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "20"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+DB_POOL_PRE_PING = env_flag("DB_POOL_PRE_PING")
+DB_STATEMENT_TIMEOUT_MS = int(os.getenv("DB_STATEMENT_TIMEOUT_MS", "0"))
+
+SQLITE_JOURNAL_MODE = os.getenv("SQLITE_JOURNAL_MODE", "WAL").strip().upper()
+SQLITE_SYNCHRONOUS = os.getenv("SQLITE_SYNCHRONOUS", "NORMAL").strip().upper()
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"))
+SQLITE_WRITER_QUEUE = env_flag("SQLITE_WRITER_QUEUE", "1")
+
+for _name, _value, _allowed in (
+    ("DB_ENGINE_PROFILE", DB_ENGINE_PROFILE, ENGINE_PROFILES),
+    ("SQLITE_JOURNAL_MODE", SQLITE_JOURNAL_MODE, ("WAL", "DELETE", "TRUNCATE", "PERSIST", "MEMORY", "OFF")),
+    ("SQLITE_SYNCHRONOUS", SQLITE_SYNCHRONOUS, ("OFF", "NORMAL", "FULL", "EXTRA")),
+):
+    if _value not in _allowed:
+        raise ValueError(f"{_name} must be one of {', '.join(_allowed)} (got {_value!r})")
+
+
+class SQLiteWriterConnection(sqlite3.Connection):
+    """
+    sqlite3 connection that takes a process-wide writer lock at its first
+    write statement (queue_sqlite_writer) and holds it until commit or
+    rollback. SQLite allows one writer at a time anyway; waiting on the lock
+    wakes the next writer as soon as the previous one commits, where
+    busy_timeout would have it sleep and poll the file lock.
+
+    Only orders writers within this process; other processes on the same
+    file still fall back to busy_timeout.
+    """
+
+    writer_lock = threading.Lock()
+    holds_writer_lock = False
+
+    def acquire_writer(self):
+        if not self.holds_writer_lock:
+            # Bounded, so a thread writing through two connections at once
+            # can't deadlock itself; SQLite's busy handling takes over then
+            self.holds_writer_lock = self.writer_lock.acquire(
+                timeout=SQLITE_BUSY_TIMEOUT_MS / 1000
+            )
+
+    def release_writer(self):
+        if self.holds_writer_lock:
+            self.holds_writer_lock = False
+            self.writer_lock.release()
+
+    def commit(self):
+        try:
+            super().commit()
+        finally:
+            self.release_writer()
+
+    def rollback(self):
+        try:
+            super().rollback()
+        finally:
+            self.release_writer()
+
+    def close(self):
+        try:
+            super().close()
+        finally:
+            self.release_writer()
+
+
+_WRITE_STATEMENT = re.compile(r"\s*(INSERT|UPDATE|DELETE|REPLACE)\b", re.IGNORECASE)
+
+
+def queue_sqlite_writer(conn, cursor, statement, parameters, context, executemany):
+    if _WRITE_STATEMENT.match(statement):
+        conn.connection.dbapi_connection.acquire_writer()
+
+
+def apply_sqlite_pragmas(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    cursor.execute(f"PRAGMA journal_mode={SQLITE_JOURNAL_MODE}")
+    cursor.execute(f"PRAGMA synchronous={SQLITE_SYNCHRONOUS}")
+    cursor.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}")
+    cursor.close()
+
+
+def build_engine(url: str, profile: str = DB_ENGINE_PROFILE):
+    """
+    Engine for `url` with the settings of an engine profile:
+
+    - default: create_engine's defaults plus a pre-ping on every checkout
+    - tuned, SQLite: SQLITE_JOURNAL_MODE (WAL, so readers don't block on the
+      writer), SQLITE_SYNCHRONOUS, busy_timeout and, with SQLITE_WRITER_QUEUE,
+      writers queued in-process (SQLiteWriterConnection)
+    - tuned, Postgres: a DB_POOL_SIZE + DB_MAX_OVERFLOW LIFO pool recycled
+      after DB_POOL_RECYCLE seconds, pre-ping only with DB_POOL_PRE_PING, and
+      DB_STATEMENT_TIMEOUT_MS as the server-side statement_timeout
+    """
+    if profile == "default":
+        return create_engine(url, pool_pre_ping=True)
+
+    parsed = make_url(url)
+    pool_options = dict(
+        pool_size=DB_POOL_SIZE,
+        max_overflow=DB_MAX_OVERFLOW,
+        pool_timeout=DB_POOL_TIMEOUT,
+        pool_recycle=DB_POOL_RECYCLE,
+        pool_pre_ping=DB_POOL_PRE_PING,
+        pool_use_lifo=True,
+    )
+
+    if parsed.get_backend_name() == "sqlite":
+        connect_args = {"factory": SQLiteWriterConnection} if SQLITE_WRITER_QUEUE else {}
+        # In-memory databases use a per-thread pool without sizing options
+        in_memory = parsed.database in (None, "", ":memory:")
+        new_engine = create_engine(
+            url, connect_args=connect_args, **({} if in_memory else pool_options)
+        )
+        event.listen(new_engine, "connect", apply_sqlite_pragmas)
+        if SQLITE_WRITER_QUEUE:
+            event.listen(new_engine, "before_cursor_execute", queue_sqlite_writer)
+        return new_engine
+
+    connect_args = {}
+    if DB_STATEMENT_TIMEOUT_MS and parsed.get_backend_name() == "postgresql":
+        connect_args["options"] = f"-c statement_timeout={DB_STATEMENT_TIMEOUT_MS}"
+    return create_engine(url, connect_args=connect_args, **pool_options)
+
+
+engine = build_engine(DATABASE_URL)
+print(f"⚙️  Engine profile: {DB_ENGINE_PROFILE} ({engine.dialect.name})")
 SessionLocal = sessionmaker(bind=engine, autoflush=False, autocommit=False)
 Base = declarative_base()
 
@@ -130,7 +356,7 @@ class Workspace(Base):
     id = Column(String(36), primary_key=True)
     name = Column(String(255), nullable=False)
     description = Column(Text, nullable=True)
-    owner_id = Column(String(36), ForeignKey("users.id"))
+    owner_id = Column(String(36), ForeignKey("users.id"), index=True)
     is_personal = Column(Boolean, default=False)
     invite_code = Column(String(64), unique=True, index=True, nullable=True)
     created_at = Column(DateTime, default=datetime.utcnow)
@@ -140,6 +366,12 @@ class Workspace(Base):
 
 class WorkspaceMember(Base):
     __tablename__ = "workspace_members"
+    __table_args__ = (
+        # Membership check in join_workspace_by_invite; one row per (workspace, user)
+        Index("uq_workspace_members_workspace_user", "workspace_id", "user_id", unique=True),
+        # Backs list_my_workspaces
+        Index("ix_workspace_members_user_id", "user_id"),
+    )
 
     id = Column(Integer, primary_key=True)
     workspace_id = Column(String(36), ForeignKey("workspaces.id"))
@@ -153,6 +385,10 @@ class WorkspaceMember(Base):
 
 class Channel(Base):
     __tablename__ = "channels"
+    __table_args__ = (
+        # Backs list_channels and the duplicate-name check in create_channel
+        Index("ix_channels_workspace_name", "workspace_id", "name"),
+    )
 
     id = Column(String(36), primary_key=True)
     workspace_id = Column(String(36), ForeignKey("workspaces.id"))
@@ -164,6 +400,12 @@ class Channel(Base):
 
 class Message(Base):
     __tablename__ = "messages"
+    __table_args__ = (
+        # Backs keyset pagination in get_messages: (channel_id, created_at, id)
+        Index("ix_messages_channel_created", "channel_id", "created_at", "id"),
+        # Backs id-only pagination (MESSAGE_ID_PAGINATION) over time-ordered ids
+        Index("ix_messages_channel_id", "channel_id", "id"),
+    )
 
     id = Column(String(36), primary_key=True)
     channel_id = Column(String(36), ForeignKey("channels.id"))
@@ -178,6 +420,15 @@ class Message(Base):
 
 class MessageReaction(Base):
     __tablename__ = "message_reactions"
+    __table_args__ = (
+        # The toggle lookup in toggle_reaction; its message_id prefix also
+        # backs loading a page's reactions
+        Index(
+            "uq_message_reactions_message_user_emoji",
+            "message_id", "user_id", "emoji",
+            unique=True,
+        ),
+    )
 
     id = Column(Integer, primary_key=True)
     message_id = Column(String(36), ForeignKey("messages.id"))
@@ -186,8 +437,279 @@ class MessageReaction(Base):
     created_at = Column(DateTime, default=datetime.utcnow)
 
 
-# Create tables
-Base.metadata.create_all(bind=engine)
+class MessageReactionCount(Base):
+    """
+    Aggregated reaction counts per (message, emoji), maintained incrementally
+    by toggle_reaction so a toggle never re-reads the message's reaction rows.
+    """
+
+    __tablename__ = "message_reaction_counts"
+    __table_args__ = (
+        UniqueConstraint("message_id", "emoji", name="uq_message_reaction_counts_message_emoji"),
+    )
+
+    id = Column(Integer, primary_key=True)
+    message_id = Column(String(36), ForeignKey("messages.id"), nullable=False)
+    emoji = Column(String(10), nullable=False)
+    count = Column(Integer, nullable=False, default=0)
+
+
+class ChannelSequence(Base):
+    """
+    Latest change sequence number of a channel. record_channel_change bumps
+    it with an UPDATE, whose row lock keeps a channel's changes in order.
+    """
+
+    __tablename__ = "channel_sequences"
+
+    channel_id = Column(String(36), ForeignKey("channels.id"), primary_key=True)
+    seq = Column(Integer, nullable=False, default=0)
+
+
+class ChannelChange(Base):
+    """
+    One entry per new message, pin change or reaction toggle in a channel,
+    read by GET /channels/{channel_id}/changes. Only the kind and message are
+    logged; the endpoint returns the messages' current state.
+    """
+
+    __tablename__ = "channel_changes"
+    __table_args__ = (
+        # Also backs the (channel_id, seq > since) range scan
+        UniqueConstraint("channel_id", "seq", name="uq_channel_changes_channel_seq"),
+    )
+
+    id = Column(Integer, primary_key=True)
+    channel_id = Column(String(36), ForeignKey("channels.id"), nullable=False)
+    seq = Column(Integer, nullable=False)
+    kind = Column(String(20), nullable=False)  # "message" | "pin" | "reaction"
+    message_id = Column(String(36), ForeignKey("messages.id"), nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+
+class AttachmentBlob(Base):
+    """
+    One stored file per distinct content, addressed by its SHA-256.
+    ref_count tracks the Attachment rows pointing at it.
+    """
+
+    __tablename__ = "attachment_blobs"
+
+    sha256 = Column(String(64), primary_key=True)
+    size = Column(Integer, nullable=False)
+    ref_count = Column(Integer, nullable=False, default=0)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+
+class Attachment(Base):
+    __tablename__ = "attachments"
+
+    id = Column(String(36), primary_key=True)
+    sha256 = Column(String(64), ForeignKey("attachment_blobs.sha256"), index=True, nullable=False)
+    name = Column(String(255), nullable=False)
+    mime_type = Column(String(255), nullable=True)
+    uploaded_by = Column(String(36), ForeignKey("users.id"), nullable=True)
+    # Set once the attachment is sent in a message; unlinked uploads are
+    # collected by the GC after ATTACHMENT_ORPHAN_GRACE seconds.
+    message_id = Column(String(36), ForeignKey("messages.id"), index=True, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+
+class WorkspaceDeletionJob(Base):
+    """
+    Progress of a background delete_workspace run. `stage` is the table being
+    drained; every stage only deletes what is left, so a job can be resumed
+    from its recorded stage (or from scratch) at any time. While a job
+    exists, the workspace's channels take no new writes (reserve_channel_seqs).
+    """
+
+    __tablename__ = "workspace_deletion_jobs"
+
+    id = Column(String(36), primary_key=True)
+    workspace_id = Column(String(36), index=True, nullable=False)
+    requested_by = Column(String(36), nullable=False)
+    status = Column(String(20), nullable=False, default="pending")
+    stage = Column(String(20), nullable=False, default="channel_sequences")
+    deleted_rows = Column(Integer, nullable=False, default=0)
+    # WORKER_ID of the process running the job (claim_job)
+    owner = Column(String(36), nullable=True)
+    error = Column(Text, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow)
+    finished_at = Column(DateTime, nullable=True)
+
+
+class MessageIdMigration(Base):
+    """
+    Progress of a background POST /admin/migrations/message-ids run. Messages
+    are visited in (channel_id, created_at, id) order, the order of
+    ix_messages_channel_created, from the stored cursor, so any worker can
+    resume a run where it stopped.
+    """
+
+    __tablename__ = "message_id_migrations"
+
+    id = Column(String(36), primary_key=True)
+    status = Column(String(20), nullable=False, default="pending")
+    # WORKER_ID of the process running the job (claim_job)
+    owner = Column(String(36), nullable=True)
+    batch_size = Column(Integer, nullable=False)
+    # Messages when the run started, against which scanned_rows advances
+    total_rows = Column(Integer, nullable=False, default=0)
+    scanned_rows = Column(Integer, nullable=False, default=0)
+    migrated_rows = Column(Integer, nullable=False, default=0)
+    cursor_channel_id = Column(String(36), nullable=True)
+    cursor_created_at = Column(DateTime, nullable=True)
+    cursor_message_id = Column(String(36), nullable=True)
+    error = Column(Text, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow)
+    finished_at = Column(DateTime, nullable=True)
+
+
+class PresenceSocket(Base):
+    """
+    How many sockets one worker holds for a user, and the user's status as
+    that worker sees it, so presence merges across uvicorn workers and nodes
+    (PresenceTracker). Only users the worker doesn't see as offline have a row.
+    """
+
+    __tablename__ = "presence_sockets"
+
+    worker_id = Column(String(36), primary_key=True)
+    user_id = Column(String(36), ForeignKey("users.id"), primary_key=True, index=True)
+    sockets = Column(Integer, nullable=False)
+    status = Column(String(20), nullable=False)  # "online" | "away"
+
+
+class PresenceWorker(Base):
+    """
+    Liveness of the workers writing presence_sockets: each one refreshes
+    updated_at on every presence flush. The rows of a worker that stopped
+    (crashed) for PRESENCE_WORKER_TIMEOUT are ignored, then removed.
+    """
+
+    __tablename__ = "presence_workers"
+
+    worker_id = Column(String(36), primary_key=True)
+    updated_at = Column(DateTime, default=datetime.utcnow)
+
+
+# ------------------------------------------------------
+# SCHEMA MIGRATIONS & BACKFILLS
+# ------------------------------------------------------
+
+# Alembic migrations (migrations/versions) own the schema. With several
+# workers, run `alembic upgrade head` once per deploy and set this to 0.
+DB_MIGRATE_ON_STARTUP = env_flag("DB_MIGRATE_ON_STARTUP", "1")
+ALEMBIC_INI = Path(__file__).resolve().parent / "alembic.ini"
+
+
+def migrate_database(revision: str = "head"):
+    """
+    Upgrade the database to `revision` on this module's engine. Databases
+    created by create_all before migrations existed are picked up by the
+    baseline revision, which only creates what is missing.
+    """
+    config = AlembicConfig(str(ALEMBIC_INI))
+    config.attributes["metadata"] = Base.metadata
+    with engine.begin() as conn:
+        config.attributes["connection"] = conn
+        alembic_command.upgrade(config, revision)
+
+
+def backfill_reaction_counts():
+    """
+    Seed message_reaction_counts from message_reactions on databases that
+    had reactions before the aggregate table existed.
+    """
+    with SessionLocal() as db:
+        if db.query(MessageReactionCount.id).first() or not db.query(MessageReaction.id).first():
+            return
+
+        db.execute(
+            MessageReactionCount.__table__.insert().from_select(
+                ["message_id", "emoji", "count"],
+                select(
+                    MessageReaction.message_id,
+                    MessageReaction.emoji,
+                    func.count(MessageReaction.id),
+                ).group_by(MessageReaction.message_id, MessageReaction.emoji),
+            )
+        )
+        db.commit()
+
+
+
+def backfill_channel_sequences():
+    """
+    Give channels created before change sequences (or inserted outside the
+    API) their channel_sequences row, starting at 0.
+    """
+    with SessionLocal() as db:
+        db.execute(
+            ChannelSequence.__table__.insert().from_select(
+                ["channel_id", "seq"],
+                select(Channel.id, text("0")).where(
+                    ~exists().where(ChannelSequence.channel_id == Channel.id)
+                ),
+            )
+        )
+        db.commit()
+
+
+def init_db():
+    """
+    Migrate the schema (DB_MIGRATE_ON_STARTUP), check for the search index
+    and run the idempotent backfills. Runs at app startup; scripts that use
+    the models without serving the app call it themselves.
+    """
+    if DB_MIGRATE_ON_STARTUP:
+        migrate_database()
+    check_search_index()
+    backfill_reaction_counts()
+    backfill_channel_sequences()
+
+
+# ------------------------------------------------------
+# FULL-TEXT SEARCH INDEX
+# ------------------------------------------------------
+
+# Text search configuration for the Postgres index (no stemming: chat text
+# is short, multilingual and full of names); must match migration 0003
+SEARCH_TS_CONFIG = "simple"
+
+# Created by migrations 0003/0004 (FTS5 table + triggers keyed on
+# messages.search_key on SQLite, generated tsvector column + GIN index on
+# Postgres). Set by check_search_index.
+search_index_ready = True
+
+
+def check_search_index() -> bool:
+    """
+    Read-only check that the migrations installed the message search index
+    for the active backend. GET /search answers 503 without it.
+    """
+    global search_index_ready
+    with engine.connect() as conn:
+        if engine.dialect.name == "sqlite":
+            found = conn.execute(
+                text("SELECT 1 FROM sqlite_master WHERE name = 'messages_fts'")
+            ).first()
+        elif engine.dialect.name == "postgresql":
+            found = conn.execute(
+                text(
+                    "SELECT 1 FROM information_schema.columns "
+                    "WHERE table_name = 'messages' AND column_name = 'search_vector'"
+                )
+            ).first()
+        else:
+            found = None
+    search_index_ready = found is not None
+    if not search_index_ready:
+        print("⚠️  Message search index missing; run `alembic upgrade head`")
+    return search_index_ready
+
 
 # ------------------------------------------------------
 # Pydantic SCHEMAS (request bodies)
@@ -217,6 +739,7 @@ class MessageCreate(BaseModel):
     channel_id: str
     user_id: str
     content: str
+    attachment_id: Optional[str] = None
 
 
 class ReactionCreate(BaseModel):
@@ -235,649 +758,4173 @@ class JoinWorkspaceRequest(BaseModel):
     user_id: str
 
 
+class BootstrapRequest(UserCreate):
+    workspace_id: Optional[str] = None
+    channel_id: Optional[str] = None
+
+
 # ------------------------------------------------------
-# SOCKET.IO SERVER
+# RESPONSE SHAPES & JSON ENCODING
 # ------------------------------------------------------
 
-sio = socketio.AsyncServer(
-    async_mode="asgi",
-    cors_allowed_origins="*",
-)
+# Response shapes (documented in OpenAPI via response_model). Hot endpoints
+# return FastJSONResponse directly, so FastAPI never validates them or runs
+# jsonable_encoder over them.
 
 
-@sio.event
-async def connect(sid, environ, auth):
-    print(f"🔗 Socket connected: {sid}")
+class ApiUser(TypedDict):
+    id: str
+    name: str
+    email: str
+    avatar: str
+    status: str
 
 
-@sio.event
-async def disconnect(sid):
-    print(f"🔌 Socket disconnected: {sid}")
+class ApiReaction(TypedDict):
+    emoji: str
+    count: int
+    users: List[str]
 
 
-@sio.event
-async def join_workspace(sid, workspace_id: str):
-    """
-    (Optional) Let clients join a workspace-specific room.
-    Your current frontend doesn't emit this yet, but it's ready to use.
-    """
-    await sio.enter_room(sid, workspace_id)
-    print(f"🚪 Socket {sid} joined workspace room {workspace_id}")
+class ApiMessage(TypedDict):
+    id: str
+    content: str
+    timestamp: str
+    user: Optional[ApiUser]
+    reactions: List[ApiReaction]
+    isPinned: bool
+    pinnedBy: Optional[str]
 
 
-@sio.event
-async def typing(sid, data):
-    """
-    Typing indicator support (optional).
-    If in the future you emit `socket.emit("typing", { id, name })`,
-    other clients will receive `user_typing`.
-    """
-    await sio.emit("user_typing", data, skip_sid=sid)
+class NewMessage(ApiMessage):
+    seq: int
 
 
-# ------------------------------------------------------
-# FASTAPI APP
-# ------------------------------------------------------
+class MessagePage(TypedDict):
+    messages: List[ApiMessage]
+    next_cursor: Optional[str]
+    has_more: bool
+    seq: int
 
-fastapi_app = FastAPI(title="Team Chat API")
 
-fastapi_app.add_middleware(
-  CORSMiddleware,
-  allow_origins=["*"],  # dev; restrict in prod
-  allow_credentials=True,
-  allow_methods=["*"],
-  allow_headers=["*"],
-)
+class ApiChannel(TypedDict):
+    id: str
+    name: str
+    description: Optional[str]
+    is_private: bool
 
-UPLOAD_DIR = Path(__file__).resolve().parent / "uploads"
-UPLOAD_DIR.mkdir(exist_ok=True)
-fastapi_app.mount("/uploads", StaticFiles(directory=UPLOAD_DIR), name="uploads")
 
+class WorkspaceSummary(TypedDict):
+    id: str
+    name: str
+    description: Optional[str]
+    role: str
+    is_personal: bool
+    invite_code: Optional[str]
 
-def get_db() -> Session:
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
 
+class Bootstrap(TypedDict):
+    user: ApiUser
+    workspaces: List[WorkspaceSummary]
+    workspace_id: Optional[str]
+    channels: List[ApiChannel]
+    channel_id: Optional[str]
+    page: Optional[MessagePage]
 
-# ------------------------------------------------------
-# HELPERS
-# ------------------------------------------------------
+
+class PinUpdate(TypedDict):
+    message_id: str
+    is_pinned: bool
+    pinned_by: Optional[str]
+    seq: int
 
 
-def generate_invite_code(length: int = 10) -> str:
-    alphabet = string.ascii_uppercase + string.digits
-    return "".join(secrets.choice(alphabet) for _ in range(length))
+class ReactionDelta(TypedDict):
+    message_id: str
+    emoji: str
+    user_id: str
+    action: str
+    count: int
+    seq: int
 
 
-def serialize_user(user: User) -> Dict[str, Any]:
-    return {
-        "id": user.id,
-        "name": user.name,
-        "email": user.email,
-        "avatar": user.avatar or "",
-        # Frontend's ApiUser doesn't define status, but it's fine to send extra
-        "status": user.status.value if isinstance(user.status, UserStatus) else "online",
-    }
+class MessageUpdate(TypedDict):
+    id: str
+    reactions: List[ApiReaction]
+    isPinned: bool
+    pinnedBy: Optional[str]
 
 
-def serialize_message(db: Session, msg: Message) -> Dict[str, Any]:
+class ChannelChanges(TypedDict):
+    seq: int
+    has_more: bool
+    messages: List[ApiMessage]
+    updates: List[MessageUpdate]
+
+
+def dumps_json(obj: Any) -> bytes:
     """
-    Shape matches your ApiMessage in TS:
+    Compact UTF-8 JSON; orjson when installed, else the stdlib encoder
+    (same output, several times slower on large pages).
+    """
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode()
 
-    interface ApiMessage {
-      id: string;
-      content: string;
-      timestamp: string;
-      user: ApiUser | null;
-      reactions: { emoji: string; count: number; users: string[] }[];
-      isPinned: boolean;
-      pinnedBy?: string;
-    }
+
+class EncodedPayload(dict):
+    """
+    A payload dict encoded to JSON once at creation. FastJSONResponse sends
+    `body` as the HTTP body and SocketJSON splices `text` into Socket.IO
+    packets, so a message both returned and broadcast is serialized once.
+    Anything else (pub/sub managers, jsonable_encoder) sees a plain dict.
+    Must not be mutated after creation.
     """
-    user = db.query(User).filter(User.id == msg.user_id).first()
-    reactions = db.query(MessageReaction).filter(
-        MessageReaction.message_id == msg.id
-    ).all()
 
-    grouped: Dict[str, Dict[str, Any]] = {}
-    for r in reactions:
-        if r.emoji not in grouped:
-            grouped[r.emoji] = {"emoji": r.emoji, "count": 0, "users": []}
-        grouped[r.emoji]["count"] += 1
-        grouped[r.emoji]["users"].append(r.user_id)
+    __slots__ = ("body", "text")
 
-    return {
-        "id": msg.id,
-        "content": msg.content,
-        "timestamp": msg.created_at.isoformat(),
-        "user": serialize_user(user) if user else None,
-        "reactions": list(grouped.values()),
-        "isPinned": msg.is_pinned,
-        "pinnedBy": msg.pinned_by,
-    }
+    def __init__(self, data: Dict[str, Any]):
+        super().__init__(data)
+        self.body = dumps_json(data)
+        self.text = self.body.decode()
 
+    @classmethod
+    def from_text(cls, text: str) -> "EncodedPayload":
+        """Rebuild a payload from its encoded text without re-encoding it."""
+        payload = cls.__new__(cls)
+        dict.__init__(payload, orjson.loads(text) if orjson is not None else json.loads(text))
+        payload.body = text.encode()
+        payload.text = text
+        return payload
 
-# ------------------------------------------------------
-# USERS
-# ------------------------------------------------------
 
+class FastJSONResponse(JSONResponse):
+    def render(self, content: Any) -> bytes:
+        if isinstance(content, EncodedPayload):
+            return content.body
+        return dumps_json(content)
 
-@fastapi_app.post("/users/me")
-def get_or_create_user(request: UserCreate, db: Session = Depends(get_db)):
-    """
-    Called from TeamChannelInterface.loadCurrentUser()
 
-    Body: { name, email, avatar }
-    Returns: ApiUser
+class SocketJSON:
+    """
+    json module for Socket.IO / Engine.IO packets: EncodedPayload event
+    arguments are reused as-is, everything else goes through dumps_json.
     """
-    existing = db.query(User).filter(User.email == request.email).first()
-    if existing:
-        return serialize_user(existing)
 
-    new_user = User(
-        id=str(uuid.uuid4()),
-        name=request.name or request.email.split("@")[0],
-        email=request.email,
-        avatar=request.avatar,
-    )
-    db.add(new_user)
+    loads = staticmethod(engineio_json.loads)
 
-    try:
-        db.commit()
-    except IntegrityError:
-        db.rollback()
-        existing = db.query(User).filter(User.email == request.email).first()
-        if existing:
-            return serialize_user(existing)
-        raise
+    @staticmethod
+    def dumps(obj: Any, **kwargs) -> str:
+        if isinstance(obj, list) and any(isinstance(item, EncodedPayload) for item in obj):
+            return "[" + ",".join(
+                item.text if isinstance(item, EncodedPayload) else dumps_json(item).decode()
+                for item in obj
+            ) + "]"
+        return dumps_json(obj).decode()
 
-    db.refresh(new_user)
 
-    # Create personal workspace on first login
-    personal_ws = Workspace(
-        id=str(uuid.uuid4()),
+# ------------------------------------------------------
+# METRICS
+# ------------------------------------------------------
+
+# Default Prometheus latency buckets (seconds)
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.075, 0.1, 0.25, 0.5, 0.75, 1.0, 2.5, 5.0, 7.5, 10.0)
+STATEMENT_BUCKETS = (1, 2, 3, 5, 8, 13, 21, 34, 55, 100)
+BATCH_SIZE_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500)
+
+
+def format_labels(names: Tuple[str, ...], values: Tuple[str, ...], extra: str = "") -> str:
+    pairs = [f'{name}="{value}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Counter:
+    """
+    Monotonic counter with optional labels, rendered in Prometheus text format.
+    """
+
+    def __init__(self, name: str, help_text: str, labels: Tuple[str, ...] = ()):
+        self.name = name
+        self.help_text = help_text
+        self.labels = labels
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *label_values: str, amount: float = 1):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for label_values, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{format_labels(self.labels, label_values)} {value}")
+        return lines
+
+
+class Histogram:
+    """
+    Cumulative-bucket histogram with optional labels. observe() costs one
+    bucket search and a locked update.
+    """
+
+    def __init__(
+        self, name: str, help_text: str, labels: Tuple[str, ...] = (), buckets=LATENCY_BUCKETS
+    ):
+        self.name = name
+        self.help_text = help_text
+        self.labels = labels
+        self.buckets = tuple(buckets)
+        # label values -> [per-bucket counts (+Inf last), sum, count]
+        self._series: Dict[Tuple[str, ...], List[Any]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *label_values: str):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for label_values, (counts, total, count) in sorted(self._series.items()):
+                cumulative = 0
+                for bound, bucket_count in zip(self.buckets + ("+Inf",), counts):
+                    cumulative += bucket_count
+                    le = format_labels(self.labels, label_values, f'le="{bound}"')
+                    lines.append(f"{self.name}_bucket{le} {cumulative}")
+                labels = format_labels(self.labels, label_values)
+                lines.append(f"{self.name}_sum{labels} {total}")
+                lines.append(f"{self.name}_count{labels} {count}")
+        return lines
+
+
+http_request_duration = Histogram(
+    "http_request_duration_seconds", "HTTP request latency by route", ("method", "route")
+)
+http_requests = Counter(
+    "http_requests_total", "HTTP requests by route and status", ("method", "route", "status")
+)
+db_statements_per_request = Histogram(
+    "db_statements_per_request",
+    "SQL statements issued while serving one HTTP request",
+    ("method", "route"),
+    buckets=STATEMENT_BUCKETS,
+)
+db_statements = Counter("db_statements_total", "SQL statements executed")
+socketio_events = Counter(
+    "socketio_emitted_events_total", "Socket.IO events emitted by event name", ("event",)
+)
+socketio_recipients = Counter(
+    "socketio_fanout_recipients_total",
+    "Sockets on this worker targeted by emitted events",
+    ("event",),
+)
+socketio_replays = Counter(
+    "socketio_replays_total",
+    "Reconnect catch-ups served from the replay buffer or left to the database",
+    ("source",),
+)
+socketio_replayed_events = Counter(
+    "socketio_replayed_events_total", "Events replayed to reconnecting sockets"
+)
+upload_bytes = Counter("upload_bytes_total", "Bytes accepted by /files/upload")
+uploads = Counter("uploads_total", "Files accepted by /files/upload")
+message_commit_batch_size = Histogram(
+    "message_commit_batch_size",
+    "Messages written per group commit (MESSAGE_GROUP_COMMIT)",
+    buckets=BATCH_SIZE_BUCKETS,
+)
+
+METRICS: List[Any] = [
+    http_request_duration,
+    http_requests,
+    db_statements_per_request,
+    db_statements,
+    socketio_events,
+    socketio_recipients,
+    socketio_replays,
+    socketio_replayed_events,
+    upload_bytes,
+    uploads,
+    message_commit_batch_size,
+]
+
+
+class RequestStats:
+    __slots__ = ("statements",)
+
+    def __init__(self):
+        self.statements = 0
+
+
+# Per-request stats; run_db copies the context into the DB executor thread
+current_request_stats: contextvars.ContextVar[Optional[RequestStats]] = contextvars.ContextVar(
+    "current_request_stats", default=None
+)
+
+
+@event.listens_for(engine, "before_cursor_execute")
+def count_statement(conn, cursor, statement, parameters, context, executemany):
+    db_statements.inc()
+    stats = current_request_stats.get()
+    if stats is not None:
+        stats.statements += 1
+
+
+class MetricsMiddleware:
+    """
+    Pure ASGI middleware: times each HTTP request and counts its SQL
+    statements, labelled by the matched route template (not the raw path,
+    which would explode label cardinality).
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        stats = RequestStats()
+        token = current_request_stats.set(stats)
+        status = 500
+        start = time.perf_counter()
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            elapsed = time.perf_counter() - start
+            current_request_stats.reset(token)
+            route = getattr(scope.get("route"), "path", "unmatched")
+            method = scope["method"]
+            http_request_duration.observe(elapsed, method, route)
+            db_statements_per_request.observe(stats.statements, method, route)
+            http_requests.inc(method, route, str(status))
+
+
+# ------------------------------------------------------
+# PROFILING
+# ------------------------------------------------------
+
+
+class ProfilingSettings(BaseModel):
+    """
+    Runtime profiling switches; initialised from PROFILE_* and changeable
+    through PUT /admin/profiling without a restart.
+    """
+
+    enabled: bool = env_flag("PROFILE_SQL")
+    slow_request_ms: float = float(os.getenv("PROFILE_SLOW_REQUEST_MS", "500"))
+    n_plus_one_threshold: int = int(os.getenv("PROFILE_N_PLUS_ONE", "5"))
+    sample_rate: float = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))
+
+
+class ProfilingSettingsUpdate(BaseModel):
+    enabled: Optional[bool] = None
+    slow_request_ms: Optional[float] = None
+    n_plus_one_threshold: Optional[int] = None
+    sample_rate: Optional[float] = None
+
+
+profiling_settings = ProfilingSettings()
+PROFILE_DIR = Path(os.getenv("PROFILE_DIR", str(BASE_DIR / "profiles")))
+# Most recent slow / N+1 request reports, newest last
+profiling_reports: deque = deque(maxlen=50)
+
+
+class RequestProfile:
+    __slots__ = ("queries", "profiles")
+
+    def __init__(self, sampled: bool):
+        # (statement, seconds) in execution order
+        self.queries: List[Tuple[str, float]] = []
+        # One cProfile.Profile per worker thread that ran part of the request
+        self.profiles: Optional[List[cProfile.Profile]] = [] if sampled else None
+
+
+current_request_profile: contextvars.ContextVar[Optional[RequestProfile]] = contextvars.ContextVar(
+    "current_request_profile", default=None
+)
+
+
+# The start time lives on the statement's execution context: a statement that
+# raises never reaches after_cursor_execute, and the context goes with it
+# instead of leaving a stale entry on the pooled connection.
+@event.listens_for(engine, "before_cursor_execute")
+def start_statement_timer(conn, cursor, statement, parameters, context, executemany):
+    if current_request_profile.get() is not None:
+        context.profile_query_start = time.perf_counter()
+
+
+@event.listens_for(engine, "after_cursor_execute")
+def record_statement(conn, cursor, statement, parameters, context, executemany):
+    profile = current_request_profile.get()
+    start = getattr(context, "profile_query_start", None)
+    if profile is not None and start is not None:
+        profile.queries.append((statement, time.perf_counter() - start))
+
+
+_PLACEHOLDER_LIST = re.compile(r"\((?:\s*(?:\?|%\(\w+\)s|:\w+)\s*,?)+\)")
+_WHITESPACE = re.compile(r"\s+")
+
+
+def statement_shape(statement: str) -> str:
+    """
+    Normalise a statement so repeats with different IN-list lengths or
+    whitespace count as the same shape.
+    """
+    return _PLACEHOLDER_LIST.sub("(?)", _WHITESPACE.sub(" ", statement)).strip()
+
+
+T = TypeVar("T")
+
+
+def run_profiled(fn: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+    """
+    Call fn in the current (worker) thread, under its own cProfile.Profile
+    when the request is being sampled.
+    """
+    profile = current_request_profile.get()
+    if profile is None or profile.profiles is None:
+        return fn(*args, **kwargs)
+
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        return fn(*args, **kwargs)
+    finally:
+        profiler.disable()
+        profile.profiles.append(profiler)
+
+
+class ProfiledRoute(APIRoute):
+    """
+    Route class that runs sync endpoints through run_profiled, so sampled
+    requests are profiled in the threadpool thread doing the actual work.
+    """
+
+    def __init__(self, path: str, endpoint: Callable[..., Any], **kwargs: Any):
+        if not asyncio.iscoroutinefunction(endpoint):
+            original = endpoint
+
+            @functools.wraps(original)
+            def endpoint(*args: Any, **kw: Any) -> Any:
+                return run_profiled(original, *args, **kw)
+
+        super().__init__(path, endpoint, **kwargs)
+
+
+def summarize_queries(queries: List[Tuple[str, float]]) -> List[Dict[str, Any]]:
+    by_shape: Dict[str, List[float]] = {}
+    for statement, seconds in queries:
+        by_shape.setdefault(statement_shape(statement), []).append(seconds)
+
+    summary = [
+        {"statement": shape, "count": len(timings), "total_ms": round(sum(timings) * 1000, 3)}
+        for shape, timings in by_shape.items()
+    ]
+    summary.sort(key=lambda entry: entry["total_ms"], reverse=True)
+    return summary
+
+
+def write_profile(path: Path, profiles: List[cProfile.Profile]):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    stats = pstats.Stats(profiles[0])
+    for profiler in profiles[1:]:
+        stats.add(profiler)
+    stats.dump_stats(str(path))
+
+
+class ProfilingMiddleware:
+    """
+    Opt-in request profiler (profiling_settings.enabled). Records every SQL
+    statement with its duration, flags N+1 patterns (one statement shape
+    repeated more than n_plus_one_threshold times), logs slow requests with
+    their query breakdown and, for a sample_rate fraction of requests, dumps
+    a cProfile of the worker-thread part of the request (DB work and sync
+    endpoints) to PROFILE_DIR. Costs one flag check when disabled.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        settings = profiling_settings
+        if scope["type"] != "http" or not settings.enabled:
+            return await self.app(scope, receive, send)
+
+        sampled = settings.sample_rate > 0 and random.random() < settings.sample_rate
+        profile = RequestProfile(sampled)
+        token = current_request_profile.set(profile)
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            current_request_profile.reset(token)
+            await self.report(scope, profile, time.perf_counter() - start, settings)
+
+    async def report(self, scope, profile: RequestProfile, elapsed: float, settings):
+        route = getattr(scope.get("route"), "path", scope["path"])
+        elapsed_ms = elapsed * 1000
+        summary = summarize_queries(profile.queries)
+        n_plus_one = [q for q in summary if q["count"] > settings.n_plus_one_threshold]
+        slow = elapsed_ms >= settings.slow_request_ms
+
+        profile_file = None
+        if profile.profiles:
+            stamp = datetime.utcnow().strftime("%Y%m%dT%H%M%S%f")
+            safe_route = re.sub(r"[^A-Za-z0-9]+", "_", route).strip("_") or "root"
+            path = PROFILE_DIR / f"{stamp}-{scope['method']}-{safe_route}-{elapsed_ms:.0f}ms.prof"
+            await run_in_threadpool(write_profile, path, profile.profiles)
+            profile_file = str(path)
+
+        if not (slow or n_plus_one or profile_file):
+            return
+
+        report = {
+            "at": datetime.utcnow().isoformat(),
+            "method": scope["method"],
+            "route": route,
+            "elapsed_ms": round(elapsed_ms, 3),
+            "statements": len(profile.queries),
+            "sql_ms": round(sum(seconds for _, seconds in profile.queries) * 1000, 3),
+            "n_plus_one": n_plus_one,
+            "queries": summary[:20],
+            "profile": profile_file,
+        }
+        profiling_reports.append(report)
+
+        if slow or n_plus_one:
+            print(
+                f"🐢 {report['method']} {route} {report['elapsed_ms']}ms, "
+                f"{report['statements']} statements ({report['sql_ms']}ms SQL)"
+                + (" — possible N+1" if n_plus_one else "")
+            )
+            for q in summary[:10]:
+                print(f"     {q['count']:>4}x {q['total_ms']:>9.2f}ms  {q['statement'][:160]}")
+
+
+# ------------------------------------------------------
+# SOCKET.IO SERVER
+# ------------------------------------------------------
+
+class LocalSocketManager(AsyncPubSubManager):
+    """
+    Pub/sub client manager over Unix datagram sockets, for several workers on
+    one host without an external broker (and for testing scale-out locally).
+
+    Every worker binds <path>/<channel>/<host_id>.sock and publishes by sending
+    each message to all sockets in that directory; sockets of dead workers
+    are removed on the first failed send. Messages must fit in one datagram
+    (a few hundred KiB by default on Linux).
+    """
+
+    name = "localsocket"
+    publish_timeout = 1.0
+
+    def __init__(self, path: str, channel: str = "socketio", write_only: bool = False, logger=None):
+        super().__init__(channel=channel, write_only=write_only, logger=logger)
+        self.socket_dir = Path(path) / channel
+        self.socket_dir.mkdir(parents=True, exist_ok=True)
+        self.socket_path = self.socket_dir / f"{self.host_id}.sock"
+        self._sender = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        self._sender.setblocking(False)
+
+    async def _publish(self, data):
+        payload = dumps_json(data)
+        loop = asyncio.get_running_loop()
+        for peer in self.socket_dir.glob("*.sock"):
+            try:
+                await asyncio.wait_for(
+                    loop.sock_sendto(self._sender, payload, str(peer)), self.publish_timeout
+                )
+            except (ConnectionRefusedError, FileNotFoundError):
+                peer.unlink(missing_ok=True)
+            except (asyncio.TimeoutError, OSError) as exc:
+                print(f"⚠️  Socket.IO publish to {peer.name} dropped: {exc!r}")
+
+    async def _listen(self):
+        receiver = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        receiver.setblocking(False)
+        self.socket_path.unlink(missing_ok=True)
+        receiver.bind(str(self.socket_path))
+        try:
+            loop = asyncio.get_running_loop()
+            while True:
+                yield await loop.sock_recv(receiver, 1 << 20)
+        finally:
+            receiver.close()
+            self.socket_path.unlink(missing_ok=True)
+
+
+REPLAY_BUFFER_EVENTS = int(os.getenv("REPLAY_BUFFER_EVENTS", "100"))
+REPLAY_BUFFER_BYTES = int(os.getenv("REPLAY_BUFFER_BYTES", str(64 * 1024)))
+REPLAY_BUFFER_ROOMS = int(os.getenv("REPLAY_BUFFER_ROOMS", "2000"))
+REPLAY_BUFFER_TOTAL_BYTES = int(os.getenv("REPLAY_BUFFER_TOTAL_BYTES", str(32 * 1024 * 1024)))
+REPLAYED_EVENTS = {"new-message", "message-pinned", "reaction-added"}
+
+# Memory held per buffered event besides its text: the (seq, event, text)
+# tuple, the seq int and the deque slot; per room: the deque, its key and
+# the OrderedDict entry
+REPLAY_EVENT_OVERHEAD = sys.getsizeof((0, "", "")) + sys.getsizeof(1 << 40) + 8
+REPLAY_ROOM_OVERHEAD = sys.getsizeof(deque()) + sys.getsizeof(str(uuid.uuid4())) + 100
+
+
+class ReplayBuffer:
+    """
+    Recent channel events in memory, keyed by the channel's change seq, so a
+    reconnecting socket gets what it missed without touching the database.
+
+    Only the encoded text of each event is kept (orjson's `body` bytes carry
+    a buffer of several KiB however short the JSON is; the decoded str is
+    sized exactly), and sizes count what the process actually retains,
+    including the per-event and per-room bookkeeping, not the JSON length.
+    Each channel keeps at most max_events events and max_bytes, dropping the
+    oldest first; when there are more than max_rooms channels or they hold
+    more than max_total_bytes together, the channels used least recently
+    (written or resumed) are dropped whole.
+    events_after() only answers when it holds every seq after the client's;
+    otherwise the client falls back to GET /channels/{id}/changes.
+    """
+
+    def __init__(self, max_events: int, max_bytes: int, max_rooms: int, max_total_bytes: int):
+        self.max_events = max_events
+        self.max_bytes = max_bytes
+        self.max_rooms = max_rooms
+        self.max_total_bytes = max_total_bytes
+        # channel_id -> deque of (seq, event, text), ascending seq
+        self._rooms: "OrderedDict[str, deque]" = OrderedDict()
+        self._bytes: Dict[str, int] = {}
+        self._total_bytes = 0
+
+    @staticmethod
+    def _size(entry: Tuple[int, str, str]) -> int:
+        return sys.getsizeof(entry[2]) + REPLAY_EVENT_OVERHEAD
+
+    def _drop_oldest_room(self):
+        dropped, _ = self._rooms.popitem(last=False)
+        self._total_bytes -= self._bytes.pop(dropped)
+
+    def record(self, channel_id: str, seq: int, event: str, payload: EncodedPayload):
+        events = self._rooms.pop(channel_id, None)
+        if events is None:
+            events = deque()
+            self._bytes[channel_id] = REPLAY_ROOM_OVERHEAD
+            self._total_bytes += REPLAY_ROOM_OVERHEAD
+        self._rooms[channel_id] = events
+
+        # Concurrent requests may emit slightly out of seq order
+        index = len(events)
+        while index and events[index - 1][0] > seq:
+            index -= 1
+        if index and events[index - 1][0] == seq:
+            return
+        entry = (seq, event, payload.text)
+        events.insert(index, entry)
+        size = self._size(entry)
+        self._bytes[channel_id] += size
+        self._total_bytes += size
+
+        while events and (
+            len(events) > self.max_events or self._bytes[channel_id] > self.max_bytes
+        ):
+            size = self._size(events.popleft())
+            self._bytes[channel_id] -= size
+            self._total_bytes -= size
+
+        while self._rooms and (
+            len(self._rooms) > self.max_rooms or self._total_bytes > self.max_total_bytes
+        ):
+            self._drop_oldest_room()
+
+    def events_after(
+        self, channel_id: str, since: int
+    ) -> Optional[List[Tuple[str, EncodedPayload]]]:
+        """
+        (event, payload) for every seq after `since`, or None if the buffer
+        can't prove it has all of them (gap, evicted, or nothing recorded).
+        """
+        events = self._rooms.get(channel_id)
+        if not events or events[0][0] > since + 1:
+            return None
+        self._rooms.move_to_end(channel_id)
+
+        missed = []
+        expected = since + 1
+        for seq, event_name, encoded in events:
+            if seq < expected:
+                continue
+            if seq != expected:
+                return None
+            missed.append((event_name, EncodedPayload.from_text(encoded)))
+            expected += 1
+        return missed
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "rooms": len(self._rooms),
+            "events": sum(len(events) for events in self._rooms.values()),
+            "bytes": self._total_bytes,
+        }
+
+
+replay_buffer = ReplayBuffer(
+    REPLAY_BUFFER_EVENTS, REPLAY_BUFFER_BYTES, REPLAY_BUFFER_ROOMS, REPLAY_BUFFER_TOTAL_BYTES
+)
+
+
+def record_replayable(event: str, data: Any, room: Any):
+    if event not in REPLAYED_EVENTS or not isinstance(room, str) or not room.startswith("channel:"):
+        return
+    if not isinstance(data, dict) or not isinstance(data.get("seq"), int):
+        return
+    # Events relayed from other workers arrive as plain dicts
+    payload = data if isinstance(data, EncodedPayload) else EncodedPayload(data)
+    replay_buffer.record(room[len("channel:"):], data["seq"], event, payload)
+
+
+class ReplayRecorder:
+    """
+    Client manager mixin feeding channel events to replay_buffer as this
+    worker delivers them. Pub/sub managers deliver local and relayed events
+    through _handle_emit, the in-process manager through emit; recording the
+    same seq twice is a no-op.
+    """
+
+    async def emit(self, event, data, namespace=None, room=None, to=None, **kwargs):
+        record_replayable(event, data, to or room)
+        return await super().emit(event, data, namespace=namespace, room=room, to=to, **kwargs)
+
+    async def _handle_emit(self, message):
+        record_replayable(message["event"], message["data"], message.get("room"))
+        return await super()._handle_emit(message)
+
+
+class ReplayAsyncManager(ReplayRecorder, socketio.AsyncManager):
+    pass
+
+
+class ReplayRedisManager(ReplayRecorder, socketio.AsyncRedisManager):
+    pass
+
+
+class ReplayAioPikaManager(ReplayRecorder, socketio.AsyncAioPikaManager):
+    pass
+
+
+class ReplayLocalSocketManager(ReplayRecorder, LocalSocketManager):
+    pass
+
+
+def create_client_manager() -> socketio.AsyncManager:
+    """
+    Socket.IO client manager selected by SOCKETIO_MESSAGE_QUEUE:
+
+    - unset           -> in-process only (single worker)
+    - redis://...     -> Redis pub/sub (needs the `redis` package)
+    - amqp://...      -> RabbitMQ (needs the `aio_pika` package)
+    - local://<dir>   -> LocalSocketManager, workers on the same host
+
+    With a message queue, rooms and emits work across uvicorn workers and
+    nodes: each process delivers to the sockets it holds (and records every
+    channel event in its own replay buffer).
+    """
+    url = os.getenv("SOCKETIO_MESSAGE_QUEUE", "")
+    channel = os.getenv("SOCKETIO_CHANNEL", "gameplan")
+
+    if not url:
+        return ReplayAsyncManager()
+    if url.startswith(("redis://", "rediss://", "redis+sentinel://")):
+        return ReplayRedisManager(url, channel=channel)
+    if url.startswith(("amqp://", "amqps://")):
+        return ReplayAioPikaManager(url, channel=channel)
+    if url.startswith("local://"):
+        return ReplayLocalSocketManager(
+            url[len("local://"):] or tempfile.gettempdir(), channel=channel
+        )
+
+    raise ValueError(f"Unsupported SOCKETIO_MESSAGE_QUEUE: {url}")
+
+
+class InstrumentedAsyncServer(socketio.AsyncServer):
+    """
+    AsyncServer that counts emitted events and their local fan-out for /metrics.
+    """
+
+    async def emit(
+        self, event, data=None, to=None, room=None, skip_sid=None, namespace=None, **kwargs
+    ):
+        target = to or room
+        namespace_rooms = self.manager.rooms.get(namespace or "/", {})
+        socketio_events.inc(event)
+        socketio_recipients.inc(event, amount=len(namespace_rooms.get(target, ())))
+        await super().emit(
+            event, data, to=to, room=room, skip_sid=skip_sid, namespace=namespace, **kwargs
+        )
+
+    def socket_stats(self) -> Dict[str, int]:
+        namespace_rooms = self.manager.rooms.get("/", {})
+        named_rooms = [room for room in namespace_rooms if isinstance(room, str)]
+        return {
+            # The None room holds every socket connected to the namespace
+            "connected_clients": len(namespace_rooms.get(None, ())),
+            "workspace_rooms": sum(1 for room in named_rooms if room.startswith("workspace:")),
+            "channel_rooms": sum(1 for room in named_rooms if room.startswith("channel:")),
+        }
+
+
+sio = InstrumentedAsyncServer(
+    async_mode="asgi",
+    cors_allowed_origins="*",
+    client_manager=create_client_manager(),
+    json=SocketJSON,
+)
+
+
+@sio.event
+async def connect(sid, environ, auth):
+    # Clients may identify themselves right away with auth: { user_id }
+    if isinstance(auth, dict) and auth.get("user_id"):
+        presence_tracker.attach(sid, str(auth["user_id"]), time.monotonic())
+    print(f"🔗 Socket connected: {sid}")
+
+
+@sio.event
+async def disconnect(sid):
+    typing_tracker.forget_sid(sid)
+    presence_tracker.detach(sid, time.monotonic())
+    print(f"🔌 Socket disconnected: {sid}")
+
+
+def workspace_room(workspace_id: str) -> str:
+    return f"workspace:{workspace_id}"
+
+
+def channel_room(channel_id: str) -> str:
+    return f"channel:{channel_id}"
+
+
+async def leave_rooms_with_prefix(sid, prefix: str, keep: Optional[str] = None):
+    for room in sio.rooms(sid):
+        if room.startswith(prefix) and room != keep:
+            await sio.leave_room(sid, room)
+
+
+@sio.event
+async def join_workspace(sid, workspace_id: str):
+    """
+    Let clients join a workspace-specific room (workspace-wide events).
+    """
+    await sio.enter_room(sid, workspace_room(workspace_id))
+    presence_tracker.note_workspace(sid, workspace_id)
+    print(f"🚪 Socket {sid} joined workspace room {workspace_id}")
+
+
+@sio.event
+async def leave_workspace(sid, workspace_id: str):
+    await sio.leave_room(sid, workspace_room(workspace_id))
+    print(f"🚪 Socket {sid} left workspace room {workspace_id}")
+
+
+@sio.event
+async def join_channel(sid, channel_id: str):
+    """
+    Channel rooms receive message, pin, reaction and typing events.
+    """
+    await sio.enter_room(sid, channel_room(channel_id))
+
+
+@sio.event
+async def leave_channel(sid, channel_id: str):
+    await sio.leave_room(sid, channel_room(channel_id))
+
+
+@sio.event
+async def switch_channel(sid, data):
+    """
+    Move a socket to another channel (and optionally workspace) in one event.
+
+    Payload: { workspace_id?: string, channel_id: string, since?: number }
+
+    With `since` (the last seq the client applied, after a reconnect) the
+    events it missed are replayed from replay_buffer and the ack is
+    { resumed: true, replayed }; { resumed: false } means the buffer doesn't
+    reach back that far and the client should call GET /channels/{id}/changes.
+    """
+    if not isinstance(data, dict) or not data.get("channel_id"):
+        return
+
+    target_channel = channel_room(data["channel_id"])
+    await leave_rooms_with_prefix(sid, "channel:", keep=target_channel)
+    await sio.enter_room(sid, target_channel)
+
+    if data.get("workspace_id"):
+        target_workspace = workspace_room(data["workspace_id"])
+        await leave_rooms_with_prefix(sid, "workspace:", keep=target_workspace)
+        await sio.enter_room(sid, target_workspace)
+        presence_tracker.note_workspace(sid, data["workspace_id"])
+
+    since = data.get("since")
+    if not isinstance(since, int):
+        return
+
+    # Joined first: anything emitted from here on arrives live
+    missed = replay_buffer.events_after(data["channel_id"], since)
+    if missed is None:
+        socketio_replays.inc("database")
+        return {"resumed": False}
+
+    socketio_replays.inc("memory")
+    socketio_replayed_events.inc(amount=len(missed))
+    for event_name, payload in missed:
+        await sio.emit(event_name, payload, to=sid)
+    return {"resumed": True, "replayed": len(missed)}
+
+
+TYPING_TTL = float(os.getenv("TYPING_TTL", "5"))
+TYPING_THROTTLE = float(os.getenv("TYPING_THROTTLE", "1"))
+TYPING_FLUSH_INTERVAL = float(os.getenv("TYPING_FLUSH_INTERVAL", "0.5"))
+
+
+class TypingTracker:
+    """
+    Who is typing where, coalesced into per-channel snapshots.
+
+    Keystroke events only refresh an expiry timestamp (at most once per
+    TYPING_THROTTLE per user); flush() reports the channels whose set of
+    typists changed since the last flush, including entries that expired
+    after TYPING_TTL, so a typing storm costs one frame per channel per
+    flush interval at most, and none while the set is stable.
+
+    State is per process: with several workers each one reports the typists
+    whose sockets it holds.
+    """
+
+    def __init__(self, ttl: float, throttle: float):
+        self.ttl = ttl
+        self.throttle = throttle
+        # channel_id -> user key -> (expires_at, last_accepted, user info)
+        self._typing: Dict[str, Dict[str, Tuple[float, float, Dict[str, Any]]]] = {}
+        self._by_sid: Dict[str, set] = {}
+        self._dirty: set = set()
+
+    def record(self, sid: str, data: Dict[str, Any], now: float):
+        channel_id = data["channel_id"]
+        user_key = str(data.get("id") or sid)
+
+        if data.get("is_typing") is False:
+            if self._typing.get(channel_id, {}).pop(user_key, None):
+                self._dirty.add(channel_id)
+            return
+
+        users = self._typing.setdefault(channel_id, {})
+        entry = users.get(user_key)
+        if entry and now - entry[1] < self.throttle:
+            return
+
+        info = {"id": user_key, "name": data.get("name")}
+        users[user_key] = (now + self.ttl, now, info)
+        self._by_sid.setdefault(sid, set()).add((channel_id, user_key))
+        if not entry or entry[2] != info:
+            self._dirty.add(channel_id)
+
+    def forget_sid(self, sid: str):
+        for channel_id, user_key in self._by_sid.pop(sid, ()):
+            if self._typing.get(channel_id, {}).pop(user_key, None):
+                self._dirty.add(channel_id)
+
+    def flush(self, now: float) -> List[Tuple[str, Dict[str, Any]]]:
+        """
+        Expire stale typists and return (channel_id, snapshot) for every
+        channel whose typists changed.
+        """
+        for channel_id, users in self._typing.items():
+            expired = [key for key, (expires_at, _, _) in users.items() if expires_at <= now]
+            for key in expired:
+                del users[key]
+            if expired:
+                self._dirty.add(channel_id)
+
+        snapshots = []
+        for channel_id in self._dirty:
+            users = self._typing.get(channel_id, {})
+            snapshots.append(
+                (
+                    channel_id,
+                    {"channel_id": channel_id, "users": [info for _, _, info in users.values()]},
+                )
+            )
+            if not users:
+                self._typing.pop(channel_id, None)
+
+        self._dirty.clear()
+        return snapshots
+
+
+typing_tracker = TypingTracker(ttl=TYPING_TTL, throttle=TYPING_THROTTLE)
+
+
+@sio.event
+async def typing(sid, data):
+    """
+    Typing indicator support (optional).
+    Emit `socket.emit("typing", { channel_id, id, name, is_typing? })` while
+    typing (every keystroke is fine; the server throttles) and
+    `is_typing: false` when done. Members of the channel room receive
+    coalesced `typing_users` snapshots: { channel_id, users: [{ id, name }] }.
+    """
+    if not isinstance(data, dict) or not data.get("channel_id"):
+        return
+
+    typing_tracker.record(sid, data, time.monotonic())
+
+
+async def flush_typing_snapshots():
+    """
+    Background loop: emit the changed typing snapshots every TYPING_FLUSH_INTERVAL.
+    """
+    while True:
+        await asyncio.sleep(TYPING_FLUSH_INTERVAL)
+        for channel_id, snapshot in typing_tracker.flush(time.monotonic()):
+            await sio.emit("typing_users", snapshot, room=channel_room(channel_id))
+
+
+PRESENCE_IDLE_AFTER = float(os.getenv("PRESENCE_IDLE_AFTER", "300"))
+PRESENCE_OFFLINE_GRACE = float(os.getenv("PRESENCE_OFFLINE_GRACE", "15"))
+PRESENCE_FLUSH_INTERVAL = float(os.getenv("PRESENCE_FLUSH_INTERVAL", "5"))
+PRESENCE_WORKER_TIMEOUT = float(os.getenv("PRESENCE_WORKER_TIMEOUT", "60"))
+
+# A user's status across workers is the best one any worker sees
+STATUS_RANK = {UserStatus.offline: 0, UserStatus.away: 1, UserStatus.online: 2}
+
+
+class PresenceTracker:
+    """
+    This worker's view of presence: which of its sockets belong to which
+    user, and whether the user is online, away (idle for PRESENCE_IDLE_AFTER
+    or reported idle by the client) or offline (no socket left here for
+    PRESENCE_OFFLINE_GRACE).
+
+    A flush runs in two steps around sync_presence, which shares this view
+    with the other workers (presence_sockets): collect() returns what
+    changed here, publish() merges it with the other workers' statuses and
+    returns only net changes of the merged status since the previous flush.
+    So a user who drops and reconnects within the grace period (a deploy's
+    reconnect storm) produces no broadcast and no database write at all,
+    and a user whose last socket here closed stays online while another
+    worker still holds one.
+    """
+
+    def __init__(self, idle_after: float, offline_grace: float):
+        self.idle_after = idle_after
+        self.offline_grace = offline_grace
+        self._user_by_sid: Dict[str, str] = {}
+        self._sids: Dict[str, set] = {}
+        self._last_active: Dict[str, float] = {}
+        self._idle: set = set()
+        self._disconnected_at: Dict[str, float] = {}
+        self._workspaces: Dict[str, set] = {}
+        # (status, sockets) last written to presence_sockets for each user
+        self._synced: Dict[str, Tuple[UserStatus, int]] = {}
+        # Merged status last broadcast / persisted for each tracked user
+        self._published: Dict[str, UserStatus] = {}
+
+    def attach(self, sid: str, user_id: str, now: float):
+        previous = self._user_by_sid.get(sid)
+        if previous == user_id:
+            return
+        if previous:
+            self.detach(sid, now)
+
+        self._user_by_sid[sid] = user_id
+        self._sids.setdefault(user_id, set()).add(sid)
+        self._disconnected_at.pop(user_id, None)
+        self._last_active[user_id] = now
+
+    def heartbeat(self, sid: str, user_id: str, idle: bool, now: float):
+        self.attach(sid, user_id, now)
+        if idle:
+            self._idle.add(user_id)
+        else:
+            self._idle.discard(user_id)
+            self._last_active[user_id] = now
+
+    def note_workspace(self, sid: str, workspace_id: str):
+        user_id = self._user_by_sid.get(sid)
+        if user_id:
+            self._workspaces.setdefault(user_id, set()).add(workspace_id)
+
+    def detach(self, sid: str, now: float):
+        user_id = self._user_by_sid.pop(sid, None)
+        if not user_id:
+            return
+
+        sids = self._sids.get(user_id, set())
+        sids.discard(sid)
+        if not sids:
+            self._disconnected_at[user_id] = now
+
+    def status(self, user_id: str, now: float) -> UserStatus:
+        disconnected_at = self._disconnected_at.get(user_id)
+        if disconnected_at is not None:
+            if now - disconnected_at >= self.offline_grace:
+                return UserStatus.offline
+            return self._published.get(user_id, UserStatus.online)
+
+        if user_id in self._idle or now - self._last_active[user_id] >= self.idle_after:
+            return UserStatus.away
+        return UserStatus.online
+
+    def collect(self, now: float) -> Tuple[Dict[str, UserStatus], Dict[str, Tuple[UserStatus, int]]]:
+        """
+        The local status of every user whose merged status must be
+        recomputed (changed here, or offline here and waiting for the other
+        workers to let go), and the (status, sockets) to write for those
+        that changed since the last sync.
+        """
+        local, writes = {}, {}
+        for user_id in self._last_active:
+            status = self.status(user_id, now)
+            synced = (status, len(self._sids.get(user_id, ())))
+            if self._synced.get(user_id) != synced:
+                writes[user_id] = synced
+            if user_id in writes or status == UserStatus.offline:
+                local[user_id] = status
+        return local, writes
+
+    def holds_users(self) -> bool:
+        return bool(self._synced)
+
+    def publish(
+        self,
+        local: Dict[str, UserStatus],
+        writes: Dict[str, Tuple[UserStatus, int]],
+        elsewhere: Dict[str, UserStatus],
+    ) -> List[Tuple[str, UserStatus, set]]:
+        """
+        Record a successful sync and return (user_id, new status, workspace
+        ids) for every user whose merged status changed since the last
+        flush. Users offline on every worker are forgotten.
+        """
+        self._synced.update(writes)
+        changes = []
+        for user_id, status in local.items():
+            merged = max(status, elsewhere.get(user_id, UserStatus.offline), key=STATUS_RANK.get)
+            if self._published.get(user_id) != merged:
+                self._published[user_id] = merged
+                changes.append((user_id, merged, set(self._workspaces.get(user_id, ()))))
+
+            if merged == UserStatus.offline:
+                for state in (self._sids, self._last_active, self._disconnected_at,
+                              self._workspaces, self._synced, self._published):
+                    state.pop(user_id, None)
+                self._idle.discard(user_id)
+
+        return changes
+
+
+presence_tracker = PresenceTracker(
+    idle_after=PRESENCE_IDLE_AFTER, offline_grace=PRESENCE_OFFLINE_GRACE
+)
+
+
+@sio.event
+async def heartbeat(sid, data):
+    """
+    Presence heartbeat: { user_id, idle?: boolean }. Clients send it on
+    connect, periodically and whenever the user becomes idle / active.
+    """
+    if not isinstance(data, dict) or not data.get("user_id"):
+        return
+
+    presence_tracker.heartbeat(sid, str(data["user_id"]), bool(data.get("idle")), time.monotonic())
+    for room in sio.rooms(sid):
+        if room.startswith("workspace:"):
+            presence_tracker.note_workspace(sid, room[len("workspace:"):])
+
+
+def sync_presence(
+    db: Session,
+    writes: Dict[str, Tuple[UserStatus, int]],
+    user_ids: List[str],
+) -> Dict[str, UserStatus]:
+    """
+    Write this worker's presence_sockets rows (a user offline here loses
+    its row), mark the worker alive, drop the rows of workers gone for
+    PRESENCE_WORKER_TIMEOUT, and return the best status the other live
+    workers have for `user_ids`.
+    """
+    now = datetime.utcnow()
+    if writes:
+        db.query(PresenceSocket).filter(
+            PresenceSocket.worker_id == WORKER_ID,
+            PresenceSocket.user_id.in_(list(writes)),
+        ).delete(synchronize_session=False)
+        rows = [
+            {"worker_id": WORKER_ID, "user_id": user_id, "sockets": sockets, "status": status.value}
+            for user_id, (status, sockets) in writes.items()
+            if status != UserStatus.offline
+        ]
+        if rows:
+            db.execute(PresenceSocket.__table__.insert(), rows)
+
+    if not db.query(PresenceWorker).filter(
+        PresenceWorker.worker_id == WORKER_ID
+    ).update({PresenceWorker.updated_at: now}, synchronize_session=False):
+        db.add(PresenceWorker(worker_id=WORKER_ID, updated_at=now))
+
+    stale = PresenceWorker.updated_at < now - timedelta(seconds=PRESENCE_WORKER_TIMEOUT)
+    db.query(PresenceSocket).filter(
+        PresenceSocket.worker_id.in_(select(PresenceWorker.worker_id).where(stale))
+    ).delete(synchronize_session=False)
+    db.query(PresenceWorker).filter(stale).delete(synchronize_session=False)
+
+    elsewhere: Dict[str, UserStatus] = {}
+    if user_ids:
+        rows = db.query(PresenceSocket.user_id, PresenceSocket.status).filter(
+            PresenceSocket.user_id.in_(user_ids),
+            PresenceSocket.worker_id != WORKER_ID,
+        )
+        for user_id, status in rows:
+            status = UserStatus(status)
+            if STATUS_RANK[status] > STATUS_RANK[elsewhere.get(user_id, UserStatus.offline)]:
+                elsewhere[user_id] = status
+    db.commit()
+    return elsewhere
+
+
+def persist_presence(db: Session, changes: List[Tuple[str, UserStatus, set]]):
+    """
+    Write a flush's status changes with one UPDATE per status value.
+    """
+    by_status: Dict[UserStatus, List[str]] = {}
+    for user_id, status, _ in changes:
+        by_status.setdefault(status, []).append(user_id)
+
+    for status, user_ids in by_status.items():
+        db.query(User).filter(User.id.in_(user_ids)).update(
+            {User.status: status}, synchronize_session=False
+        )
+    db.commit()
+
+
+async def flush_presence():
+    """
+    Background loop: every PRESENCE_FLUSH_INTERVAL, share this worker's
+    presence (sync_presence), then broadcast the net changes of the merged
+    status to each affected workspace room and persist them in one batch.
+    """
+    while True:
+        await asyncio.sleep(PRESENCE_FLUSH_INTERVAL)
+        local, writes = presence_tracker.collect(time.monotonic())
+        if not local and not presence_tracker.holds_users():
+            continue
+
+        try:
+            elsewhere = await run_db(sync_presence, writes, list(local))
+        except Exception as exc:
+            # Nothing is published; the next flush collects the same changes
+            print(f"⚠️  Presence sync failed: {exc!r}")
+            continue
+        changes = presence_tracker.publish(local, writes, elsewhere)
+        if not changes:
+            continue
+
+        by_workspace: Dict[str, List[Dict[str, str]]] = {}
+        for user_id, status, workspace_ids in changes:
+            for workspace_id in workspace_ids:
+                by_workspace.setdefault(workspace_id, []).append(
+                    {"user_id": user_id, "status": status.value}
+                )
+        for workspace_id, diff in by_workspace.items():
+            await sio.emit("presence", {"changes": diff}, room=workspace_room(workspace_id))
+
+        try:
+            await run_db(persist_presence, changes)
+        except Exception as exc:
+            print(f"⚠️  Presence flush failed: {exc!r}")
+
+
+# ------------------------------------------------------
+# FASTAPI APP
+# ------------------------------------------------------
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    init_db()
+    tasks = [
+        asyncio.create_task(
+            run_periodically(ATTACHMENT_GC_INTERVAL, collect_orphan_attachments)
+        ),
+        asyncio.create_task(flush_typing_snapshots()),
+        asyncio.create_task(flush_presence()),
+        asyncio.create_task(resume_background_jobs()),
+    ]
+    yield
+    for task in tasks:
+        task.cancel()
+
+
+fastapi_app = FastAPI(
+    title="Team Chat API", lifespan=lifespan, default_response_class=FastJSONResponse
+)
+fastapi_app.router.route_class = ProfiledRoute
+
+fastapi_app.add_middleware(ProfilingMiddleware)
+fastapi_app.add_middleware(MetricsMiddleware)
+fastapi_app.add_middleware(
+  CORSMiddleware,
+  allow_origins=["*"],  # dev; restrict in prod
+  allow_credentials=True,
+  allow_methods=["*"],
+  allow_headers=["*"],
+)
+
+UPLOAD_DIR = Path(__file__).resolve().parent / "uploads"
+UPLOAD_DIR.mkdir(exist_ok=True)
+UPLOAD_CHUNK_SIZE = int(os.getenv("UPLOAD_CHUNK_SIZE", str(64 * 1024)))
+UPLOAD_MAX_BYTES = int(os.getenv("UPLOAD_MAX_BYTES", str(25 * 1024 * 1024)))
+BLOB_DIR = UPLOAD_DIR / "blobs"
+ATTACHMENT_GC_INTERVAL = float(os.getenv("ATTACHMENT_GC_INTERVAL", "3600"))
+ATTACHMENT_ORPHAN_GRACE = float(os.getenv("ATTACHMENT_ORPHAN_GRACE", "86400"))
+WORKSPACE_DELETE_BATCH = int(os.getenv("WORKSPACE_DELETE_BATCH", "1000"))
+WORKSPACE_DELETE_PAUSE = float(os.getenv("WORKSPACE_DELETE_PAUSE", "0.05"))
+BACKGROUND_JOB_STALE_AFTER = float(os.getenv("BACKGROUND_JOB_STALE_AFTER", "300"))
+MESSAGE_ID_MIGRATION_PAUSE = float(os.getenv("MESSAGE_ID_MIGRATION_PAUSE", "0.05"))
+fastapi_app.mount("/uploads", StaticFiles(directory=UPLOAD_DIR), name="uploads")
+
+
+def get_db() -> Session:
+    db = SessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+# Async endpoints must never run blocking Session calls on the event loop:
+# a slow commit there stalls every Socket.IO connection on this worker.
+# Their DB work goes through run_db(), which uses a bounded thread pool sized
+# to stay within the engine's connection pool.
+DB_EXECUTOR_WORKERS = int(os.getenv("DB_EXECUTOR_WORKERS", "8"))
+db_executor = ThreadPoolExecutor(max_workers=DB_EXECUTOR_WORKERS, thread_name_prefix="db")
+
+async def run_db(fn: Callable[..., T], *args: Any) -> T:
+    """
+    Run fn(db, *args) with its own session on the DB executor and await the result.
+    """
+
+    def call() -> T:
+        db = SessionLocal()
+        try:
+            return run_profiled(fn, db, *args)
+        finally:
+            db.close()
+
+    # Carry request-scoped context (metrics) into the worker thread
+    context = contextvars.copy_context()
+    return await asyncio.get_running_loop().run_in_executor(db_executor, context.run, call)
+
+
+async def run_periodically(interval: float, fn: Callable[[Session], Any]):
+    """
+    Background loop: run fn(db) through run_db every `interval` seconds.
+    """
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await run_db(fn)
+        except Exception as exc:
+            print(f"⚠️  Background job {fn.__name__} failed: {exc!r}")
+
+
+# Resumable background jobs (WorkspaceDeletionJob, MessageIdMigration) share
+# status / owner / updated_at / error columns. A job runs on the worker that
+# claimed it and records its progress only while it still owns it.
+
+
+def stale_job(model: Any):
+    """
+    Running jobs whose owner stopped updating them for
+    BACKGROUND_JOB_STALE_AFTER (it crashed or was shut down).
+    """
+    stale = datetime.utcnow() - timedelta(seconds=BACKGROUND_JOB_STALE_AFTER)
+    return and_(model.status == "running", model.updated_at < stale)
+
+
+def claim_job(db: Session, model: Any, job_id: str) -> bool:
+    """
+    Make this worker the job's owner, in one conditional UPDATE so that of
+    several workers trying at once exactly one succeeds. Pending jobs can be
+    claimed, and stale running ones.
+    """
+    claimed = (
+        db.query(model)
+        .filter(model.id == job_id, or_(model.status == "pending", stale_job(model)))
+        .update(
+            {model.status: "running", model.owner: WORKER_ID, model.updated_at: datetime.utcnow()},
+            synchronize_session=False,
+        )
+    )
+    db.commit()
+    return bool(claimed)
+
+
+def owned_job(db: Session, model: Any, job_id: str):
+    return db.query(model).filter(
+        model.id == job_id, model.owner == WORKER_ID, model.status == "running"
+    )
+
+
+def mark_job_failed(db: Session, model: Any, job_id: str, error: str):
+    owned_job(db, model, job_id).update(
+        {model.status: "failed", model.error: error, model.updated_at: datetime.utcnow()},
+        synchronize_session=False,
+    )
+    db.commit()
+
+
+def unfinished_job_ids(db: Session, model: Any) -> List[str]:
+    """
+    Jobs some worker should pick up: pending ones, and stale running ones.
+    claim_job decides which worker gets each.
+    """
+    return [
+        job_id
+        for (job_id,) in db.query(model.id)
+        .filter(or_(model.status == "pending", stale_job(model)))
+        .all()
+    ]
+
+
+async def resume_background_jobs():
+    """
+    Background loop: at startup and then every BACKGROUND_JOB_STALE_AFTER,
+    start the workspace deletions and message id migrations no worker is
+    running (each run claims its job first, so a job runs on one worker).
+    """
+    while True:
+        try:
+            for job_id in await run_db(unfinished_job_ids, WorkspaceDeletionJob):
+                start_workspace_deletion(job_id)
+            for job_id in await run_db(unfinished_job_ids, MessageIdMigration):
+                start_message_id_migration(job_id)
+        except Exception as exc:
+            print(f"⚠️  Background job resume_background_jobs failed: {exc!r}")
+        await asyncio.sleep(BACKGROUND_JOB_STALE_AFTER)
+
+
+# ------------------------------------------------------
+# HELPERS
+# ------------------------------------------------------
+
+
+MESSAGES_PAGE_SIZE = 50
+MESSAGES_MAX_PAGE_SIZE = 200
+CHANGES_PAGE_SIZE = 500
+CHANGES_MAX_PAGE_SIZE = 2000
+# Page messages on their id alone. Only correct once every message id is
+# time-ordered, i.e. once the POST /admin/migrations/message-ids job has completed.
+MESSAGE_ID_PAGINATION = env_flag("MESSAGE_ID_PAGINATION")
+
+
+class Uuid7Generator:
+    """
+    Time-ordered ids (RFC 9562 UUIDv7) in the same 36-character text form as
+    uuid4, so they fit the existing String(36) keys next to older random ids.
+
+    48-bit Unix milliseconds, then a 12-bit counter for ids minted in the
+    same millisecond (so one generator's ids strictly increase even if the
+    clock stalls or steps back), then 62 random bits. New rows therefore land
+    at the right-hand end of primary key and (channel_id, id) indexes.
+    """
+
+    EPOCH = datetime(1970, 1, 1)
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._last_ms = 0
+        self._counter = 0
+
+    def next(self, at: Optional[datetime] = None) -> Tuple[str, datetime]:
+        """
+        A new id and the (naive UTC) time it was minted at, or for `at`.
+        """
+        with self._lock:
+            now = at or datetime.utcnow()
+            ms = (now - self.EPOCH) // timedelta(milliseconds=1)
+            if ms > self._last_ms:
+                self._last_ms, self._counter = ms, 0
+            elif self._counter < 0xFFF:
+                self._counter += 1
+            else:
+                self._last_ms, self._counter = self._last_ms + 1, 0
+
+            value = (
+                (self._last_ms & (2**48 - 1)) << 80
+                | 0x7 << 76
+                | self._counter << 64
+                | 0b10 << 62
+                | int.from_bytes(os.urandom(8), "big") >> 2
+            )
+            return str(uuid.UUID(int=value)), now
+
+
+ids = Uuid7Generator()
+
+
+def new_id() -> str:
+    return ids.next()[0]
+
+
+def generate_invite_code(length: int = 10) -> str:
+    alphabet = string.ascii_uppercase + string.digits
+    return "".join(secrets.choice(alphabet) for _ in range(length))
+
+
+def serialize_user(user: User) -> ApiUser:
+    return {
+        "id": user.id,
+        "name": user.name,
+        "email": user.email,
+        "avatar": user.avatar or "",
+        # Frontend's ApiUser doesn't define status, but it's fine to send extra
+        "status": user.status.value if isinstance(user.status, UserStatus) else "online",
+    }
+
+
+def encode_message_cursor(msg: Message) -> str:
+    """
+    Opaque pagination cursor for a message: its (created_at, id) keyset position.
+    """
+    raw = f"{msg.created_at.isoformat()}|{msg.id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_message_cursor(cursor: str) -> Tuple[datetime, str]:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        created_at, message_id = base64.urlsafe_b64decode(padded).decode().split("|", 1)
+        return datetime.fromisoformat(created_at), message_id
+    except (ValueError, UnicodeDecodeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def group_reactions(
+    reactions: List[MessageReaction],
+) -> Dict[str, List[Dict[str, Any]]]:
+    """
+    Group reaction rows into { message_id: [{ emoji, count, users }] } in one pass.
+    """
+    grouped: Dict[str, Dict[str, Dict[str, Any]]] = {}
+    for r in reactions:
+        by_emoji = grouped.setdefault(r.message_id, {})
+        if r.emoji not in by_emoji:
+            by_emoji[r.emoji] = {"emoji": r.emoji, "count": 0, "users": []}
+        by_emoji[r.emoji]["count"] += 1
+        by_emoji[r.emoji]["users"].append(r.user_id)
+
+    return {message_id: list(by_emoji.values()) for message_id, by_emoji in grouped.items()}
+
+
+def serialize_messages(db: Session, msgs: List[Message]) -> List[ApiMessage]:
+    """
+    Shape matches your ApiMessage in TS:
+
+    interface ApiMessage {
+      id: string;
+      content: string;
+      timestamp: string;
+      user: ApiUser | null;
+      reactions: { emoji: string; count: number; users: string[] }[];
+      isPinned: boolean;
+      pinnedBy?: string;
+    }
+
+    Authors and reactions for the whole batch are loaded with one IN query
+    each, so a page costs 2 queries no matter how many messages it holds.
+    """
+    if not msgs:
+        return []
+
+    user_ids = {m.user_id for m in msgs if m.user_id}
+    users = (
+        {u.id: u for u in db.query(User).filter(User.id.in_(user_ids)).all()}
+        if user_ids
+        else {}
+    )
+
+    reactions = group_reactions(
+        db.query(MessageReaction)
+        .filter(MessageReaction.message_id.in_([m.id for m in msgs]))
+        .order_by(MessageReaction.id)
+        .all()
+    )
+
+    result: List[ApiMessage] = []
+    for msg in msgs:
+        user = users.get(msg.user_id)
+        result.append(
+            {
+                "id": msg.id,
+                "content": msg.content,
+                "timestamp": msg.created_at.isoformat(),
+                "user": serialize_user(user) if user else None,
+                "reactions": reactions.get(msg.id, []),
+                "isPinned": msg.is_pinned,
+                "pinnedBy": msg.pinned_by,
+            }
+        )
+
+    return result
+
+
+def record_channel_change(db: Session, channel_id: str, kind: str, message_id: str) -> int:
+    """
+    Log a change under the channel's next sequence number and return it.
+    Does not commit; the channel's sequence row stays locked until the caller
+    does, so changes become visible in sequence order.
+    """
+    seq = reserve_channel_seqs(db, channel_id, 1)
+    db.add(ChannelChange(channel_id=channel_id, seq=seq, kind=kind, message_id=message_id))
+    return seq
+
+
+def reserve_channel_seqs(db: Session, channel_id: str, count: int) -> int:
+    """
+    Advance the channel's sequence by `count` and return the new value; the
+    caller owns the numbers (value - count, value]. The row stays locked
+    until the caller commits.
+
+    Every write to a channel passes here, so this is also where writes to a
+    missing channel (404) or a workspace being deleted (409) are refused:
+    the deletion job drains channel_sequences first, which waits for the
+    writes holding these locks.
+    """
+    deleting = exists().where(
+        Channel.id == channel_id, WorkspaceDeletionJob.workspace_id == Channel.workspace_id
+    )
+    sequence = db.query(ChannelSequence).filter(ChannelSequence.channel_id == channel_id)
+    bumped = sequence.filter(~deleting).update(
+        {ChannelSequence.seq: ChannelSequence.seq + count}, synchronize_session=False
+    )
+    if not bumped:
+        channel = db.query(Channel.workspace_id).filter(Channel.id == channel_id).first()
+        if not channel:
+            raise HTTPException(status_code=404, detail="Channel not found")
+        ensure_workspace_writable(db, channel.workspace_id)
+        db.add(ChannelSequence(channel_id=channel_id, seq=count))
+        db.flush()
+
+    return sequence.with_entities(ChannelSequence.seq).scalar()
+
+
+def current_channel_seq(db: Session, channel_id: str) -> int:
+    return (
+        db.query(ChannelSequence.seq).filter(ChannelSequence.channel_id == channel_id).scalar()
+        or 0
+    )
+
+
+# ------------------------------------------------------
+# CACHES
+# ------------------------------------------------------
+
+
+class UserCache:
+    """
+    Small per-user, in-process result cache with hit/miss counters.
+
+    Entries expire after `ttl` seconds so other workers' writes (which can't
+    invalidate this process) are picked up eventually; writes handled by this
+    process invalidate affected users immediately.
+    """
+
+    def __init__(self, ttl: float):
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries: Dict[str, Tuple[float, Any]] = {}
+        self._lock = threading.Lock()
+
+    def get(self, user_id: str) -> Optional[Any]:
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry and entry[0] > time.monotonic():
+                self.hits += 1
+                return entry[1]
+
+            self._entries.pop(user_id, None)
+            self.misses += 1
+            return None
+
+    def set(self, user_id: str, value: Any):
+        with self._lock:
+            self._entries[user_id] = (time.monotonic() + self.ttl, value)
+
+    def invalidate(self, *user_ids: str):
+        with self._lock:
+            for user_id in user_ids:
+                self._entries.pop(user_id, None)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "size": len(self._entries)}
+
+
+WORKSPACE_CACHE_TTL = float(os.getenv("WORKSPACE_CACHE_TTL", "60"))
+my_workspaces_cache = UserCache(ttl=WORKSPACE_CACHE_TTL)
+
+
+# ------------------------------------------------------
+# USERS
+# ------------------------------------------------------
+
+
+def find_or_create_user(db: Session, request: UserCreate) -> User:
+    """
+    The user with this email, created (with a personal workspace) on first login.
+    """
+    existing = db.query(User).filter(User.email == request.email).first()
+    if existing:
+        return existing
+
+    new_user = User(
+        id=new_id(),
+        name=request.name or request.email.split("@")[0],
+        email=request.email,
+        avatar=request.avatar,
+    )
+    db.add(new_user)
+
+    try:
+        db.commit()
+    except IntegrityError:
+        db.rollback()
+        existing = db.query(User).filter(User.email == request.email).first()
+        if existing:
+            return existing
+        raise
+
+    db.refresh(new_user)
+
+    # Create personal workspace on first login
+    personal_ws = Workspace(
+        id=new_id(),
         name=f"{new_user.name}'s Space",
         description="Your personal workspace",
         owner_id=new_user.id,
         is_personal=True,
         invite_code=generate_invite_code(),
     )
-    db.add(personal_ws)
-    db.commit()
-    db.refresh(personal_ws)
+    db.add(personal_ws)
+    db.commit()
+    db.refresh(personal_ws)
+
+    member = WorkspaceMember(
+        workspace_id=personal_ws.id,
+        user_id=new_user.id,
+        role="owner",
+    )
+    db.add(member)
+    db.commit()
+    my_workspaces_cache.invalidate(new_user.id)
+
+    print("📥 /users/me body:", request.dict())
+
+    return new_user
+
+
+@fastapi_app.post("/users/me")
+def get_or_create_user(request: UserCreate, db: Session = Depends(get_db)):
+    """
+    Create or return the backend user (TeamChannelInterface gets it from
+    POST /bootstrap along with the rest of the first screen).
+
+    Body: { name, email, avatar }
+    Returns: ApiUser
+    """
+    return serialize_user(find_or_create_user(db, request))
+
+
+# ------------------------------------------------------
+# WORKSPACES
+# ------------------------------------------------------
+
+
+def list_my_workspaces(db: Session, user_id: str) -> List[WorkspaceSummary]:
+    """
+    The user's workspaces, memberships first; cached per worker (my_workspaces_cache).
+    """
+    cached = my_workspaces_cache.get(user_id)
+    if cached is not None:
+        return cached
+
+    # One query: memberships first (in join order), then workspaces the user
+    # owns without a membership row, which are reported with role "owner".
+    rows = (
+        db.query(Workspace, WorkspaceMember.role)
+        .outerjoin(
+            WorkspaceMember,
+            and_(
+                WorkspaceMember.workspace_id == Workspace.id,
+                WorkspaceMember.user_id == user_id,
+            ),
+        )
+        # Same rows as "membership row or owner", written so each side is an
+        # index lookup (ix_workspace_members_user_id, ix_workspaces_owner_id)
+        # rather than a scan of workspaces filtered after the outer join
+        .filter(
+            or_(
+                Workspace.id.in_(
+                    select(WorkspaceMember.workspace_id).where(WorkspaceMember.user_id == user_id)
+                ),
+                Workspace.owner_id == user_id,
+            )
+        )
+        .filter(~exists().where(WorkspaceDeletionJob.workspace_id == Workspace.id))
+        .order_by(
+            case((WorkspaceMember.id.is_(None), 1), else_=0),
+            WorkspaceMember.id,
+            Workspace.created_at,
+        )
+        .all()
+    )
+
+    result: List[WorkspaceSummary] = [
+        {
+            "id": ws.id,
+            "name": ws.name,
+            "description": ws.description,
+            "role": role or "owner",
+            "is_personal": ws.is_personal,
+            "invite_code": ws.invite_code,
+        }
+        for ws, role in rows
+    ]
+
+    my_workspaces_cache.set(user_id, result)
+    return result
+
+
+@fastapi_app.get("/workspaces/my")
+def my_workspaces(user_id: str, db: Session = Depends(get_db)):
+    """
+    Used in TeamChannelInterface to populate workspace switcher.
+
+    Returns array of WorkspaceSummary:
+    { id, name, role, is_personal }
+    (We can also return description/invite_code as extra data.)
+    """
+    return list_my_workspaces(db, user_id)
+
+
+@fastapi_app.get("/workspaces/{workspace_id}")
+def get_workspace(workspace_id: str, db: Session = Depends(get_db)):
+    """
+    In case you need details on a single workspace.
+    """
+    ws = db.query(Workspace).filter(Workspace.id == workspace_id).first()
+    if not ws:
+        raise HTTPException(status_code=404, detail="Workspace not found")
+
+    return {
+        "id": ws.id,
+        "name": ws.name,
+        "description": ws.description,
+        "owner_id": ws.owner_id,
+        "is_personal": ws.is_personal,
+        "invite_code": ws.invite_code,
+    }
+
+
+@fastapi_app.post("/workspaces/create")
+def create_workspace(
+    body: WorkspaceCreate,
+    user_id: str = Query(..., description="Owner user id"),
+    db: Session = Depends(get_db),
+):
+    """
+    Used by CreateWorkspaceForm
+
+    Query: ?user_id=...
+    Body: { name, description, is_personal }
+    """
+    ws = Workspace(
+        id=new_id(),
+        name=body.name,
+        description=body.description or "",
+        owner_id=user_id,
+        is_personal=body.is_personal,
+        invite_code=generate_invite_code(),
+    )
+    db.add(ws)
+    db.commit()
+    db.refresh(ws)
+
+    member = WorkspaceMember(
+        workspace_id=ws.id,
+        user_id=user_id,
+        role="owner",
+    )
+    db.add(member)
+    db.commit()
+    my_workspaces_cache.invalidate(user_id)
+
+    return {
+        "workspace_id": ws.id,
+        "invite_code": ws.invite_code,
+    }
+
+
+@fastapi_app.post("/workspaces/join")
+def join_workspace_by_invite(body: JoinWorkspaceRequest, db: Session = Depends(get_db)):
+    """
+    Used by JoinWorkspaceForm
+
+    Body: { invite_code, user_id }
+    Returns: { workspace_id, role }
+    """
+    ws = (
+        db.query(Workspace)
+        .filter(Workspace.invite_code == body.invite_code)
+        .first()
+    )
+
+    if not ws:
+        raise HTTPException(status_code=400, detail="Invalid or expired invite code")
+    ensure_workspace_writable(db, ws.id)
+
+    def find_member():
+        return (
+            db.query(WorkspaceMember)
+            .filter(
+                WorkspaceMember.workspace_id == ws.id,
+                WorkspaceMember.user_id == body.user_id,
+            )
+            .first()
+        )
+
+    existing = find_member()
+    if existing:
+        return {"workspace_id": ws.id, "role": existing.role}
+
+    member = WorkspaceMember(
+        workspace_id=ws.id,
+        user_id=body.user_id,
+        role="member",
+    )
+    db.add(member)
+    try:
+        db.commit()
+    except IntegrityError:
+        # A concurrent join added the membership first
+        # (uq_workspace_members_workspace_user)
+        db.rollback()
+        return {"workspace_id": ws.id, "role": find_member().role}
+    db.refresh(member)
+    my_workspaces_cache.invalidate(body.user_id)
+
+    return {"workspace_id": ws.id, "role": member.role}
+
+
+WORKSPACE_DELETE_STAGES = [
+    # First: waits for in-flight channel writes, after which the workspace's
+    # channels take none (reserve_channel_seqs)
+    "channel_sequences",
+    "reaction_counts",
+    "reactions",
+    "attachments",
+    "channel_changes",
+    "messages",
+    "channels",
+    "members",
+    "workspace",
+]
+
+# Times a run starts over from the first stage when a stage hits a foreign
+# key error (rows written into the workspace while it was being drained)
+WORKSPACE_DELETE_RESTARTS = 3
+
+# Keeps running deletion tasks referenced (and prevents double starts)
+workspace_deletion_tasks: Dict[str, asyncio.Task] = {}
+
+
+def ensure_workspace_writable(db: Session, workspace_id: str):
+    """
+    409 once a deletion job exists for the workspace. Channel writes are
+    refused by reserve_channel_seqs; this covers new channels, members and
+    imports.
+    """
+    if db.query(exists().where(WorkspaceDeletionJob.workspace_id == workspace_id)).scalar():
+        raise HTTPException(status_code=409, detail="Workspace is being deleted")
+
+
+def restart_failed_deletion_job(db: Session, job: WorkspaceDeletionJob):
+    if job.status != "failed":
+        return
+
+    # Stages only delete what is left, so starting over is cheap and also
+    # picks up rows written while the failed run was in progress.
+    job.status = "pending"
+    job.stage = WORKSPACE_DELETE_STAGES[0]
+    job.error = None
+    job.updated_at = datetime.utcnow()
+    db.commit()
+    db.refresh(job)
+
+
+def serialize_deletion_job(job: WorkspaceDeletionJob) -> Dict[str, Any]:
+    return {
+        "job_id": job.id,
+        "workspace_id": job.workspace_id,
+        "status": job.status,
+        "stage": job.stage,
+        "deleted_rows": job.deleted_rows,
+        "error": job.error,
+        "created_at": job.created_at.isoformat(),
+        "finished_at": job.finished_at.isoformat() if job.finished_at else None,
+    }
+
+
+def create_deletion_job(db: Session, workspace_id: str, user_id: str) -> Dict[str, Any]:
+    ws = db.query(Workspace).filter(Workspace.id == workspace_id).first()
+    if not ws:
+        raise HTTPException(status_code=404, detail="Workspace not found")
+
+    if ws.is_personal:
+        raise HTTPException(status_code=400, detail="Cannot delete personal workspace")
+
+    if ws.owner_id != user_id:
+        raise HTTPException(status_code=403, detail="Only the owner can delete this workspace")
+
+    job = (
+        db.query(WorkspaceDeletionJob)
+        .filter(WorkspaceDeletionJob.workspace_id == workspace_id)
+        .order_by(WorkspaceDeletionJob.created_at.desc())
+        .first()
+    )
+    if not job:
+        job = WorkspaceDeletionJob(
+            id=str(uuid.uuid4()),
+            workspace_id=workspace_id,
+            requested_by=user_id,
+        )
+        db.add(job)
+        db.commit()
+        db.refresh(job)
+    else:
+        restart_failed_deletion_job(db, job)
+
+    # The workspace disappears from every member's list right away
+    member_ids = [
+        member_id
+        for (member_id,) in db.query(WorkspaceMember.user_id)
+        .filter(WorkspaceMember.workspace_id == workspace_id)
+        .all()
+    ]
+    my_workspaces_cache.invalidate(user_id, *member_ids)
+
+    return serialize_deletion_job(job)
+
+
+def delete_workspace_batch(db: Session, job_id: str) -> Optional[str]:
+    """
+    Delete at most WORKSPACE_DELETE_BATCH rows of the job's current stage using
+    set-based subquery deletes, and record progress in the same transaction
+    (deleted_rows is incremented in SQL, only while this worker owns the job).
+    Returns the job's status afterwards ("running" or "completed"), or None
+    once the job is no longer this worker's.
+    """
+    job = owned_job(db, WorkspaceDeletionJob, job_id).first()
+    if not job:
+        return None
+
+    workspace_id = job.workspace_id
+    channel_ids = select(Channel.id).where(Channel.workspace_id == workspace_id)
+    message_ids = select(Message.id).where(Message.channel_id.in_(channel_ids))
+
+    def batch_of(column, *criteria):
+        return select(column).where(*criteria).limit(WORKSPACE_DELETE_BATCH)
+
+    stage = job.stage
+    if stage == "reaction_counts":
+        deleted = (
+            db.query(MessageReactionCount)
+            .filter(
+                MessageReactionCount.id.in_(
+                    batch_of(
+                        MessageReactionCount.id,
+                        MessageReactionCount.message_id.in_(message_ids),
+                    )
+                )
+            )
+            .delete(synchronize_session=False)
+        )
+    elif stage == "reactions":
+        deleted = (
+            db.query(MessageReaction)
+            .filter(
+                MessageReaction.id.in_(
+                    batch_of(MessageReaction.id, MessageReaction.message_id.in_(message_ids))
+                )
+            )
+            .delete(synchronize_session=False)
+        )
+    elif stage == "attachments":
+        batch = db.query(Attachment).filter(
+            Attachment.id.in_(batch_of(Attachment.id, Attachment.message_id.in_(message_ids)))
+        )
+        deleted = batch.count()
+        if deleted:
+            release_attachments(db, batch)
+    elif stage == "channel_changes":
+        deleted = (
+            db.query(ChannelChange)
+            .filter(
+                ChannelChange.id.in_(
+                    batch_of(ChannelChange.id, ChannelChange.channel_id.in_(channel_ids))
+                )
+            )
+            .delete(synchronize_session=False)
+        )
+    elif stage == "messages":
+        deleted = (
+            db.query(Message)
+            .filter(Message.id.in_(batch_of(Message.id, Message.channel_id.in_(channel_ids))))
+            .delete(synchronize_session=False)
+        )
+    elif stage == "channel_sequences":
+        deleted = (
+            db.query(ChannelSequence)
+            .filter(
+                ChannelSequence.channel_id.in_(
+                    batch_of(ChannelSequence.channel_id, ChannelSequence.channel_id.in_(channel_ids))
+                )
+            )
+            .delete(synchronize_session=False)
+        )
+    elif stage == "channels":
+        deleted = (
+            db.query(Channel)
+            .filter(Channel.id.in_(batch_of(Channel.id, Channel.workspace_id == workspace_id)))
+            .delete(synchronize_session=False)
+        )
+    elif stage == "members":
+        deleted = (
+            db.query(WorkspaceMember)
+            .filter(
+                WorkspaceMember.id.in_(
+                    batch_of(WorkspaceMember.id, WorkspaceMember.workspace_id == workspace_id)
+                )
+            )
+            .delete(synchronize_session=False)
+        )
+    else:
+        deleted = (
+            db.query(Workspace)
+            .filter(Workspace.id == workspace_id)
+            .delete(synchronize_session=False)
+        )
+
+    now = datetime.utcnow()
+    progress = {
+        WorkspaceDeletionJob.deleted_rows: WorkspaceDeletionJob.deleted_rows + deleted,
+        WorkspaceDeletionJob.updated_at: now,
+    }
+    status = "running"
+    if stage == "workspace" or deleted < WORKSPACE_DELETE_BATCH:
+        next_index = WORKSPACE_DELETE_STAGES.index(stage) + 1
+        if next_index < len(WORKSPACE_DELETE_STAGES):
+            progress[WorkspaceDeletionJob.stage] = WORKSPACE_DELETE_STAGES[next_index]
+        else:
+            status = "completed"
+            progress[WorkspaceDeletionJob.status] = status
+            progress[WorkspaceDeletionJob.finished_at] = now
+
+    if not owned_job(db, WorkspaceDeletionJob, job_id).update(progress, synchronize_session=False):
+        # Claimed by another worker meanwhile; its run redoes this batch
+        db.rollback()
+        return None
+
+    db.commit()
+    return status
+
+
+def restart_deletion_stages(db: Session, job_id: str):
+    owned_job(db, WorkspaceDeletionJob, job_id).update(
+        {
+            WorkspaceDeletionJob.stage: WORKSPACE_DELETE_STAGES[0],
+            WorkspaceDeletionJob.updated_at: datetime.utcnow(),
+        },
+        synchronize_session=False,
+    )
+    db.commit()
+
+
+async def run_workspace_deletion(job_id: str):
+    """
+    Claim a deletion job, then drive it one batch (= one short transaction)
+    at a time, so it shares the DB executor fairly with chat traffic and
+    never holds long locks.
+    """
+    try:
+        if not await run_db(claim_job, WorkspaceDeletionJob, job_id):
+            return
+
+        restarts = 0
+        while True:
+            try:
+                status = await run_db(delete_workspace_batch, job_id)
+            except IntegrityError:
+                restarts += 1
+                if restarts > WORKSPACE_DELETE_RESTARTS:
+                    raise
+                print(f"🔁 Workspace deletion job {job_id}: rows written meanwhile, starting over")
+                await run_db(restart_deletion_stages, job_id)
+                continue
+
+            if status is None:
+                print(f"⚠️  Workspace deletion job {job_id} was taken over by another worker")
+                return
+            if status == "completed":
+                break
+            await asyncio.sleep(WORKSPACE_DELETE_PAUSE)
+        print(f"🗑️  Workspace deletion job {job_id} completed")
+    except Exception as exc:
+        print(f"⚠️  Workspace deletion job {job_id} failed: {exc!r}")
+        await run_db(mark_job_failed, WorkspaceDeletionJob, job_id, repr(exc))
+    finally:
+        workspace_deletion_tasks.pop(job_id, None)
+
+
+def start_workspace_deletion(job_id: str):
+    if job_id not in workspace_deletion_tasks:
+        workspace_deletion_tasks[job_id] = asyncio.create_task(run_workspace_deletion(job_id))
+
+
+@fastapi_app.delete("/workspaces/{workspace_id}", status_code=202)
+async def delete_workspace(
+    workspace_id: str,
+    user_id: str = Query(..., description="Owner user id"),
+):
+    """
+    Delete a workspace and all associated data.
+
+    Returns immediately with a job id; the data is removed in bounded batches
+    in the background. Poll GET /workspaces/deletion-jobs/{job_id} for progress.
+    """
+    job = await run_db(create_deletion_job, workspace_id, user_id)
+    start_workspace_deletion(job["job_id"])
+
+    return {"success": True, **job}
+
+
+@fastapi_app.get("/workspaces/deletion-jobs/{job_id}")
+def get_deletion_job(job_id: str, db: Session = Depends(get_db)):
+    job = db.query(WorkspaceDeletionJob).filter(WorkspaceDeletionJob.id == job_id).first()
+    if not job:
+        raise HTTPException(status_code=404, detail="Deletion job not found")
+
+    return serialize_deletion_job(job)
+
+
+def reset_deletion_job(db: Session, job_id: str) -> Dict[str, Any]:
+    job = db.query(WorkspaceDeletionJob).filter(WorkspaceDeletionJob.id == job_id).first()
+    if not job:
+        raise HTTPException(status_code=404, detail="Deletion job not found")
+
+    restart_failed_deletion_job(db, job)
+    return serialize_deletion_job(job)
+
+
+@fastapi_app.post("/workspaces/deletion-jobs/{job_id}/resume")
+async def resume_deletion_job(job_id: str):
+    job = await run_db(reset_deletion_job, job_id)
+    if job["status"] != "completed":
+        start_workspace_deletion(job_id)
+
+    return job
+
+
+# ------------------------------------------------------
+# CHANNELS
+# ------------------------------------------------------
+
+
+def serialize_channel(channel: Channel) -> ApiChannel:
+    return {
+        "id": channel.id,
+        "name": channel.name,
+        "description": channel.description,
+        "is_private": channel.is_private,
+    }
+
+
+def list_channels(db: Session, workspace_id: str) -> List[ApiChannel]:
+    channels = (
+        db.query(Channel)
+        .filter(Channel.workspace_id == workspace_id)
+        .order_by(Channel.created_at, Channel.id)
+        .all()
+    )
+    return [serialize_channel(c) for c in channels]
+
+
+def add_channel(
+    db: Session, workspace_id: str, name: str, description: Optional[str], is_private: bool
+) -> Channel:
+    """
+    Stage a new channel with its change sequence. Does not commit.
+    """
+    ch = Channel(
+        id=new_id(),
+        workspace_id=workspace_id,
+        name=name,
+        description=description or "",
+        is_private=is_private,
+    )
+    db.add(ch)
+    db.add(ChannelSequence(channel_id=ch.id, seq=0))
+    return ch
+
+
+@fastapi_app.get("/channels")
+def get_channels(workspace_id: str, db: Session = Depends(get_db)):
+    """
+    Used in TeamChannelInterface.loadChannels()
+    """
+    return list_channels(db, workspace_id)
+
+
+@fastapi_app.post("/channels")
+def create_channel(body: ChannelCreate, db: Session = Depends(get_db)):
+    """
+    Used in TeamChannelInterface.handleCreateChannel()
+    """
+    ensure_workspace_writable(db, body.workspace_id)
+    exists = (
+        db.query(Channel)
+        .filter(
+            Channel.workspace_id == body.workspace_id,
+            Channel.name == body.name,
+        )
+        .first()
+    )
+
+    if exists:
+        raise HTTPException(status_code=400, detail="Channel already exists")
+
+    ch = add_channel(db, body.workspace_id, body.name, body.description, body.is_private)
+    db.commit()
+    db.refresh(ch)
+
+    return serialize_channel(ch)
+
+
+@fastapi_app.get("/channels/{channel_id}/changes", response_model=ChannelChanges)
+def get_channel_changes(
+    channel_id: str,
+    since: int = Query(..., ge=0, description="Last change sequence the client has applied"),
+    limit: int = Query(CHANGES_PAGE_SIZE, ge=1, le=CHANGES_MAX_PAGE_SIZE),
+    db: Session = Depends(get_db),
+):
+    """
+    Used in TeamChannelInterface after a socket reconnect, with the last seq
+    seen from GET /messages or a socket event.
+
+    Changes after `since` are coalesced per message, so a message toggled ten
+    times is sent once, in its current state:
+
+    - messages: ApiMessage[] created after `since` (oldest first)
+    - updates:  { id, reactions, isPinned, pinnedBy }[] for older messages
+                whose pins or reactions changed
+
+    Returns { seq, has_more, messages, updates }; while has_more, call again
+    with since=seq.
+    """
+    changes = (
+        db.query(ChannelChange.seq, ChannelChange.kind, ChannelChange.message_id)
+        .filter(ChannelChange.channel_id == channel_id, ChannelChange.seq > since)
+        .order_by(ChannelChange.seq)
+        .limit(limit + 1)
+        .all()
+    )
+    has_more = len(changes) > limit
+    changes = changes[:limit]
+
+    created = {message_id for _, kind, message_id in changes if kind == "message"}
+    touched = {message_id for _, _, message_id in changes}
+    msgs = (
+        db.query(Message)
+        .filter(Message.id.in_(touched))
+        .order_by(Message.created_at, Message.id)
+        .all()
+        if touched
+        else []
+    )
+
+    messages, updates = [], []
+    for serialized in serialize_messages(db, msgs):
+        if serialized["id"] in created:
+            messages.append(serialized)
+        else:
+            updates.append(
+                {
+                    "id": serialized["id"],
+                    "reactions": serialized["reactions"],
+                    "isPinned": serialized["isPinned"],
+                    "pinnedBy": serialized["pinnedBy"],
+                }
+            )
+
+    return FastJSONResponse(
+        {
+            "seq": changes[-1].seq if changes else since,
+            "has_more": has_more,
+            "messages": messages,
+            "updates": updates,
+        }
+    )
+
+
+# ------------------------------------------------------
+# FILE UPLOADS
+# ------------------------------------------------------
+
+
+class StreamedUpload:
+    """
+    A multipart/form-data upload parsed as it arrives (python-multipart's
+    push parser fed from request.stream(), instead of Starlette's form
+    parsing, which spools the whole body to disk before the handler runs).
+
+    The `file` part goes straight into a temp file inside UPLOAD_DIR,
+    UPLOAD_CHUNK_SIZE at a time, with its SHA-256 computed on the fly and
+    UPLOAD_MAX_BYTES enforced as chunks come in. Other fields are kept as
+    short strings. The caller moves the temp file into place (same
+    filesystem, so the rename is atomic) and removes it on failure.
+    """
+
+    def __init__(self):
+        self.fields: Dict[str, str] = {}
+        self.filename: Optional[str] = None
+        self.content_type: Optional[str] = None
+        self.tmp_path: Optional[Path] = None
+        self.size = 0
+        self.digest = hashlib.sha256()
+        self.complete = False
+        # Parser callback state: the current part's headers and data
+        self._header_field = b""
+        self._header_value = b""
+        self._headers: Dict[bytes, bytes] = {}
+        self._part: Optional[str] = None
+        self._is_file = False
+        self._value = bytearray()
+        self._out = None
+        self._pending: List[bytes] = []
+
+    @property
+    def sha256(self) -> str:
+        return self.digest.hexdigest()
+
+    def callbacks(self) -> Dict[str, Callable]:
+        def on_header_field(data: bytes, start: int, end: int):
+            self._header_field += data[start:end]
+
+        def on_header_value(data: bytes, start: int, end: int):
+            self._header_value += data[start:end]
+
+        def on_header_end():
+            self._headers[self._header_field.lower()] = self._header_value
+            self._header_field = self._header_value = b""
+
+        def on_headers_finished():
+            _, options = parse_options_header(self._headers.get(b"content-disposition", b""))
+            self._part = options.get(b"name", b"").decode("utf-8", "replace")
+            self._is_file = self._part == "file" and b"filename" in options
+            if self._is_file:
+                if self.tmp_path is not None:
+                    raise HTTPException(status_code=400, detail="Only one file per upload")
+                self.filename = options[b"filename"].decode("utf-8", "replace")
+                content_type = self._headers.get(b"content-type")
+                self.content_type = content_type.decode("latin-1") if content_type else None
+                fd, tmp_name = tempfile.mkstemp(dir=UPLOAD_DIR, prefix=".upload-", suffix=".part")
+                self.tmp_path = Path(tmp_name)
+                self._out = os.fdopen(fd, "wb")
+
+        def on_part_data(data: bytes, start: int, end: int):
+            if self._is_file:
+                self.size += end - start
+                if self.size > UPLOAD_MAX_BYTES:
+                    raise HTTPException(
+                        status_code=413,
+                        detail=f"File exceeds maximum size of {UPLOAD_MAX_BYTES} bytes",
+                    )
+                chunk = data[start:end]
+                self.digest.update(chunk)
+                self._pending.append(chunk)
+            else:
+                self._value += data[start:end]
+                if len(self._value) > UPLOAD_CHUNK_SIZE:
+                    raise HTTPException(status_code=400, detail=f"Form field {self._part!r} is too large")
+
+        def on_part_end():
+            if not self._is_file and self._part:
+                self.fields[self._part] = self._value.decode("utf-8", "replace")
+            self._headers, self._part, self._is_file = {}, None, False
+            self._value = bytearray()
+
+        def on_end():
+            self.complete = True
+
+        return {
+            "on_header_field": on_header_field,
+            "on_header_value": on_header_value,
+            "on_header_end": on_header_end,
+            "on_headers_finished": on_headers_finished,
+            "on_part_data": on_part_data,
+            "on_part_end": on_part_end,
+            "on_end": on_end,
+        }
+
+    async def write_pending(self):
+        """
+        Write the file data parsed from the last body chunk, off the event loop.
+        """
+        if self._pending:
+            data, self._pending = b"".join(self._pending), []
+            await run_in_threadpool(self._out.write, data)
+
+    def close(self):
+        if self._out is not None:
+            self._out.close()
+
+    def discard(self):
+        self.close()
+        if self.tmp_path is not None:
+            self.tmp_path.unlink(missing_ok=True)
+
+
+async def stream_upload(request: Request) -> StreamedUpload:
+    """
+    Parse a multipart upload from the request body as it streams in
+    (StreamedUpload). Bodies whose Content-Length already exceeds the limit
+    are rejected before anything is read.
+    """
+    content_type, options = parse_options_header(request.headers.get("content-type", ""))
+    if content_type != b"multipart/form-data" or not options.get(b"boundary"):
+        raise HTTPException(status_code=400, detail="Expected a multipart/form-data body")
+
+    # Allows for the multipart framing and the other (short) fields
+    content_length = request.headers.get("content-length")
+    if content_length and content_length.isdigit() and (
+        int(content_length) > UPLOAD_MAX_BYTES + UPLOAD_CHUNK_SIZE
+    ):
+        raise HTTPException(
+            status_code=413, detail=f"File exceeds maximum size of {UPLOAD_MAX_BYTES} bytes"
+        )
+
+    upload = StreamedUpload()
+    parser = MultipartParser(options[b"boundary"], upload.callbacks())
+    try:
+        async for chunk in request.stream():
+            parser.write(chunk)
+            await upload.write_pending()
+        parser.finalize()
+        upload.close()
+        if not upload.complete:
+            raise MultipartParseError("body ends before the closing boundary")
+    except MultipartParseError as exc:
+        upload.discard()
+        raise HTTPException(status_code=400, detail=f"Invalid multipart body: {exc}")
+    except BaseException:
+        upload.discard()
+        raise
+
+    return upload
+
+
+def blob_path(sha256: str) -> Path:
+    """
+    Sharded content-addressed layout: blobs/ab/cd/abcd... keeps directories small.
+    """
+    return BLOB_DIR / sha256[:2] / sha256[2:4] / sha256
+
+
+def register_attachment(
+    db: Session,
+    tmp_path: Path,
+    size: int,
+    sha256: str,
+    name: str,
+    mime_type: Optional[str],
+    user_id: str,
+) -> Attachment:
+    """
+    Reference (or create) the blob for `sha256`, record the attachment and
+    move the streamed temp file into the content-addressed store.
+    """
+    updated = (
+        db.query(AttachmentBlob)
+        .filter(AttachmentBlob.sha256 == sha256)
+        .update({AttachmentBlob.ref_count: AttachmentBlob.ref_count + 1}, synchronize_session=False)
+    )
+    if not updated:
+        db.add(AttachmentBlob(sha256=sha256, size=size, ref_count=1))
+
+    attachment = Attachment(
+        # Random, not time-ordered: the id is all it takes to download the file
+        id=str(uuid.uuid4()),
+        sha256=sha256,
+        name=name,
+        mime_type=mime_type,
+        uploaded_by=user_id,
+    )
+
+    try:
+        # No relationship() orders the two INSERTs, so the blob row is flushed
+        # before the attachment referencing it
+        db.flush()
+        db.add(attachment)
+        db.commit()
+    except IntegrityError:
+        # Another upload of the same content created the blob concurrently
+        db.rollback()
+        db.query(AttachmentBlob).filter(AttachmentBlob.sha256 == sha256).update(
+            {AttachmentBlob.ref_count: AttachmentBlob.ref_count + 1}, synchronize_session=False
+        )
+        db.add(attachment)
+        db.commit()
+
+    # Only after commit: the GC unlinks a blob's file before committing the
+    # row's DELETE, so a missing file here means the row this upload just
+    # committed is a new one and the file is ours to put in place
+    target = blob_path(sha256)
+    if target.exists():
+        tmp_path.unlink(missing_ok=True)
+    else:
+        target.parent.mkdir(parents=True, exist_ok=True)
+        os.replace(tmp_path, target)
+
+    db.refresh(attachment)
+    return attachment
+
+
+def release_attachments(db: Session, attachment_query):
+    """
+    Delete the attachments matched by `attachment_query` and drop their blob
+    references. Does not commit; the GC removes blobs that reach zero.
+    """
+    counts = (
+        attachment_query.with_entities(Attachment.sha256, func.count(Attachment.id))
+        .group_by(Attachment.sha256)
+        .all()
+    )
+    for sha256, count in counts:
+        db.query(AttachmentBlob).filter(AttachmentBlob.sha256 == sha256).update(
+            {AttachmentBlob.ref_count: AttachmentBlob.ref_count - count}, synchronize_session=False
+        )
 
-    member = WorkspaceMember(
-        workspace_id=personal_ws.id,
-        user_id=new_user.id,
-        role="owner",
+    attachment_query.delete(synchronize_session=False)
+
+
+def collect_orphan_attachments(db: Session) -> Dict[str, int]:
+    """
+    Garbage collector for the attachment store:
+    1. attachments never sent in a message within ATTACHMENT_ORPHAN_GRACE
+    2. blobs no attachment references any more (file + row)
+    """
+    cutoff = datetime.utcnow() - timedelta(seconds=ATTACHMENT_ORPHAN_GRACE)
+    orphans = db.query(Attachment).filter(
+        Attachment.message_id.is_(None), Attachment.created_at < cutoff
     )
-    db.add(member)
-    db.commit()
+    orphan_count = orphans.count()
+    if orphan_count:
+        release_attachments(db, orphans)
+        db.commit()
 
-    print("📥 /users/me body:", request.dict())
+    # ref_count is the fast path; NOT EXISTS guards against any drift
+    candidates = [
+        sha256
+        for (sha256,) in db.query(AttachmentBlob.sha256)
+        .filter(
+            AttachmentBlob.ref_count <= 0,
+            ~exists().where(Attachment.sha256 == AttachmentBlob.sha256),
+        )
+        .all()
+    ]
+
+    # The file goes before the DELETE commits: until then the row (Postgres)
+    # or the database (SQLite) stays locked, so an upload of the same content
+    # on any worker waits in its ref_count UPDATE, then finds no row, inserts
+    # a new one and moves its own file into place after its commit
+    removed = 0
+    for sha256 in candidates:
+        deleted = (
+            db.query(AttachmentBlob)
+            .filter(
+                AttachmentBlob.sha256 == sha256,
+                AttachmentBlob.ref_count <= 0,
+                ~exists().where(Attachment.sha256 == AttachmentBlob.sha256),
+            )
+            .delete(synchronize_session=False)
+        )
+        if deleted:
+            blob_path(sha256).unlink(missing_ok=True)
+            removed += 1
+        db.commit()
+
+    if orphan_count or removed:
+        print(f"🧹 Attachment GC: {orphan_count} orphaned uploads, {removed} blobs removed")
+
+    return {"orphaned_attachments": orphan_count, "removed_blobs": removed}
+
+
+@fastapi_app.post(
+    "/files/upload",
+    openapi_extra={
+        "requestBody": {
+            "required": True,
+            "content": {
+                "multipart/form-data": {
+                    "schema": {
+                        "type": "object",
+                        "required": ["user_id", "file"],
+                        "properties": {
+                            "user_id": {"type": "string"},
+                            "file": {"type": "string", "format": "binary"},
+                        },
+                    }
+                }
+            },
+        }
+    },
+)
+async def upload_workspace_file(request: Request):
+    """
+    Upload an attachment for chat messages (multipart form: user_id, file).
+    Returns metadata consumed by the frontend.
+
+    Content is stored once per SHA-256 under uploads/blobs/ and served from
+    /files/<attachment_id>; identical uploads share the same blob. The body
+    is streamed to disk once (stream_upload), never buffered whole.
+    """
+    upload = await stream_upload(request)
+    try:
+        user_id = upload.fields.get("user_id")
+        if not user_id:
+            raise HTTPException(status_code=400, detail="Missing user_id")
+        if upload.tmp_path is None:
+            raise HTTPException(status_code=400, detail="Missing file")
+        if not upload.filename:
+            raise HTTPException(status_code=400, detail="Missing filename")
+        if upload.size == 0:
+            raise HTTPException(status_code=400, detail="File is empty")
+
+        attachment = await run_db(
+            register_attachment,
+            upload.tmp_path,
+            upload.size,
+            upload.sha256,
+            upload.filename,
+            upload.content_type,
+            user_id,
+        )
+    finally:
+        upload.discard()
+
+    uploads.inc()
+    upload_bytes.inc(amount=upload.size)
+
+    return {
+        "id": attachment.id,
+        "name": attachment.name,
+        "size": upload.size,
+        "mime_type": attachment.mime_type,
+        "url": f"/files/{attachment.id}",
+        "uploaded_by": user_id,
+        "sha256": upload.sha256,
+    }
+
+
+@fastapi_app.get("/files/{attachment_id}")
+def download_attachment(attachment_id: str, db: Session = Depends(get_db)):
+    attachment = db.query(Attachment).filter(Attachment.id == attachment_id).first()
+    if not attachment:
+        raise HTTPException(status_code=404, detail="Attachment not found")
 
-    return serialize_user(new_user)
+    path = blob_path(attachment.sha256)
+    if not path.exists():
+        raise HTTPException(status_code=404, detail="Attachment not found")
+
+    return FileResponse(
+        path,
+        media_type=attachment.mime_type or "application/octet-stream",
+        filename=attachment.name,
+        content_disposition_type="inline",
+    )
 
 
 # ------------------------------------------------------
-# WORKSPACES
+# MESSAGES
 # ------------------------------------------------------
 
 
-@fastapi_app.get("/workspaces/my")
-def my_workspaces(user_id: str, db: Session = Depends(get_db)):
+def load_message_page(
+    db: Session,
+    channel_id: str,
+    before: Optional[str] = None,
+    after: Optional[str] = None,
+    limit: int = MESSAGES_PAGE_SIZE,
+) -> MessagePage:
     """
-    Used in TeamChannelInterface to populate workspace switcher.
+    Keyset pagination on (created_at, id), backed by ix_messages_channel_created,
+    or on id alone with MESSAGE_ID_PAGINATION, so every page costs the same
+    regardless of how deep it is.
 
-    Returns array of WorkspaceSummary:
-    { id, name, role, is_personal }
-    (We can also return description/invite_code as extra data.)
+    - no cursor: the latest `limit` messages
+    - before:    the `limit` messages right before the cursor (scrolling back)
+    - after:     the `limit` messages right after the cursor (catching up)
+
+    Returns: { messages: ApiMessage[] (oldest first), next_cursor, has_more, seq }
+    where next_cursor continues in the same direction and seq is the channel's
+    change sequence to pass to GET /channels/{id}/changes after a reconnect.
     """
-    memberships = (
-        db.query(WorkspaceMember).filter(WorkspaceMember.user_id == user_id).all()
-    )
+    if before and after:
+        raise HTTPException(status_code=400, detail="Use either before or after, not both")
+
+    # Read before the page: a change racing with it is at worst sent twice
+    seq = current_channel_seq(db, channel_id)
+
+    query = db.query(Message).filter(Message.channel_id == channel_id)
+    # Time-ordered ids sort like (created_at, id), so one column can key the
+    # page (ix_messages_channel_id); cursors are the same in both modes
+    order = [Message.id] if MESSAGE_ID_PAGINATION else [Message.created_at, Message.id]
+
+    if after:
+        created_at, message_id = decode_message_cursor(after)
+        query = query.filter(
+            Message.id > message_id
+            if MESSAGE_ID_PAGINATION
+            else or_(
+                Message.created_at > created_at,
+                and_(Message.created_at == created_at, Message.id > message_id),
+            )
+        ).order_by(*(column.asc() for column in order))
+    else:
+        if before:
+            created_at, message_id = decode_message_cursor(before)
+            query = query.filter(
+                Message.id < message_id
+                if MESSAGE_ID_PAGINATION
+                else or_(
+                    Message.created_at < created_at,
+                    and_(Message.created_at == created_at, Message.id < message_id),
+                )
+            )
+        query = query.order_by(*(column.desc() for column in order))
 
-    result: List[Dict[str, Any]] = []
-    seen_workspace_ids = set()
+    # Fetch one extra row to know whether another page exists
+    msgs = query.limit(limit + 1).all()
+    has_more = len(msgs) > limit
+    msgs = msgs[:limit]
 
-    for membership in memberships:
-        ws = db.query(Workspace).filter(Workspace.id == membership.workspace_id).first()
-        if not ws:
-            continue
+    next_cursor = encode_message_cursor(msgs[-1]) if has_more else None
+    if not after:
+        msgs.reverse()
 
-        seen_workspace_ids.add(ws.id)
-        result.append(
-            {
-                "id": ws.id,
-                "name": ws.name,
-                "description": ws.description,
-                "role": membership.role,
-                "is_personal": ws.is_personal,
-                "invite_code": ws.invite_code,
-            }
-        )
+    return {
+        "messages": serialize_messages(db, msgs),
+        "next_cursor": next_cursor,
+        "has_more": has_more,
+        "seq": seq,
+    }
 
-    owned_workspaces = (
-        db.query(Workspace)
-        .filter(Workspace.owner_id == user_id)
-        .all()
-    )
 
-    for ws in owned_workspaces:
-        if ws.id in seen_workspace_ids:
-            continue
+@fastapi_app.get("/messages", response_model=MessagePage)
+def get_messages(
+    channel_id: str,
+    before: Optional[str] = Query(None, description="Cursor: return messages older than this"),
+    after: Optional[str] = Query(None, description="Cursor: return messages newer than this"),
+    limit: int = Query(MESSAGES_PAGE_SIZE, ge=1, le=MESSAGES_MAX_PAGE_SIZE),
+    db: Session = Depends(get_db),
+):
+    """
+    Used in TeamChannelInterface.loadMessages() (see load_message_page)
+    """
+    return FastJSONResponse(load_message_page(db, channel_id, before, after, limit))
 
-        result.append(
+
+def insert_messages(db: Session, bodies: List[MessageCreate]) -> List[NewMessage]:
+    """
+    Write messages with one multi-row INSERT per table and a single commit.
+    Ids and timestamps are set here rather than by the database, and a new
+    message has no reactions or pin yet, so the payloads are built without
+    reading the rows back; only authors are loaded (one IN query, before any
+    sequence row is locked).
+
+    Each id is minted together with its created_at, so ordering messages by
+    id matches ordering them by (created_at, id).
+    """
+    rows = []
+    for body in bodies:
+        message_id, created_at = ids.next()
+        rows.append(
             {
-                "id": ws.id,
-                "name": ws.name,
-                "description": ws.description,
-                "role": "owner",
-                "is_personal": ws.is_personal,
-                "invite_code": ws.invite_code,
+                "id": message_id,
+                "channel_id": body.channel_id,
+                "user_id": body.user_id,
+                "content": body.content,
+                "created_at": created_at,
+                "is_pinned": False,
             }
         )
+    user_ids = {row["user_id"] for row in rows}
+    users = {u.id: serialize_user(u) for u in db.query(User).filter(User.id.in_(user_ids))}
+
+    db.execute(Message.__table__.insert(), rows)
+
+    for row, body in zip(rows, bodies):
+        if body.attachment_id:
+            db.query(Attachment).filter(
+                Attachment.id == body.attachment_id,
+                Attachment.message_id.is_(None),
+            ).update({Attachment.message_id: row["id"]}, synchronize_session=False)
+
+    # One sequence bump per channel, taken in a fixed order so concurrent
+    # batches (other workers) can't deadlock on each other's rows
+    by_channel: Dict[str, List[Dict[str, Any]]] = {}
+    for row in rows:
+        by_channel.setdefault(row["channel_id"], []).append(row)
+
+    seqs: Dict[str, int] = {}
+    for channel_id in sorted(by_channel):
+        channel_rows = by_channel[channel_id]
+        last = reserve_channel_seqs(db, channel_id, len(channel_rows))
+        for seq, row in enumerate(channel_rows, start=last - len(channel_rows) + 1):
+            seqs[row["id"]] = seq
+
+    db.execute(
+        ChannelChange.__table__.insert(),
+        [
+            {
+                "channel_id": row["channel_id"],
+                "seq": seqs[row["id"]],
+                "kind": "message",
+                "message_id": row["id"],
+                "created_at": row["created_at"],
+            }
+            for row in rows
+        ],
+    )
+    db.commit()
 
-    return result
+    return [
+        {
+            "id": row["id"],
+            "content": row["content"],
+            "timestamp": row["created_at"].isoformat(),
+            "user": users.get(row["user_id"]),
+            "reactions": [],
+            "isPinned": False,
+            "pinnedBy": None,
+            "seq": seqs[row["id"]],
+        }
+        for row in rows
+    ]
 
 
-@fastapi_app.get("/workspaces/{workspace_id}")
-def get_workspace(workspace_id: str, db: Session = Depends(get_db)):
+def insert_message(db: Session, body: MessageCreate) -> NewMessage:
+    return insert_messages(db, [body])[0]
+
+
+MESSAGE_REFERENCES = [MessageReaction, MessageReactionCount, ChannelChange, Attachment]
+
+
+def migrate_message_ids_batch(
+    db: Session, job_id: str, generators: Dict[str, Uuid7Generator]
+) -> Optional[str]:
     """
-    In case you need details on a single workspace.
+    Visit the job's next batch_size messages after its cursor (keyset on
+    ix_messages_channel_created, so a batch costs the same wherever it is)
+    and give those that still have random (pre-UUIDv7) ids a time-ordered
+    id minted from their created_at, repointing the rows referencing them.
+    Each message is copied under its new id before the old row is deleted,
+    so foreign keys hold throughout; the copies sort after the cursor and are
+    skipped when reached.
+
+    Ids are minted by one generator per channel (`generators`, kept by the
+    caller across batches), since a generator never goes back in time and
+    messages arrive in created_at order only within a channel. Messages
+    without a channel or created_at are never paged and are left as they are.
+
+    Returns the job's status afterwards ("running" or "completed"), or None
+    once the job is no longer this worker's.
     """
-    ws = db.query(Workspace).filter(Workspace.id == workspace_id).first()
-    if not ws:
-        raise HTTPException(status_code=404, detail="Workspace not found")
+    # Writing to the job row first puts the batch in a write transaction
+    # before it reads the messages: on SQLite that holds the write lock, and
+    # on Postgres FOR UPDATE locks the batch's rows, so no pin or reaction
+    # lands on a message between it being copied and deleted
+    if not owned_job(db, MessageIdMigration, job_id).update(
+        {MessageIdMigration.updated_at: datetime.utcnow()}, synchronize_session=False
+    ):
+        db.rollback()
+        return None
+    job = db.get(MessageIdMigration, job_id)
+
+    key = tuple_(Message.channel_id, Message.created_at, Message.id)
+    query = (
+        select(Message.__table__)
+        .where(Message.channel_id.isnot(None), Message.created_at.isnot(None))
+        .order_by(Message.channel_id, Message.created_at, Message.id)
+        .limit(job.batch_size)
+        .with_for_update()
+    )
+    if job.cursor_message_id is not None:
+        query = query.where(
+            key > tuple_(job.cursor_channel_id, job.cursor_created_at, job.cursor_message_id)
+        )
+    rows = db.execute(query).all()
+    legacy = [row for row in rows if row.id[14:15] != "7"]
+
+    if legacy:
+        new_rows, renames = [], []
+        for row in legacy:
+            generator = generators.setdefault(row.channel_id, Uuid7Generator())
+            message_id, _ = generator.next(at=row.created_at)
+            new_rows.append({**row._mapping, "id": message_id})
+            renames.append({"old_id": row.id, "new_id": message_id})
+
+        db.execute(Message.__table__.insert(), new_rows)
+        for model in MESSAGE_REFERENCES:
+            table = model.__table__
+            db.execute(
+                table.update()
+                .where(table.c.message_id == bindparam("old_id"))
+                .values(message_id=bindparam("new_id")),
+                renames,
+            )
+        db.execute(
+            Message.__table__.delete().where(Message.id == bindparam("old_id")),
+            [{"old_id": rename["old_id"]} for rename in renames],
+        )
 
-    return {
-        "id": ws.id,
-        "name": ws.name,
-        "description": ws.description,
-        "owner_id": ws.owner_id,
-        "is_personal": ws.is_personal,
-        "invite_code": ws.invite_code,
+    now = datetime.utcnow()
+    progress = {
+        MessageIdMigration.scanned_rows: MessageIdMigration.scanned_rows + len(rows),
+        MessageIdMigration.migrated_rows: MessageIdMigration.migrated_rows + len(legacy),
+        MessageIdMigration.updated_at: now,
     }
+    if rows:
+        last = rows[-1]
+        progress[MessageIdMigration.cursor_channel_id] = last.channel_id
+        progress[MessageIdMigration.cursor_created_at] = last.created_at
+        progress[MessageIdMigration.cursor_message_id] = last.id
+        # Only the current channel's generator is needed from here on
+        for channel_id in [c for c in generators if c != last.channel_id]:
+            del generators[channel_id]
+
+    status = "running"
+    if len(rows) < job.batch_size:
+        status = "completed"
+        progress[MessageIdMigration.status] = status
+        progress[MessageIdMigration.finished_at] = now
+
+    if not owned_job(db, MessageIdMigration, job_id).update(progress, synchronize_session=False):
+        # Claimed by another worker meanwhile; its run redoes this batch
+        db.rollback()
+        return None
 
+    db.commit()
+    return status
 
-@fastapi_app.post("/workspaces/create")
-def create_workspace(
-    body: WorkspaceCreate,
-    user_id: str = Query(..., description="Owner user id"),
+
+# Keeps running migration tasks referenced (and prevents double starts)
+message_id_migration_tasks: Dict[str, asyncio.Task] = {}
+
+
+async def run_message_id_migration(job_id: str):
+    """
+    Claim a message id migration, then run it one batch (= one short
+    transaction) at a time, pausing MESSAGE_ID_MIGRATION_PAUSE in between.
+    """
+    try:
+        if not await run_db(claim_job, MessageIdMigration, job_id):
+            return
+
+        generators: Dict[str, Uuid7Generator] = {}
+        while True:
+            status = await run_db(migrate_message_ids_batch, job_id, generators)
+            if status is None:
+                print(f"⚠️  Message id migration {job_id} was taken over by another worker")
+                return
+            if status == "completed":
+                break
+            await asyncio.sleep(MESSAGE_ID_MIGRATION_PAUSE)
+        print(f"🔑 Message id migration {job_id} completed")
+    except Exception as exc:
+        print(f"⚠️  Message id migration {job_id} failed: {exc!r}")
+        await run_db(mark_job_failed, MessageIdMigration, job_id, repr(exc))
+    finally:
+        message_id_migration_tasks.pop(job_id, None)
+
+
+def start_message_id_migration(job_id: str):
+    if job_id not in message_id_migration_tasks:
+        message_id_migration_tasks[job_id] = asyncio.create_task(run_message_id_migration(job_id))
+
+
+MESSAGE_GROUP_COMMIT = env_flag("MESSAGE_GROUP_COMMIT")
+GROUP_COMMIT_WINDOW = float(os.getenv("GROUP_COMMIT_WINDOW_MS", "0")) / 1000
+GROUP_COMMIT_MAX_BATCH = int(os.getenv("GROUP_COMMIT_MAX_BATCH", "100"))
+
+
+class MessageBatcher:
+    """
+    Group commit for POST /messages (MESSAGE_GROUP_COMMIT=1).
+
+    One batch is written at a time per worker: messages arriving while a
+    commit is in flight queue up and go out together, up to `max_batch`, in
+    one insert_messages call. Every request is answered only after its
+    batch's commit returns, so an acknowledged message is exactly as durable
+    as with per-request commits. An idle worker writes a message right away
+    unless `window` > 0, in which case it waits that long (or until
+    `max_batch` are queued) to gather a bigger first batch.
+
+    If a batch fails, its messages are retried one by one so a bad message
+    only fails its own request.
+    """
+
+    def __init__(self, window: float, max_batch: int):
+        self.window = window
+        self.max_batch = max_batch
+        self._pending: List[Tuple[MessageCreate, asyncio.Future]] = []
+        self._full: Optional[asyncio.Future] = None
+        self._task: Optional[asyncio.Task] = None
+
+    async def submit(self, body: MessageCreate) -> NewMessage:
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append((body, future))
+
+        if len(self._pending) >= self.max_batch and self._full and not self._full.done():
+            self._full.set_result(None)
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+        return await future
+
+    async def _run(self):
+        while self._pending:
+            if self.window > 0 and len(self._pending) < self.max_batch:
+                self._full = asyncio.get_running_loop().create_future()
+                await asyncio.wait([self._full], timeout=self.window)
+
+            batch = self._pending[: self.max_batch]
+            del self._pending[: self.max_batch]
+            await self._commit(batch)
+
+    async def _commit(self, batch: List[Tuple[MessageCreate, asyncio.Future]]):
+        message_commit_batch_size.observe(len(batch))
+        try:
+            results = await run_db(insert_messages, [body for body, _ in batch])
+        except Exception as exc:
+            print(f"⚠️  Group commit of {len(batch)} messages failed, retrying one by one: {exc}")
+            for body, future in batch:
+                try:
+                    result = (await run_db(insert_messages, [body]))[0]
+                except Exception as single_exc:
+                    if not future.done():
+                        future.set_exception(single_exc)
+                else:
+                    if not future.done():
+                        future.set_result(result)
+            return
+
+        for (_, future), result in zip(batch, results):
+            # Done already if the client went away; the message stays sent
+            if not future.done():
+                future.set_result(result)
+
+
+message_batcher = (
+    MessageBatcher(GROUP_COMMIT_WINDOW, GROUP_COMMIT_MAX_BATCH) if MESSAGE_GROUP_COMMIT else None
+)
+
+
+@fastapi_app.post("/messages", response_model=NewMessage)
+async def create_message(body: MessageCreate):
+    """
+    Used in TeamChannelInterface.handleSendMessage()
+
+    Body: { channel_id, user_id, content }
+
+    The message is encoded to JSON once, for both the response and the
+    "new-message" broadcast. With MESSAGE_GROUP_COMMIT it's written in a
+    batch with concurrent messages (see MessageBatcher).
+    """
+    if message_batcher is not None:
+        message = await message_batcher.submit(body)
+    else:
+        message = await run_db(insert_message, body)
+    payload = EncodedPayload(message)
+
+    await sio.emit("new-message", payload, room=channel_room(body.channel_id))
+
+    return FastJSONResponse(payload)
+
+
+# ------------------------------------------------------
+# BOOTSTRAP
+# ------------------------------------------------------
+
+
+@fastapi_app.post("/bootstrap", response_model=Bootstrap)
+def bootstrap(body: BootstrapRequest, db: Session = Depends(get_db)):
+    """
+    Used in TeamChannelInterface on first load, in place of the sequential
+    POST /users/me -> GET /workspaces/my -> GET /channels -> GET /messages.
+
+    Body: { name, email, avatar, workspace_id?, channel_id? }
+
+    Picks the workspace the same way the UI does (the requested one, else the
+    personal workspace, else the first) and the requested or first channel,
+    creating "general" when the workspace has none. Returns
+    { user, workspaces, workspace_id, channels, channel_id, page } where page
+    is the channel's latest GET /messages page.
+    """
+    user = find_or_create_user(db, body)
+    workspaces = list_my_workspaces(db, user.id)
+
+    workspace = (
+        next((w for w in workspaces if w["id"] == body.workspace_id), None)
+        or next((w for w in workspaces if w["is_personal"]), None)
+        or next(iter(workspaces), None)
+    )
+    channels: List[ApiChannel] = []
+    channel = None
+    if workspace:
+        channels = list_channels(db, workspace["id"])
+        if not channels:
+            general = add_channel(db, workspace["id"], "general", "General workspace chat", False)
+            db.commit()
+            channels = [serialize_channel(general)]
+        channel = next((c for c in channels if c["id"] == body.channel_id), channels[0])
+
+    return FastJSONResponse(
+        {
+            "user": serialize_user(user),
+            "workspaces": workspaces,
+            "workspace_id": workspace["id"] if workspace else None,
+            "channels": channels,
+            "channel_id": channel["id"] if channel else None,
+            "page": load_message_page(db, channel["id"]) if channel else None,
+        }
+    )
+
+
+# ------------------------------------------------------
+# SEARCH
+# ------------------------------------------------------
+
+
+SEARCH_PAGE_SIZE = 20
+SEARCH_MAX_PAGE_SIZE = 100
+
+
+def encode_search_cursor(score: float, message_id: str) -> str:
+    raw = f"{score!r}|{message_id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_search_cursor(cursor: str) -> Tuple[float, str]:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        score, message_id = base64.urlsafe_b64decode(padded).decode().split("|", 1)
+        return float(score), message_id
+    except (ValueError, UnicodeDecodeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def fts5_query(q: str) -> str:
+    """
+    Turn free text into an FTS5 query: every term is quoted, so user input
+    can't inject query syntax, and all terms must match.
+    """
+    return " ".join('"' + term.replace('"', '""') + '"' for term in q.split())
+
+
+def search_message_ids(
+    db: Session,
+    q: str,
+    scope_sql: str,
+    params: Dict[str, Any],
+    cursor: Optional[Tuple[float, str]],
+    limit: int,
+) -> List[Tuple[str, float]]:
+    """
+    Ranked (message_id, score) rows for `q`, best first. Lower scores rank
+    higher on both backends (bm25() is negative-better, ts_rank is negated),
+    so keyset pagination continues after the cursor's (score, id).
+    """
+    if engine.dialect.name == "postgresql":
+        matches = f"""
+            SELECT m.id AS id,
+                   -ts_rank(m.search_vector, plainto_tsquery('{SEARCH_TS_CONFIG}', :q)) AS score
+            FROM messages m
+            WHERE m.search_vector @@ plainto_tsquery('{SEARCH_TS_CONFIG}', :q) AND {scope_sql}
+        """
+        params = {**params, "q": q}
+    else:
+        matches = f"""
+            SELECT m.id AS id, bm25(messages_fts) AS score
+            FROM messages_fts JOIN messages m ON m.search_key = messages_fts.rowid
+            WHERE messages_fts MATCH :q AND {scope_sql}
+        """
+        params = {**params, "q": fts5_query(q)}
+
+    after = ""
+    if cursor:
+        after = "WHERE score > :after_score OR (score = :after_score AND id > :after_id)"
+        params["after_score"], params["after_id"] = cursor
+
+    rows = db.execute(
+        text(f"SELECT id, score FROM ({matches}) AS matches {after} ORDER BY score, id LIMIT :limit"),
+        {**params, "limit": limit},
+    ).all()
+    return [(message_id, score) for message_id, score in rows]
+
+
+@fastapi_app.get("/search")
+def search_messages(
+    q: str = Query(..., min_length=1, description="Words to look for"),
+    workspace_id: Optional[str] = None,
+    channel_id: Optional[str] = None,
+    cursor: Optional[str] = Query(None, description="Cursor from the previous page"),
+    limit: int = Query(SEARCH_PAGE_SIZE, ge=1, le=SEARCH_MAX_PAGE_SIZE),
     db: Session = Depends(get_db),
 ):
     """
-    Used by CreateWorkspaceForm
+    Full-text message search within a channel or a whole workspace.
 
-    Query: ?user_id=...
-    Body: { name, description, is_personal }
+    Backed by FTS5 (SQLite) or a GIN-indexed tsvector (Postgres); results are
+    ranked by relevance and paged with an opaque (score, id) cursor.
+
+    Returns: { messages: (ApiMessage & { channel_id })[], next_cursor, has_more }
     """
-    ws = Workspace(
-        id=str(uuid.uuid4()),
-        name=body.name,
-        description=body.description or "",
-        owner_id=user_id,
-        is_personal=body.is_personal,
-        invite_code=generate_invite_code(),
-    )
-    db.add(ws)
-    db.commit()
-    db.refresh(ws)
+    if bool(workspace_id) == bool(channel_id):
+        raise HTTPException(status_code=400, detail="Pass exactly one of workspace_id or channel_id")
 
-    member = WorkspaceMember(
-        workspace_id=ws.id,
-        user_id=user_id,
-        role="owner",
+    if not q.split():
+        raise HTTPException(status_code=400, detail="Empty search query")
+
+    if not search_index_ready:
+        raise HTTPException(status_code=503, detail="Search index not installed; run the migrations")
+
+    if channel_id:
+        scope_sql, params = "m.channel_id = :channel_id", {"channel_id": channel_id}
+    else:
+        scope_sql = "m.channel_id IN (SELECT id FROM channels WHERE workspace_id = :workspace_id)"
+        params = {"workspace_id": workspace_id}
+
+    after = decode_search_cursor(cursor) if cursor else None
+    hits = search_message_ids(db, q, scope_sql, params, after, limit + 1)
+    has_more = len(hits) > limit
+    hits = hits[:limit]
+
+    hit_ids = [message_id for message_id, _ in hits]
+    msgs_by_id = {m.id: m for m in db.query(Message).filter(Message.id.in_(hit_ids)).all()}
+    msgs = [msgs_by_id[message_id] for message_id in hit_ids if message_id in msgs_by_id]
+
+    results = serialize_messages(db, msgs)
+    for msg, serialized in zip(msgs, results):
+        serialized["channel_id"] = msg.channel_id
+
+    next_cursor = None
+    if has_more:
+        last_id, last_score = hits[-1]
+        next_cursor = encode_search_cursor(last_score, last_id)
+
+    return FastJSONResponse(
+        {
+            "messages": results,
+            "next_cursor": next_cursor,
+            "has_more": has_more,
+        }
     )
-    db.add(member)
+
+
+# ------------------------------------------------------
+# PINNING & REACTIONS
+# ------------------------------------------------------
+
+
+def ensure_message_exists(db: Session, message_id: str):
+    """
+    404 once the message is gone. Pins and reactions look their message up
+    before taking any lock, and the message id migration may re-key it
+    (delete the old row) in between; SQLite doesn't enforce the foreign keys
+    that would catch this, so they call this after their writes are flushed,
+    when the transaction's write lock keeps the migration out until commit.
+    """
+    if not db.query(exists().where(Message.id == message_id)).scalar():
+        db.rollback()
+        raise HTTPException(status_code=404, detail="Message not found")
+
+
+def update_message_pin(
+    db: Session, message_id: str, body: PinMessageRequest
+) -> Tuple[PinUpdate, str]:
+    msg = db.query(Message).filter(Message.id == message_id).first()
+    if not msg:
+        raise HTTPException(status_code=404, detail="Message not found")
+
+    msg.is_pinned = body.is_pinned
+    msg.pinned_by = body.user_id if body.is_pinned else None
+    msg.pinned_at = datetime.utcnow() if body.is_pinned else None
+    seq = record_channel_change(db, msg.channel_id, "pin", msg.id)
+    try:
+        db.flush()
+    except (StaleDataError, IntegrityError):
+        # No row left to update, or (Postgres) the change's foreign key
+        # failed: the message was re-keyed or deleted since it was read
+        db.rollback()
+        raise HTTPException(status_code=404, detail="Message not found")
     db.commit()
 
-    return {
-        "workspace_id": ws.id,
-        "invite_code": ws.invite_code,
-    }
+    payload = {
+        "message_id": msg.id,
+        "is_pinned": msg.is_pinned,
+        "pinned_by": msg.pinned_by,
+        "seq": seq,
+    }
+    return payload, msg.channel_id
+
+
+@fastapi_app.patch("/messages/{message_id}/pin", response_model=PinUpdate)
+async def pin_message(message_id: str, body: PinMessageRequest):
+    """
+    Used in TeamChannelInterface.togglePinMessage()
+
+    Body: { is_pinned, user_id }
 
+    Socket event payload matches the TS handler:
 
-@fastapi_app.post("/workspaces/join")
-def join_workspace(body: JoinWorkspaceRequest, db: Session = Depends(get_db)):
+    socket.on("message-pinned", (data: { message_id: string; is_pinned: boolean; pinned_by?: string; seq: number }) => {
+      ...
+    });
     """
-    Used by JoinWorkspaceForm
+    update, channel_id = await run_db(update_message_pin, message_id, body)
+    payload = EncodedPayload(update)
 
-    Body: { invite_code, user_id }
-    Returns: { workspace_id, role }
+    await sio.emit("message-pinned", payload, room=channel_room(channel_id))
+    return FastJSONResponse(payload)
+
+
+def adjust_reaction_count(db: Session, message_id: str, emoji: str, delta: int):
     """
-    ws = (
-        db.query(Workspace)
-        .filter(Workspace.invite_code == body.invite_code)
-        .first()
+    Apply +1 / -1 to the aggregated count of one (message, emoji) pair.
+    Does not commit; rows that drop to zero are removed.
+    """
+    counts = db.query(MessageReactionCount).filter(
+        MessageReactionCount.message_id == message_id,
+        MessageReactionCount.emoji == emoji,
+    )
+    updated = counts.update(
+        {MessageReactionCount.count: MessageReactionCount.count + delta},
+        synchronize_session=False,
     )
+    if not updated and delta > 0:
+        db.add(MessageReactionCount(message_id=message_id, emoji=emoji, count=delta))
+        db.flush()
 
-    if not ws:
-        raise HTTPException(status_code=400, detail="Invalid or expired invite code")
+    counts.filter(MessageReactionCount.count <= 0).delete(synchronize_session=False)
 
-    existing = (
-        db.query(WorkspaceMember)
-        .filter(
-            WorkspaceMember.workspace_id == ws.id,
-            WorkspaceMember.user_id == body.user_id,
-        )
-        .first()
+
+def toggle_reaction(db: Session, body: ReactionCreate) -> Tuple[ReactionDelta, str]:
+    channel_id = (
+        db.query(Message.channel_id).filter(Message.id == body.message_id).scalar()
     )
+    if not channel_id:
+        raise HTTPException(status_code=404, detail="Message not found")
 
-    if existing:
-        return {"workspace_id": ws.id, "role": existing.role}
+    def apply() -> bool:
+        existing = (
+            db.query(MessageReaction)
+            .filter(
+                MessageReaction.message_id == body.message_id,
+                MessageReaction.user_id == body.user_id,
+                MessageReaction.emoji == body.emoji,
+            )
+            .first()
+        )
+        if existing:
+            db.delete(existing)
+            adjust_reaction_count(db, body.message_id, body.emoji, -1)
+        else:
+            db.add(
+                MessageReaction(
+                    message_id=body.message_id,
+                    user_id=body.user_id,
+                    emoji=body.emoji,
+                )
+            )
+            db.flush()
+            adjust_reaction_count(db, body.message_id, body.emoji, 1)
+        return bool(existing)
 
-    member = WorkspaceMember(
-        workspace_id=ws.id,
-        user_id=body.user_id,
-        role="member",
+    try:
+        removed = apply()
+    except IntegrityError:
+        # A concurrent toggle created the count row for this emoji, or the
+        # same reaction (uq_message_reactions_message_user_emoji); re-read and
+        # apply this toggle on top of it. On Postgres it may also be the
+        # foreign key to a message re-keyed or deleted since the lookup,
+        # which no retry fixes.
+        db.rollback()
+        ensure_message_exists(db, body.message_id)
+        removed = apply()
+
+    seq = record_channel_change(db, channel_id, "reaction", body.message_id)
+    ensure_message_exists(db, body.message_id)
+
+    # The UPDATE above holds the count row, so this is this toggle's result
+    count = (
+        db.query(MessageReactionCount.count)
+        .filter(
+            MessageReactionCount.message_id == body.message_id,
+            MessageReactionCount.emoji == body.emoji,
+        )
+        .scalar()
     )
-    db.add(member)
     db.commit()
-    db.refresh(member)
 
-    return {"workspace_id": ws.id, "role": member.role}
+    # Compact delta clients apply in place instead of reloading the channel
+    payload = {
+        "message_id": body.message_id,
+        "emoji": body.emoji,
+        "user_id": body.user_id,
+        "action": "removed" if removed else "added",
+        "count": count or 0,
+        "seq": seq,
+    }
+    return payload, channel_id
 
 
-@fastapi_app.delete("/workspaces/{workspace_id}")
-def delete_workspace(
-    workspace_id: str,
-    user_id: str = Query(..., description="Owner user id"),
-    db: Session = Depends(get_db),
-):
-    """
-    Delete a workspace and all associated data.
+@fastapi_app.post("/reactions", response_model=ReactionDelta)
+async def add_reaction(body: ReactionCreate):
     """
-    ws = db.query(Workspace).filter(Workspace.id == workspace_id).first()
-    if not ws:
-        raise HTTPException(status_code=404, detail="Workspace not found")
+    Used in TeamChannelInterface.addReaction()
 
-    if ws.is_personal:
-        raise HTTPException(status_code=400, detail="Cannot delete personal workspace")
+    Toggles the reaction and emits "reaction-added" with the delta
+    { message_id, emoji, user_id, action: "added" | "removed", count },
+    which the frontend applies to the message it already has.
+    """
+    delta, channel_id = await run_db(toggle_reaction, body)
+    payload = EncodedPayload(delta)
 
-    if ws.owner_id != user_id:
-        raise HTTPException(status_code=403, detail="Only the owner can delete this workspace")
+    await sio.emit("reaction-added", payload, room=channel_room(channel_id))
+    return FastJSONResponse(payload)
 
-    channel_ids = [
-        channel_id
-        for (channel_id,) in db.query(Channel.id).filter(Channel.workspace_id == workspace_id).all()
-    ]
 
-    if channel_ids:
-        message_ids = [
-            message_id
-            for (message_id,) in db.query(Message.id)
-            .filter(Message.channel_id.in_(channel_ids))
-            .all()
-        ]
+# ------------------------------------------------------
+# ROOT
+# ------------------------------------------------------
 
-        if message_ids:
-            db.query(MessageReaction).filter(MessageReaction.message_id.in_(message_ids)).delete(
-                synchronize_session=False
-            )
 
-        db.query(Message).filter(Message.channel_id.in_(channel_ids)).delete(
-            synchronize_session=False
-        )
+@fastapi_app.get("/")
+def root():
+    return {"status": "ok", "message": "Team Chat API Running 🚀"}
 
-        db.query(Channel).filter(Channel.id.in_(channel_ids)).delete(synchronize_session=False)
 
-    db.query(WorkspaceMember).filter(WorkspaceMember.workspace_id == workspace_id).delete(
-        synchronize_session=False
-    )
+@fastapi_app.get("/cache/stats")
+def cache_stats():
+    """
+    Hit/miss counters of the in-process caches (per worker).
+    """
+    return {"workspaces_my": my_workspaces_cache.stats()}
 
-    db.delete(ws)
-    db.commit()
 
-    return {"success": True}
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN")
 
 
-# ------------------------------------------------------
-# CHANNELS
-# ------------------------------------------------------
+def require_admin(x_admin_token: Optional[str] = Header(None)):
+    """
+    Admin endpoints are disabled unless ADMIN_TOKEN is set, and then need
+    a matching X-Admin-Token header.
+    """
+    if not ADMIN_TOKEN or not x_admin_token or not secrets.compare_digest(x_admin_token, ADMIN_TOKEN):
+        raise HTTPException(status_code=403, detail="Admin token required")
 
 
-@fastapi_app.get("/channels")
-def get_channels(workspace_id: str, db: Session = Depends(get_db)):
+@fastapi_app.get("/admin/profiling", dependencies=[Depends(require_admin)])
+def get_profiling():
     """
-    Used in TeamChannelInterface.loadChannels()
+    Current profiling settings and the most recent slow / N+1 reports (this worker).
     """
-    channels = db.query(Channel).filter(
-        Channel.workspace_id == workspace_id
-    ).all()
-
-    return [
-        {
-            "id": c.id,
-            "name": c.name,
-            "description": c.description,
-            "is_private": c.is_private,
-        }
-        for c in channels
-    ]
+    return {"settings": profiling_settings.model_dump(), "reports": list(profiling_reports)}
 
 
-@fastapi_app.post("/channels")
-def create_channel(body: ChannelCreate, db: Session = Depends(get_db)):
+@fastapi_app.put("/admin/profiling", dependencies=[Depends(require_admin)])
+def update_profiling(body: ProfilingSettingsUpdate):
     """
-    Used in TeamChannelInterface.handleCreateChannel()
+    Switch the request profiler on/off or retune it at runtime (this worker).
     """
-    exists = (
-        db.query(Channel)
-        .filter(
-            Channel.workspace_id == body.workspace_id,
-            Channel.name == body.name,
-        )
-        .first()
-    )
+    global profiling_settings
 
-    if exists:
-        raise HTTPException(status_code=400, detail="Channel already exists")
+    changes = body.model_dump(exclude_none=True)
+    if not 0 <= changes.get("sample_rate", 0) <= 1:
+        raise HTTPException(status_code=400, detail="sample_rate must be between 0 and 1")
 
-    ch = Channel(
-        id=str(uuid.uuid4()),
-        workspace_id=body.workspace_id,
-        name=body.name,
-        description=body.description or "",
-        is_private=body.is_private,
-    )
-    db.add(ch)
-    db.commit()
-    db.refresh(ch)
+    profiling_settings = profiling_settings.model_copy(update=changes)
+    return profiling_settings.model_dump()
 
+
+def serialize_message_id_migration(job: MessageIdMigration) -> Dict[str, Any]:
     return {
-        "id": ch.id,
-        "name": ch.name,
-        "description": ch.description,
-        "is_private": ch.is_private,
+        "job_id": job.id,
+        "status": job.status,
+        "batch_size": job.batch_size,
+        "total_rows": job.total_rows,
+        "scanned_rows": job.scanned_rows,
+        "migrated_rows": job.migrated_rows,
+        "error": job.error,
+        "created_at": job.created_at.isoformat(),
+        "finished_at": job.finished_at.isoformat() if job.finished_at else None,
     }
 
 
-# ------------------------------------------------------
-# FILE UPLOADS
-# ------------------------------------------------------
+def create_message_id_migration(db: Session, batch: int) -> Dict[str, Any]:
+    """
+    The unfinished run if there is one (a failed run is set to resume from
+    its cursor), else a new run over all messages.
+    """
+    job = (
+        db.query(MessageIdMigration)
+        .filter(MessageIdMigration.status != "completed")
+        .order_by(MessageIdMigration.created_at.desc())
+        .first()
+    )
+    if job and job.status == "failed":
+        job.status = "pending"
+        job.error = None
+        job.updated_at = datetime.utcnow()
+        db.commit()
+    elif not job:
+        job = MessageIdMigration(
+            id=str(uuid.uuid4()),
+            batch_size=batch,
+            total_rows=db.query(func.count(Message.id)).scalar(),
+        )
+        db.add(job)
+        db.commit()
 
+    db.refresh(job)
+    return serialize_message_id_migration(job)
 
-@fastapi_app.post("/files/upload")
-async def upload_workspace_file(
-    user_id: str = Form(...),
-    file: UploadFile = File(...),
-):
+
+@fastapi_app.post(
+    "/admin/migrations/message-ids", status_code=202, dependencies=[Depends(require_admin)]
+)
+async def migrate_message_ids(batch: int = Query(1000, ge=1, le=10000)):
     """
-    Upload an attachment for chat messages.
-    Returns metadata consumed by the frontend.
-    Files are served statically from /uploads/<filename>.
+    Re-key messages created before time-ordered ids in the background,
+    `batch` messages visited per transaction (migrate_message_ids_batch).
+    Returns the job; poll GET /admin/migrations/message-ids/{job_id} for
+    progress. While a run is unfinished this returns (and resumes) it.
+    Clients holding old message ids should reload afterwards. Once the job
+    has completed, MESSAGE_ID_PAGINATION can be enabled.
     """
-    if not file.filename:
-        raise HTTPException(status_code=400, detail="Missing filename")
+    job = await run_db(create_message_id_migration, batch)
+    start_message_id_migration(job["job_id"])
+    return job
+
 
-    contents = await file.read()
-    if not contents:
-        raise HTTPException(status_code=400, detail="File is empty")
+@fastapi_app.get("/admin/migrations/message-ids/{job_id}", dependencies=[Depends(require_admin)])
+def get_message_id_migration(job_id: str, db: Session = Depends(get_db)):
+    job = db.get(MessageIdMigration, job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Migration job not found")
 
-    ext = Path(file.filename).suffix
-    stored_name = f"{uuid.uuid4().hex}{ext}"
-    file_path = UPLOAD_DIR / stored_name
-    with open(file_path, "wb") as buffer:
-        buffer.write(contents)
+    return serialize_message_id_migration(job)
 
+
+def pool_stats() -> Dict[str, int]:
+    pool = engine.pool
+    # SingletonThreadPool / StaticPool (in-memory SQLite) have no sizing
+    if not hasattr(pool, "checkedout"):
+        return {}
     return {
-        "id": str(uuid.uuid4()),
-        "name": file.filename,
-        "size": len(contents),
-        "mime_type": file.content_type,
-        "url": f"/uploads/{stored_name}",
-        "uploaded_by": user_id,
+        "size": pool.size(),
+        "checked_out": pool.checkedout(),
+        "checked_in": pool.checkedin(),
+        "overflow": pool.overflow(),
     }
 
 
+@fastapi_app.get("/metrics", response_class=PlainTextResponse)
+def metrics():
+    """
+    Prometheus text exposition of this worker's metrics: route latency and
+    per-request SQL statement histograms, DB pool usage, Socket.IO clients,
+    rooms and emitted events, and upload volume.
+    """
+    lines: List[str] = []
+    for metric in METRICS:
+        lines.extend(metric.render())
+
+    gauges = [
+        *(
+            (f"db_pool_{key}", "SQLAlchemy connection pool " + key.replace("_", " "), value)
+            for key, value in pool_stats().items()
+        ),
+        *(
+            (f"socketio_{key}", "Socket.IO " + key.replace("_", " ") + " on this worker", value)
+            for key, value in sio.socket_stats().items()
+        ),
+        *(
+            (f"replay_buffer_{key}", "Socket.IO replay buffer " + key + " on this worker", value)
+            for key, value in replay_buffer.stats().items()
+        ),
+        ("replay_buffer_max_events", "Replay buffer events kept per room", REPLAY_BUFFER_EVENTS),
+        ("replay_buffer_max_bytes", "Replay buffer bytes kept per room", REPLAY_BUFFER_BYTES),
+        ("replay_buffer_max_total_bytes", "Replay buffer bytes kept on this worker", REPLAY_BUFFER_TOTAL_BYTES),
+        ("db_executor_workers", "Threads in the DB executor", DB_EXECUTOR_WORKERS),
+    ]
+    for name, help_text, value in gauges:
+        lines.extend([f"# HELP {name} {help_text}", f"# TYPE {name} gauge", f"{name} {value}"])
+
+    return PlainTextResponse("\n".join(lines) + "\n", media_type="text/plain; version=0.0.4")
+
+
 # ------------------------------------------------------
-# MESSAGES
+# EXPORT & IMPORT
 # ------------------------------------------------------
 
+EXPORT_BATCH = int(os.getenv("EXPORT_BATCH", "1000"))
+
+
+def parse_timestamp(value: Optional[str]) -> Optional[datetime]:
+    return datetime.fromisoformat(value) if value else None
+
 
-@fastapi_app.get("/messages")
-def get_messages(channel_id: str, db: Session = Depends(get_db)):
+def export_message_batch(db: Session, msgs: List[Any], seen_users: set) -> bytes:
     """
-    Used in TeamChannelInterface.loadMessages()
+    NDJSON lines for one batch of messages: a "user" record for every author,
+    pinner or reactor not exported yet, then the messages with their reactions.
+    Users and reactions are loaded with one IN query each per batch.
     """
-    msgs = (
-        db.query(Message)
-        .filter(Message.channel_id == channel_id)
-        .order_by(Message.created_at)
+    reactions = group_reactions(
+        db.query(MessageReaction)
+        .filter(MessageReaction.message_id.in_([m.id for m in msgs]))
+        .order_by(MessageReaction.id)
         .all()
     )
-    return [serialize_message(db, m) for m in msgs]
 
+    user_ids = {m.user_id for m in msgs} | {m.pinned_by for m in msgs}
+    user_ids.update(u for grouped in reactions.values() for r in grouped for u in r["users"])
+    user_ids -= seen_users
+    user_ids.discard(None)
+
+    lines: List[bytes] = []
+    if user_ids:
+        for user in db.query(User).filter(User.id.in_(user_ids)).order_by(User.id):
+            lines.append(
+                dumps_json(
+                    {
+                        "type": "user",
+                        "id": user.id,
+                        "name": user.name,
+                        "email": user.email,
+                        "avatar": user.avatar,
+                    }
+                )
+            )
+        seen_users |= user_ids
+
+    for msg in msgs:
+        lines.append(
+            dumps_json(
+                {
+                    "type": "message",
+                    "id": msg.id,
+                    "channel_id": msg.channel_id,
+                    "user_id": msg.user_id,
+                    "content": msg.content,
+                    "created_at": msg.created_at.isoformat(),
+                    "is_pinned": bool(msg.is_pinned),
+                    "pinned_by": msg.pinned_by,
+                    "pinned_at": msg.pinned_at.isoformat() if msg.pinned_at else None,
+                    "reactions": reactions.get(msg.id, []),
+                }
+            )
+        )
 
-@fastapi_app.post("/messages")
-async def create_message(body: MessageCreate, db: Session = Depends(get_db)):
-    """
-    Used in TeamChannelInterface.handleSendMessage()
+    return b"\n".join(lines) + b"\n"
 
-    Body: { channel_id, user_id, content }
+
+def export_history(channel_ids: List[str]) -> Iterator[bytes]:
     """
-    msg = Message(
-        id=str(uuid.uuid4()),
-        channel_id=body.channel_id,
-        user_id=body.user_id,
-        content=body.content,
-    )
-    db.add(msg)
-    db.commit()
-    db.refresh(msg)
+    Stream channels' history as NDJSON: per channel a "channel" record, then
+    its messages oldest first. Messages come from a server-side cursor
+    (yield_per) EXPORT_BATCH at a time as plain rows, never entering the
+    session, so memory stays flat however long the history is.
+    """
+    # Own session: the response is still streaming after get_db's has closed
+    db = SessionLocal()
+    try:
+        seen_users: set = set()
+        for channel_id in channel_ids:
+            channel = db.get(Channel, channel_id)
+            if channel is None:
+                continue
+            yield dumps_json(
+                {
+                    "type": "channel",
+                    "id": channel.id,
+                    "workspace_id": channel.workspace_id,
+                    "name": channel.name,
+                    "description": channel.description,
+                    "is_private": bool(channel.is_private),
+                    "created_at": channel.created_at.isoformat() if channel.created_at else None,
+                }
+            ) + b"\n"
+
+            messages = (
+                select(Message.__table__)
+                .where(Message.channel_id == channel_id)
+                .order_by(Message.created_at, Message.id)
+                .execution_options(yield_per=EXPORT_BATCH)
+            )
+            for rows in db.execute(messages).partitions():
+                yield export_message_batch(db, rows, seen_users)
+    finally:
+        db.close()
 
-    serialized = serialize_message(db, msg)
 
-    # Current frontend connects globally, so broadcast to all sockets.
-    # Later you can optimize to per-workspace or per-channel rooms.
-    await sio.emit("new-message", serialized)
+def gzip_stream(chunks: Iterable[bytes]) -> Iterator[bytes]:
+    compressor = zlib.compressobj(wbits=31)  # 31: gzip container
+    for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
 
-    return serialized
 
+def export_response(channel_ids: List[str], filename: str, compress: bool) -> StreamingResponse:
+    body = export_history(channel_ids)
+    if compress:
+        body, media_type, filename = gzip_stream(body), "application/gzip", filename + ".ndjson.gz"
+    else:
+        media_type, filename = "application/x-ndjson", filename + ".ndjson"
+    return StreamingResponse(
+        body,
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
 
-# ------------------------------------------------------
-# PINNING & REACTIONS
-# ------------------------------------------------------
 
+@fastapi_app.get("/export/channels/{channel_id}", dependencies=[Depends(require_admin)])
+def export_channel(channel_id: str, gzip: bool = False, db: Session = Depends(get_db)):
+    """
+    Compliance export of a channel's full history as NDJSON (see export_history).
+    """
+    if not db.query(Channel.id).filter(Channel.id == channel_id).first():
+        raise HTTPException(status_code=404, detail="Channel not found")
 
-@fastapi_app.patch("/messages/{message_id}/pin")
-async def pin_message(
-    message_id: str,
-    body: PinMessageRequest,
-    db: Session = Depends(get_db),
-):
+    return export_response([channel_id], f"channel-{channel_id}", gzip)
+
+
+@fastapi_app.get("/export/workspaces/{workspace_id}", dependencies=[Depends(require_admin)])
+def export_workspace(workspace_id: str, gzip: bool = False, db: Session = Depends(get_db)):
     """
-    Used in TeamChannelInterface.togglePinMessage()
+    Compliance export of every channel in a workspace, one channel after another.
+    """
+    if not db.get(Workspace, workspace_id):
+        raise HTTPException(status_code=404, detail="Workspace not found")
 
-    Body: { is_pinned, user_id }
+    channel_ids = [
+        channel_id
+        for (channel_id,) in db.query(Channel.id)
+        .filter(Channel.workspace_id == workspace_id)
+        .order_by(Channel.created_at, Channel.id)
+    ]
+    return export_response(channel_ids, f"workspace-{workspace_id}", gzip)
 
-    Socket event payload matches the TS handler:
 
-    socket.on("message-pinned", (data: { message_id: string; is_pinned: boolean; pinned_by?: string }) => {
-      ...
-    });
+class HistoryImport:
+    """
+    State of one POST /import run across its batches: how exported user and
+    channel ids map to local ones, and what has been imported so far.
     """
-    msg = db.query(Message).filter(Message.id == message_id).first()
-    if not msg:
-        raise HTTPException(status_code=404, detail="Message not found")
 
-    msg.is_pinned = body.is_pinned
-    msg.pinned_by = body.user_id if body.is_pinned else None
-    msg.pinned_at = datetime.utcnow() if body.is_pinned else None
-    db.commit()
+    def __init__(self, workspace_id: str):
+        self.workspace_id = workspace_id
+        self.user_ids: Dict[str, str] = {}
+        self.channel_ids: Dict[str, str] = {}
+        self.counts = {"users": 0, "channels": 0, "messages": 0, "reactions": 0, "skipped_messages": 0}
 
-    payload = {
-        "message_id": msg.id,
-        "is_pinned": msg.is_pinned,
-        "pinned_by": msg.pinned_by,
-    }
 
-    await sio.emit("message-pinned", payload)
-    return payload
+def import_users(db: Session, state: HistoryImport, records: List[Dict[str, Any]]):
+    """
+    Map exported users to local accounts by id, then by email; create the rest.
+    """
+    records = [r for r in records if r["id"] not in state.user_ids]
+    if not records:
+        return
+
+    existing = db.query(User.id, User.email).filter(
+        or_(User.id.in_([r["id"] for r in records]), User.email.in_([r["email"] for r in records]))
+    ).all()
+    known_ids = {u.id for u in existing}
+    by_email = {u.email: u.id for u in existing}
+
+    new_users = []
+    for r in records:
+        if r["id"] in known_ids:
+            state.user_ids[r["id"]] = r["id"]
+        elif r["email"] in by_email:
+            state.user_ids[r["id"]] = by_email[r["email"]]
+        else:
+            new_users.append(
+                {
+                    "id": r["id"],
+                    "name": r["name"],
+                    "email": r["email"],
+                    "avatar": r.get("avatar"),
+                    "status": UserStatus.offline,
+                }
+            )
+            state.user_ids[r["id"]] = by_email[r["email"]] = r["id"]
+
+    if new_users:
+        db.execute(User.__table__.insert(), new_users)
+        state.counts["users"] += len(new_users)
 
 
-@fastapi_app.post("/reactions")
-async def add_reaction(body: ReactionCreate, db: Session = Depends(get_db)):
+def import_channels(db: Session, state: HistoryImport, records: List[Dict[str, Any]]):
     """
-    Used in TeamChannelInterface.addReaction()
-    Frontend listens to "reaction-added" and then calls loadMessages().
+    Exported channels land in the target workspace: onto the same channel
+    (by id, then by name) when it's already there, else as a new channel,
+    which keeps its id unless another workspace uses it.
     """
-    existing = (
-        db.query(MessageReaction)
-        .filter(
-            MessageReaction.message_id == body.message_id,
-            MessageReaction.user_id == body.user_id,
-            MessageReaction.emoji == body.emoji,
+    for r in records:
+        local = (
+            db.query(Channel.id)
+            .filter(
+                Channel.workspace_id == state.workspace_id,
+                or_(Channel.id == r["id"], Channel.name == r["name"]),
+            )
+            .order_by(case((Channel.id == r["id"], 0), else_=1))
+            .first()
         )
-        .first()
-    )
+        if local:
+            state.channel_ids[r["id"]] = local.id
+            continue
 
-    if existing:
-        db.delete(existing)
-        db.commit()
-    else:
+        channel_id = r["id"] if not db.get(Channel, r["id"]) else new_id()
         db.add(
-            MessageReaction(
-                message_id=body.message_id,
-                user_id=body.user_id,
-                emoji=body.emoji,
+            Channel(
+                id=channel_id,
+                workspace_id=state.workspace_id,
+                name=r["name"],
+                description=r.get("description") or "",
+                is_private=bool(r.get("is_private")),
+                created_at=parse_timestamp(r.get("created_at")) or datetime.utcnow(),
             )
         )
-        db.commit()
-
-    # Recompute reactions for this message
-    reactions = db.query(MessageReaction).filter(
-        MessageReaction.message_id == body.message_id
-    ).all()
+        db.add(ChannelSequence(channel_id=channel_id, seq=0))
+        db.flush()
+        state.channel_ids[r["id"]] = channel_id
+        state.counts["channels"] += 1
 
-    grouped: Dict[str, Dict[str, Any]] = {}
-    for r in reactions:
-        if r.emoji not in grouped:
-            grouped[r.emoji] = {"emoji": r.emoji, "count": 0, "users": []}
-        grouped[r.emoji]["count"] += 1
-        grouped[r.emoji]["users"].append(r.user_id)
 
-    payload = {
-        "message_id": body.message_id,
-        "reactions": list(grouped.values()),
+def import_messages(db: Session, state: HistoryImport, records: List[Dict[str, Any]]):
+    """
+    Bulk insert messages with their reactions and reaction counts (one
+    executemany per table). Messages that already exist are skipped, so an
+    interrupted import can simply be sent again. Reactions listing the same
+    emoji or user twice are merged, and every user referenced must be in the
+    export or already exist (SQLite doesn't enforce the foreign keys).
+    """
+    existing = {
+        message_id
+        for (message_id,) in db.query(Message.id).filter(Message.id.in_([r["id"] for r in records]))
     }
 
-    await sio.emit("reaction-added", payload)
-    return payload
+    message_rows, reaction_rows, count_rows = [], [], []
+    for r in records:
+        if r["id"] in existing:
+            state.counts["skipped_messages"] += 1
+            continue
+        existing.add(r["id"])
+
+        channel_id = state.channel_ids.get(r["channel_id"])
+        if channel_id is None:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Message {r['id']} comes before its channel record",
+            )
 
+        message_rows.append(
+            {
+                "id": r["id"],
+                "channel_id": channel_id,
+                "user_id": state.user_ids.get(r["user_id"], r["user_id"]),
+                "content": r["content"],
+                "created_at": parse_timestamp(r["created_at"]),
+                "is_pinned": bool(r.get("is_pinned")),
+                "pinned_by": state.user_ids.get(r.get("pinned_by"), r.get("pinned_by")),
+                "pinned_at": parse_timestamp(r.get("pinned_at")),
+            }
+        )
+        reactions: Dict[str, Dict[str, None]] = {}
+        for reaction in r.get("reactions") or []:
+            users = reactions.setdefault(reaction["emoji"], {})
+            users.update(dict.fromkeys(state.user_ids.get(u, u) for u in reaction["users"]))
+        for emoji, users in reactions.items():
+            reaction_rows.extend({"message_id": r["id"], "user_id": u, "emoji": emoji} for u in users)
+            count_rows.append({"message_id": r["id"], "emoji": emoji, "count": len(users)})
+
+    referenced = {row["user_id"] for row in message_rows + reaction_rows}
+    referenced.update(row["pinned_by"] for row in message_rows if row["pinned_by"])
+    unknown = referenced - set(state.user_ids.values())
+    if unknown:
+        unknown -= {user_id for (user_id,) in db.query(User.id).filter(User.id.in_(unknown))}
+    if unknown:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Messages reference users missing from the export: {', '.join(sorted(unknown))}",
+        )
 
-# ------------------------------------------------------
-# ROOT
-# ------------------------------------------------------
+    if message_rows:
+        db.execute(Message.__table__.insert(), message_rows)
+    if reaction_rows:
+        db.execute(MessageReaction.__table__.insert(), reaction_rows)
+        db.execute(MessageReactionCount.__table__.insert(), count_rows)
 
+    state.counts["messages"] += len(message_rows)
+    state.counts["reactions"] += len(reaction_rows)
 
-@fastapi_app.get("/")
-def root():
-    return {"status": "ok", "message": "Team Chat API Running 🚀"}
+
+def import_history_batch(db: Session, state: HistoryImport, records: List[Dict[str, Any]]):
+    """
+    Import one batch of NDJSON records in a single transaction. Users and
+    channels go first, as an export writes them before the messages using them.
+    """
+    ensure_workspace_writable(db, state.workspace_id)
+    by_type: Dict[str, List[Dict[str, Any]]] = {"user": [], "channel": [], "message": []}
+    for record in records:
+        if record.get("type") not in by_type:
+            raise HTTPException(status_code=400, detail=f"Unknown record type: {record.get('type')!r}")
+        by_type[record["type"]].append(record)
+
+    try:
+        import_users(db, state, by_type["user"])
+        import_channels(db, state, by_type["channel"])
+        if by_type["message"]:
+            import_messages(db, state, by_type["message"])
+        db.commit()
+    except IntegrityError as exc:
+        # Conflicts the checks above don't cover, e.g. two user records with
+        # the same id in one batch
+        db.rollback()
+        raise HTTPException(
+            status_code=400,
+            detail=f"Conflicting import records: {str(exc.orig).splitlines()[0]}",
+        )
+
+
+async def read_ndjson(request: Request) -> AsyncIterator[Dict[str, Any]]:
+    """
+    Parse an NDJSON request body as it streams in, gunzipping on the fly when
+    it's sent with Content-Encoding: gzip (or as application/gzip).
+    """
+    gzipped = (
+        request.headers.get("content-encoding") == "gzip"
+        or request.headers.get("content-type") == "application/gzip"
+    )
+    decompressor = zlib.decompressobj(wbits=47) if gzipped else None  # 47: gzip or zlib header
+    loads = orjson.loads if orjson is not None else json.loads
+    pending, line_number = b"", 0
+
+    async def chunks():
+        async for chunk in request.stream():
+            yield decompressor.decompress(chunk) if decompressor else chunk
+        # A final line without its newline still counts
+        yield (decompressor.flush() if decompressor else b"") + b"\n"
+
+    try:
+        async for chunk in chunks():
+            *lines, pending = (pending + chunk).split(b"\n")
+            for line in lines:
+                line_number += 1
+                if line.strip():
+                    record = loads(line)
+                    if not isinstance(record, dict):
+                        raise ValueError("expected a JSON object")
+                    yield record
+    except zlib.error:
+        raise HTTPException(status_code=400, detail="Invalid gzip body")
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=f"Invalid JSON on line {line_number}: {exc}")
+
+
+@fastapi_app.post("/import/workspaces/{workspace_id}", dependencies=[Depends(require_admin)])
+async def import_workspace_history(workspace_id: str, request: Request):
+    """
+    Bulk import of a channel or workspace export (NDJSON, optionally gzip)
+    into a workspace. The body is parsed as it arrives and written
+    EXPORT_BATCH records per transaction, so nothing holds the whole file.
+
+    Returns counts of created users/channels and inserted messages/reactions.
+    A bad record fails its batch with a 400 whose detail also gives the counts
+    of the batches committed before it; sending the file again skips them.
+    """
+    if not await run_db(lambda db: db.get(Workspace, workspace_id) is not None):
+        raise HTTPException(status_code=404, detail="Workspace not found")
+
+    state = HistoryImport(workspace_id)
+    batch: List[Dict[str, Any]] = []
+
+    async def flush():
+        committed = dict(state.counts)
+        try:
+            await run_db(import_history_batch, state, batch)
+        except (KeyError, TypeError, ValueError) as exc:
+            failure = HTTPException(status_code=400, detail=f"Invalid import record: {exc!r}")
+        except HTTPException as exc:
+            failure = exc
+        else:
+            batch.clear()
+            return
+        if failure.status_code == 400 and any(committed.values()):
+            failure.detail = f"{failure.detail} (already imported: {committed})"
+        raise failure
+
+    async for record in read_ndjson(request):
+        batch.append(record)
+        if len(batch) >= EXPORT_BATCH:
+            await flush()
+    if batch:
+        await flush()
+
+    print(f"📥 Imported into workspace {workspace_id}: {state.counts}")
+    return state.counts
 
 
 # ------------------------------------------------------
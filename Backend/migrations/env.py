@@ -0,0 +1,61 @@
+"""
+Alembic environment.
+
+main.migrate_database() hands over its connection and metadata in
+config.attributes; the alembic CLI imports main for both instead (the
+engine is built from DATABASE_URL and the engine profile settings).
+"""
+
+from logging.config import fileConfig
+
+from alembic import context
+
+config = context.config
+
+connection = config.attributes.get("connection")
+target_metadata = config.attributes.get("metadata")
+
+if connection is None:
+    if config.config_file_name is not None:
+        fileConfig(config.config_file_name)
+
+    from main import Base, engine
+
+    target_metadata = Base.metadata
+
+
+def include_name(name, type_, parent_names):
+    """
+    Leave the message search index (migrations 0003/0004) out of
+    autogenerate: the FTS5 tables and messages.search_key on SQLite, the
+    tsvector column and its GIN index on Postgres are not part of the models.
+    """
+    if type_ == "table":
+        return not name.startswith("messages_fts")
+    if type_ == "column":
+        return name not in ("search_vector", "search_key")
+    if type_ == "index":
+        return name not in ("ix_messages_search_vector", "ix_messages_search_key")
+    return True
+
+
+def run_migrations(conn):
+    context.configure(
+        connection=conn,
+        target_metadata=target_metadata,
+        # SQLite can't ALTER constraints in place; batch ops copy the table
+        render_as_batch=conn.dialect.name == "sqlite",
+        include_name=include_name,
+    )
+    with context.begin_transaction():
+        context.run_migrations()
+
+
+if context.is_offline_mode():
+    raise SystemExit("Offline (--sql) migrations are not supported; run against a database.")
+
+if connection is not None:
+    run_migrations(connection)
+else:
+    with engine.begin() as conn:
+        run_migrations(conn)
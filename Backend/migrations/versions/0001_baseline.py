@@ -0,0 +1,199 @@
+"""Baseline: the schema as create_all built it before migrations
+
+Every table and index is created only if missing, so this revision also
+brings databases created by create_all (including ones that predate some of
+these indexes) under migration control without changes.
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-17 09:00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0001"
+down_revision: Union[str, Sequence[str], None] = None
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# create_table(if_not_exists=True) would still emit CREATE TYPE for a plain
+# sa.Enum and fail on Postgres databases create_all already built; the type
+# is created separately, only if missing (a no-op without native enums)
+USER_STATUS = postgresql.ENUM("online", "away", "offline", name="userstatus", create_type=False)
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    USER_STATUS.create(op.get_bind(), checkfirst=True)
+    op.create_table(
+        "users",
+        sa.Column("id", sa.String(36), primary_key=True),
+        sa.Column("name", sa.String(255), nullable=False),
+        sa.Column("email", sa.String(255), nullable=False, unique=True),
+        sa.Column("avatar", sa.String(500)),
+        sa.Column("status", USER_STATUS),
+        sa.Column("created_at", sa.DateTime),
+        if_not_exists=True,
+    )
+    op.create_table(
+        "workspaces",
+        sa.Column("id", sa.String(36), primary_key=True),
+        sa.Column("name", sa.String(255), nullable=False),
+        sa.Column("description", sa.Text, nullable=True),
+        sa.Column("owner_id", sa.String(36), sa.ForeignKey("users.id")),
+        sa.Column("is_personal", sa.Boolean),
+        sa.Column("invite_code", sa.String(64), nullable=True),
+        sa.Column("created_at", sa.DateTime),
+        if_not_exists=True,
+    )
+    op.create_index(
+        "ix_workspaces_invite_code", "workspaces", ["invite_code"], unique=True, if_not_exists=True
+    )
+    op.create_table(
+        "workspace_members",
+        sa.Column("id", sa.Integer, primary_key=True),
+        sa.Column("workspace_id", sa.String(36), sa.ForeignKey("workspaces.id")),
+        sa.Column("user_id", sa.String(36), sa.ForeignKey("users.id")),
+        sa.Column("role", sa.String(20)),
+        sa.Column("joined_at", sa.DateTime),
+        if_not_exists=True,
+    )
+    op.create_table(
+        "channels",
+        sa.Column("id", sa.String(36), primary_key=True),
+        sa.Column("workspace_id", sa.String(36), sa.ForeignKey("workspaces.id")),
+        sa.Column("name", sa.String(255), nullable=False),
+        sa.Column("description", sa.Text, nullable=True),
+        sa.Column("is_private", sa.Boolean),
+        sa.Column("created_at", sa.DateTime),
+        if_not_exists=True,
+    )
+    op.create_table(
+        "messages",
+        sa.Column("id", sa.String(36), primary_key=True),
+        sa.Column("channel_id", sa.String(36), sa.ForeignKey("channels.id")),
+        sa.Column("user_id", sa.String(36), sa.ForeignKey("users.id")),
+        sa.Column("content", sa.Text, nullable=False),
+        sa.Column("created_at", sa.DateTime),
+        sa.Column("is_pinned", sa.Boolean),
+        sa.Column("pinned_by", sa.String(36), sa.ForeignKey("users.id"), nullable=True),
+        sa.Column("pinned_at", sa.DateTime, nullable=True),
+        if_not_exists=True,
+    )
+    op.create_index(
+        "ix_messages_channel_created",
+        "messages",
+        ["channel_id", "created_at", "id"],
+        if_not_exists=True,
+    )
+    op.create_index(
+        "ix_messages_channel_id", "messages", ["channel_id", "id"], if_not_exists=True
+    )
+    op.create_table(
+        "message_reactions",
+        sa.Column("id", sa.Integer, primary_key=True),
+        sa.Column("message_id", sa.String(36), sa.ForeignKey("messages.id")),
+        sa.Column("user_id", sa.String(36), sa.ForeignKey("users.id")),
+        sa.Column("emoji", sa.String(10), nullable=False),
+        sa.Column("created_at", sa.DateTime),
+        if_not_exists=True,
+    )
+    op.create_table(
+        "message_reaction_counts",
+        sa.Column("id", sa.Integer, primary_key=True),
+        sa.Column("message_id", sa.String(36), sa.ForeignKey("messages.id"), nullable=False),
+        sa.Column("emoji", sa.String(10), nullable=False),
+        sa.Column("count", sa.Integer, nullable=False),
+        sa.UniqueConstraint(
+            "message_id", "emoji", name="uq_message_reaction_counts_message_emoji"
+        ),
+        if_not_exists=True,
+    )
+    op.create_table(
+        "channel_sequences",
+        sa.Column("channel_id", sa.String(36), sa.ForeignKey("channels.id"), primary_key=True),
+        sa.Column("seq", sa.Integer, nullable=False),
+        if_not_exists=True,
+    )
+    op.create_table(
+        "channel_changes",
+        sa.Column("id", sa.Integer, primary_key=True),
+        sa.Column("channel_id", sa.String(36), sa.ForeignKey("channels.id"), nullable=False),
+        sa.Column("seq", sa.Integer, nullable=False),
+        sa.Column("kind", sa.String(20), nullable=False),
+        sa.Column("message_id", sa.String(36), sa.ForeignKey("messages.id"), nullable=False),
+        sa.Column("created_at", sa.DateTime),
+        sa.UniqueConstraint("channel_id", "seq", name="uq_channel_changes_channel_seq"),
+        if_not_exists=True,
+    )
+    op.create_table(
+        "attachment_blobs",
+        sa.Column("sha256", sa.String(64), primary_key=True),
+        sa.Column("size", sa.Integer, nullable=False),
+        sa.Column("ref_count", sa.Integer, nullable=False),
+        sa.Column("created_at", sa.DateTime),
+        if_not_exists=True,
+    )
+    op.create_table(
+        "attachments",
+        sa.Column("id", sa.String(36), primary_key=True),
+        sa.Column(
+            "sha256", sa.String(64), sa.ForeignKey("attachment_blobs.sha256"), nullable=False
+        ),
+        sa.Column("name", sa.String(255), nullable=False),
+        sa.Column("mime_type", sa.String(255), nullable=True),
+        sa.Column("uploaded_by", sa.String(36), sa.ForeignKey("users.id"), nullable=True),
+        sa.Column("message_id", sa.String(36), sa.ForeignKey("messages.id"), nullable=True),
+        sa.Column("created_at", sa.DateTime),
+        if_not_exists=True,
+    )
+    op.create_index("ix_attachments_sha256", "attachments", ["sha256"], if_not_exists=True)
+    op.create_index(
+        "ix_attachments_message_id", "attachments", ["message_id"], if_not_exists=True
+    )
+    op.create_table(
+        "workspace_deletion_jobs",
+        sa.Column("id", sa.String(36), primary_key=True),
+        sa.Column("workspace_id", sa.String(36), nullable=False),
+        sa.Column("requested_by", sa.String(36), nullable=False),
+        sa.Column("status", sa.String(20), nullable=False),
+        sa.Column("stage", sa.String(20), nullable=False),
+        sa.Column("deleted_rows", sa.Integer, nullable=False),
+        sa.Column("error", sa.Text, nullable=True),
+        sa.Column("created_at", sa.DateTime),
+        sa.Column("updated_at", sa.DateTime),
+        sa.Column("finished_at", sa.DateTime, nullable=True),
+        if_not_exists=True,
+    )
+    op.create_index(
+        "ix_workspace_deletion_jobs_workspace_id",
+        "workspace_deletion_jobs",
+        ["workspace_id"],
+        if_not_exists=True,
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    for table in (
+        "workspace_deletion_jobs",
+        "attachments",
+        "attachment_blobs",
+        "channel_changes",
+        "channel_sequences",
+        "message_reaction_counts",
+        "message_reactions",
+        "messages",
+        "channels",
+        "workspace_members",
+        "workspaces",
+        "users",
+    ):
+        op.drop_table(table)
+    USER_STATUS.drop(op.get_bind(), checkfirst=True)
@@ -0,0 +1,77 @@
+"""Index the lookups every request makes
+
+- message_reactions (message_id, user_id, emoji), unique: the toggle lookup
+  in toggle_reaction, and by its prefix a page's reactions by message_id
+- workspace_members (workspace_id, user_id), unique: the membership check in
+  join_workspace_by_invite; workspace_members (user_id): list_my_workspaces
+- workspaces (owner_id): owned workspaces in list_my_workspaces
+- channels (workspace_id, name): list_channels and create_channel's
+  duplicate-name check
+
+messages.channel_id is already the leading column of
+ix_messages_channel_created. Duplicate reactions and memberships (possible
+before the unique indexes, through concurrent requests) are removed first,
+keeping the oldest row, and reaction counts are rebuilt if any went.
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-17 09:30:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0002"
+down_revision: Union[str, Sequence[str], None] = "0001"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def delete_duplicates(table: str, columns: str) -> int:
+    return op.get_bind().execute(
+        sa.text(
+            f"DELETE FROM {table} WHERE id NOT IN "
+            f"(SELECT MIN(id) FROM {table} GROUP BY {columns})"
+        )
+    ).rowcount
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    if delete_duplicates("message_reactions", "message_id, user_id, emoji"):
+        op.execute("DELETE FROM message_reaction_counts")
+        op.execute(
+            "INSERT INTO message_reaction_counts (message_id, emoji, count) "
+            "SELECT message_id, emoji, COUNT(id) FROM message_reactions "
+            "GROUP BY message_id, emoji"
+        )
+    delete_duplicates("workspace_members", "workspace_id, user_id")
+
+    op.create_index(
+        "uq_message_reactions_message_user_emoji",
+        "message_reactions",
+        ["message_id", "user_id", "emoji"],
+        unique=True,
+    )
+    op.create_index(
+        "uq_workspace_members_workspace_user",
+        "workspace_members",
+        ["workspace_id", "user_id"],
+        unique=True,
+    )
+    op.create_index("ix_workspace_members_user_id", "workspace_members", ["user_id"])
+    op.create_index("ix_workspaces_owner_id", "workspaces", ["owner_id"])
+    op.create_index("ix_channels_workspace_name", "channels", ["workspace_id", "name"])
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index("ix_channels_workspace_name", table_name="channels")
+    op.drop_index("ix_workspaces_owner_id", table_name="workspaces")
+    op.drop_index("ix_workspace_members_user_id", table_name="workspace_members")
+    op.drop_index("uq_workspace_members_workspace_user", table_name="workspace_members")
+    op.drop_index("uq_message_reactions_message_user_emoji", table_name="message_reactions")
@@ -0,0 +1,75 @@
+"""Message full-text search index
+
+SQLite: an external-content FTS5 table over messages.content, kept in sync by
+triggers. Postgres: a stored generated tsvector column with a GIN index. Both
+were created by the app at every startup before; everything here is created
+only if missing, so databases that already have the index are unchanged.
+Existing messages are indexed when the FTS5 table is first created.
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-18 10:00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0003"
+down_revision: Union[str, Sequence[str], None] = "0002"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+SQLITE_SEARCH_DDL = [
+    # External-content FTS5 table over messages.content, keyed by the rowid
+    "CREATE VIRTUAL TABLE IF NOT EXISTS messages_fts USING fts5("
+    "content, content='messages', content_rowid='rowid')",
+    "CREATE TRIGGER IF NOT EXISTS messages_fts_ai AFTER INSERT ON messages BEGIN "
+    "INSERT INTO messages_fts(rowid, content) VALUES (new.rowid, new.content); END",
+    "CREATE TRIGGER IF NOT EXISTS messages_fts_ad AFTER DELETE ON messages BEGIN "
+    "INSERT INTO messages_fts(messages_fts, rowid, content) "
+    "VALUES ('delete', old.rowid, old.content); END",
+    "CREATE TRIGGER IF NOT EXISTS messages_fts_au AFTER UPDATE OF content ON messages BEGIN "
+    "INSERT INTO messages_fts(messages_fts, rowid, content) "
+    "VALUES ('delete', old.rowid, old.content); "
+    "INSERT INTO messages_fts(rowid, content) VALUES (new.rowid, new.content); END",
+]
+
+POSTGRES_SEARCH_DDL = [
+    # Stored generated column, maintained by Postgres on every INSERT/UPDATE;
+    # "simple" configuration: no stemming (main.SEARCH_TS_CONFIG)
+    "ALTER TABLE messages ADD COLUMN IF NOT EXISTS search_vector tsvector "
+    "GENERATED ALWAYS AS (to_tsvector('simple', coalesce(content, ''))) STORED",
+    "CREATE INDEX IF NOT EXISTS ix_messages_search_vector ON messages USING GIN (search_vector)",
+]
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    bind = op.get_bind()
+    if bind.dialect.name == "sqlite":
+        existed = bind.execute(
+            sa.text("SELECT 1 FROM sqlite_master WHERE name = 'messages_fts'")
+        ).first()
+        for statement in SQLITE_SEARCH_DDL:
+            op.execute(statement)
+        if not existed:
+            op.execute("INSERT INTO messages_fts(messages_fts) VALUES ('rebuild')")
+    elif bind.dialect.name == "postgresql":
+        for statement in POSTGRES_SEARCH_DDL:
+            op.execute(statement)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    bind = op.get_bind()
+    if bind.dialect.name == "sqlite":
+        for trigger in ("messages_fts_ai", "messages_fts_ad", "messages_fts_au"):
+            op.execute(f"DROP TRIGGER IF EXISTS {trigger}")
+        op.execute("DROP TABLE IF EXISTS messages_fts")
+    elif bind.dialect.name == "postgresql":
+        op.execute("DROP INDEX IF EXISTS ix_messages_search_vector")
+        op.execute("ALTER TABLE messages DROP COLUMN IF EXISTS search_vector")
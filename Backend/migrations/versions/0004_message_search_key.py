@@ -0,0 +1,87 @@
+"""Key the SQLite search index on a stored integer instead of the rowid
+
+messages has a String primary key, so its rowid is implicit: VACUUM may
+renumber it and a table rebuild (batch migrations, dump and restore) does,
+leaving messages_fts pointing at the wrong messages. messages.search_key is
+a stored INTEGER, numbered from the current rowids once and then assigned
+max + 1 by the insert trigger, and is the FTS5 content_rowid from now on.
+The index is rebuilt under the new key. Postgres is unchanged.
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-18 11:00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0004"
+down_revision: Union[str, Sequence[str], None] = "0003"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+DROP_SEARCH_INDEX = [
+    "DROP TRIGGER IF EXISTS messages_fts_ai",
+    "DROP TRIGGER IF EXISTS messages_fts_ad",
+    "DROP TRIGGER IF EXISTS messages_fts_au",
+    "DROP TABLE IF EXISTS messages_fts",
+]
+
+SEARCH_KEY_DDL = [
+    "ALTER TABLE messages ADD COLUMN search_key INTEGER",
+    "UPDATE messages SET search_key = rowid",
+    "CREATE UNIQUE INDEX ix_messages_search_key ON messages (search_key)",
+    "CREATE VIRTUAL TABLE messages_fts USING fts5("
+    "content, content='messages', content_rowid='search_key')",
+    # Rows never come with a search_key; number them here, then index them
+    "CREATE TRIGGER messages_fts_ai AFTER INSERT ON messages BEGIN "
+    "UPDATE messages SET search_key = (SELECT coalesce(max(search_key), 0) + 1 FROM messages) "
+    "WHERE id = new.id; "
+    "INSERT INTO messages_fts(rowid, content) "
+    "SELECT search_key, content FROM messages WHERE id = new.id; END",
+    "CREATE TRIGGER messages_fts_ad AFTER DELETE ON messages BEGIN "
+    "INSERT INTO messages_fts(messages_fts, rowid, content) "
+    "VALUES ('delete', old.search_key, old.content); END",
+    "CREATE TRIGGER messages_fts_au AFTER UPDATE OF content ON messages BEGIN "
+    "INSERT INTO messages_fts(messages_fts, rowid, content) "
+    "VALUES ('delete', old.search_key, old.content); "
+    "INSERT INTO messages_fts(rowid, content) VALUES (new.search_key, new.content); END",
+    "INSERT INTO messages_fts(messages_fts) VALUES ('rebuild')",
+]
+
+ROWID_SEARCH_DDL = [
+    "CREATE VIRTUAL TABLE messages_fts USING fts5("
+    "content, content='messages', content_rowid='rowid')",
+    "CREATE TRIGGER messages_fts_ai AFTER INSERT ON messages BEGIN "
+    "INSERT INTO messages_fts(rowid, content) VALUES (new.rowid, new.content); END",
+    "CREATE TRIGGER messages_fts_ad AFTER DELETE ON messages BEGIN "
+    "INSERT INTO messages_fts(messages_fts, rowid, content) "
+    "VALUES ('delete', old.rowid, old.content); END",
+    "CREATE TRIGGER messages_fts_au AFTER UPDATE OF content ON messages BEGIN "
+    "INSERT INTO messages_fts(messages_fts, rowid, content) "
+    "VALUES ('delete', old.rowid, old.content); "
+    "INSERT INTO messages_fts(rowid, content) VALUES (new.rowid, new.content); END",
+    "INSERT INTO messages_fts(messages_fts) VALUES ('rebuild')",
+]
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    if op.get_bind().dialect.name != "sqlite":
+        return
+    for statement in DROP_SEARCH_INDEX + SEARCH_KEY_DDL:
+        op.execute(statement)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    if op.get_bind().dialect.name != "sqlite":
+        return
+    for statement in DROP_SEARCH_INDEX + [
+        "DROP INDEX IF EXISTS ix_messages_search_key",
+        "ALTER TABLE messages DROP COLUMN search_key",
+    ] + ROWID_SEARCH_DDL:
+        op.execute(statement)
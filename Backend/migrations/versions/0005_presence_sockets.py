@@ -0,0 +1,48 @@
+"""Presence shared across workers
+
+presence_sockets: for each worker, how many sockets it holds for a user and
+the status it sees for them; presence_workers: when each worker last
+refreshed them. Presence was kept per process, so a socket closing on one
+worker marked the user offline even while another worker still held a
+socket for them.
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-18 12:00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0005"
+down_revision: Union[str, Sequence[str], None] = "0004"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        "presence_sockets",
+        sa.Column("worker_id", sa.String(36), primary_key=True),
+        sa.Column("user_id", sa.String(36), sa.ForeignKey("users.id"), primary_key=True),
+        sa.Column("sockets", sa.Integer, nullable=False),
+        sa.Column("status", sa.String(20), nullable=False),
+    )
+    op.create_index("ix_presence_sockets_user_id", "presence_sockets", ["user_id"])
+    op.create_table(
+        "presence_workers",
+        sa.Column("worker_id", sa.String(36), primary_key=True),
+        sa.Column("updated_at", sa.DateTime),
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table("presence_workers")
+    op.drop_index("ix_presence_sockets_user_id", table_name="presence_sockets")
+    op.drop_table("presence_sockets")
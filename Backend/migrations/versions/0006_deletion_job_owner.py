@@ -0,0 +1,33 @@
+"""Owner of a workspace deletion job
+
+workspace_deletion_jobs.owner: the worker running the job. Every worker used
+to restart every pending or running job at startup; a worker now claims a
+job with a conditional UPDATE of status and owner before running it.
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2026-10-18 13:00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0006"
+down_revision: Union[str, Sequence[str], None] = "0005"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column("workspace_deletion_jobs", sa.Column("owner", sa.String(36), nullable=True))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.batch_alter_table("workspace_deletion_jobs") as batch_op:
+        batch_op.drop_column("owner")
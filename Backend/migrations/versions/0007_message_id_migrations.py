@@ -0,0 +1,48 @@
+"""Message id migration jobs
+
+message_id_migrations: progress and keyset cursor of the background runs
+started by POST /admin/migrations/message-ids, which used to re-key every
+message inside a single request.
+
+Revision ID: 0007
+Revises: 0006
+Create Date: 2026-10-18 14:00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0007"
+down_revision: Union[str, Sequence[str], None] = "0006"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        "message_id_migrations",
+        sa.Column("id", sa.String(36), primary_key=True),
+        sa.Column("status", sa.String(20), nullable=False),
+        sa.Column("owner", sa.String(36), nullable=True),
+        sa.Column("batch_size", sa.Integer, nullable=False),
+        sa.Column("total_rows", sa.Integer, nullable=False),
+        sa.Column("scanned_rows", sa.Integer, nullable=False),
+        sa.Column("migrated_rows", sa.Integer, nullable=False),
+        sa.Column("cursor_channel_id", sa.String(36), nullable=True),
+        sa.Column("cursor_created_at", sa.DateTime, nullable=True),
+        sa.Column("cursor_message_id", sa.String(36), nullable=True),
+        sa.Column("error", sa.Text, nullable=True),
+        sa.Column("created_at", sa.DateTime),
+        sa.Column("updated_at", sa.DateTime),
+        sa.Column("finished_at", sa.DateTime, nullable=True),
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table("message_id_migrations")
@@ -62,6 +62,7 @@ interface ApiUser {
   name: string;
   email: string;
   avatar: string;
+  status?: "online" | "away" | "offline";
 }
 
 interface ApiMessage {
@@ -74,6 +75,33 @@ interface ApiMessage {
   pinnedBy?: string;
 }
 
+interface ApiMessagePage {
+  messages: ApiMessage[];
+  next_cursor: string | null;
+  has_more: boolean;
+  seq: number;
+}
+
+interface ApiReactionDelta {
+  message_id: string;
+  emoji: string;
+  user_id: string;
+  action: "added" | "removed";
+  count: number;
+  seq: number;
+}
+
+interface ApiChannelChanges {
+  seq: number;
+  has_more: boolean;
+  messages: ApiMessage[];
+  updates: Pick<ApiMessage, "id" | "reactions" | "isPinned" | "pinnedBy">[];
+}
+
+interface ApiPresenceChanges {
+  changes: { user_id: string; status: User["status"] }[];
+}
+
 interface ApiChannel {
   id: string;
   name: string;
@@ -89,6 +117,15 @@ interface SwitcherWorkspace {
   invite_code?: string | null;
 }
 
+interface ApiBootstrap {
+  user: ApiUser;
+  workspaces: SwitcherWorkspace[];
+  workspace_id: string | null;
+  channels: ApiChannel[] | null;
+  channel_id: string | null;
+  page: ApiMessagePage | null;
+}
+
 interface User extends ApiUser {
   status: "online" | "away" | "offline";
 }
@@ -169,7 +206,7 @@ const parseMessageContent = (raw: string): { text: string; attachment?: FileAtta
 const mapApiMessage = (m: ApiMessage): Message => {
   const { text, attachment } = parseMessageContent(m.content);
   const user = m.user
-    ? { ...m.user, status: "online" as const }
+    ? { ...m.user, status: m.user.status ?? ("online" as const) }
     : {
         id: "unknown",
         name: "Unknown",
@@ -190,6 +227,21 @@ const mapApiMessage = (m: ApiMessage): Message => {
   };
 };
 
+const applyReactionDelta = (
+  reactions: Message["reactions"],
+  delta: ApiReactionDelta
+): Message["reactions"] => {
+  const current = reactions.find((r) => r.emoji === delta.emoji);
+  const others = current ? current.users.filter((id) => id !== delta.user_id) : [];
+  const users = delta.action === "added" ? [...others, delta.user_id] : others;
+
+  if (delta.count <= 0) return reactions.filter((r) => r.emoji !== delta.emoji);
+  if (!current) return [...reactions, { emoji: delta.emoji, count: delta.count, users }];
+  return reactions.map((r) =>
+    r.emoji === delta.emoji ? { ...r, count: delta.count, users } : r
+  );
+};
+
 const encodeAttachmentPayload = (text: string, attachment: FileAttachment) => {
   return `${FILE_SHARE_PREFIX}${JSON.stringify({
     text,
@@ -218,6 +270,8 @@ export default function TeamChannelInterface({
 
   const [channels, setChannels] = useState<Channel[]>([]);
   const [messages, setMessages] = useState<Message[]>([]);
+  const [olderCursor, setOlderCursor] = useState<string | null>(null);
+  const [loadingOlder, setLoadingOlder] = useState(false);
   const [currentChannel, setCurrentChannel] = useState<Channel | null>(null);
 
   const [sidebarOpen, setSidebarOpen] = useState(true);
@@ -248,6 +302,10 @@ export default function TeamChannelInterface({
   const [mobileActionsOpen, setMobileActionsOpen] = useState(false);
 
   const socketRef = useRef<Socket | null>(null);
+  // Last change sequence of the current channel reflected in `messages`
+  const channelSeqRef = useRef(0);
+  // First screen from /bootstrap; each loader below takes its part once
+  const bootstrapRef = useRef<ApiBootstrap | null>(null);
   const messagesEndRef = useRef<HTMLDivElement>(null);
   const messageScrollRef = useRef<HTMLDivElement>(null);
   const composerRef = useRef<HTMLTextAreaElement>(null);
@@ -300,7 +358,7 @@ export default function TeamChannelInterface({
     }
   }, [isDesktop]);
 
-  /* Load Current User */
+  /* Load Current User (with workspaces, channels and messages, in one round trip) */
   const loadCurrentUser = useCallback(async () => {
     if (!auth0User) return;
 
@@ -308,26 +366,33 @@ export default function TeamChannelInterface({
     const email = auth0User.email!;
     const avatar = auth0User.picture || "";
 
-    const res = await fetch(`${API_URL}/users/me`, {
+    const res = await fetch(`${API_URL}/bootstrap`, {
       method: "POST",
       headers: { "Content-Type": "application/json" },
-      body: JSON.stringify({ name, email, avatar }),
+      body: JSON.stringify({ name, email, avatar, workspace_id: initialWorkspaceId ?? null }),
     });
 
-    const apiUser: ApiUser = await res.json();
-    setCurrentUser({ ...apiUser, status: "online" });
-  }, [auth0User]);
+    const data: ApiBootstrap = await res.json();
+    bootstrapRef.current = data;
+    setCurrentUser({ ...data.user, status: "online" });
+  }, [auth0User, initialWorkspaceId]);
 
   /* Load Workspaces */
   useEffect(() => {
     if (!currentUser) return;
 
     const loadWorkspaces = async () => {
-      const res = await fetch(`${API_URL}/workspaces/my?user_id=${currentUser.id}`, {
-        cache: "no-store",
-      });
-
-      const workspaces: SwitcherWorkspace[] = await res.json();
+      let workspaces: SwitcherWorkspace[];
+      const boot = bootstrapRef.current;
+      if (boot?.user.id === currentUser.id && boot.workspaces.length > 0) {
+        workspaces = boot.workspaces;
+        boot.workspaces = [];
+      } else {
+        const res = await fetch(`${API_URL}/workspaces/my?user_id=${currentUser.id}`, {
+          cache: "no-store",
+        });
+        workspaces = await res.json();
+      }
       setAllWorkspaces(workspaces);
 
       if (initialWorkspaceId) {
@@ -381,11 +446,17 @@ export default function TeamChannelInterface({
   const loadChannels = useCallback(async () => {
     if (!workspaceId) return;
 
-    const res = await fetch(`${API_URL}/channels?workspace_id=${workspaceId}`, {
-      cache: "no-store",
-    });
-
-    const data: ApiChannel[] = await res.json();
+    let data: ApiChannel[];
+    const boot = bootstrapRef.current;
+    if (boot?.channels && boot.workspace_id === workspaceId) {
+      data = boot.channels;
+      boot.channels = null;
+    } else {
+      const res = await fetch(`${API_URL}/channels?workspace_id=${workspaceId}`, {
+        cache: "no-store",
+      });
+      data = await res.json();
+    }
 
     if (!Array.isArray(data)) return;
 
@@ -413,21 +484,96 @@ export default function TeamChannelInterface({
   const loadMessages = useCallback(async () => {
     if (!currentChannel) return;
 
-    const res = await fetch(`${API_URL}/messages?channel_id=${currentChannel.id}`, {
-      cache: "no-store",
-    });
+    let data: ApiMessagePage;
+    const boot = bootstrapRef.current;
+    if (boot?.page && boot.channel_id === currentChannel.id) {
+      data = boot.page;
+      boot.page = null;
+    } else {
+      const res = await fetch(`${API_URL}/messages?channel_id=${currentChannel.id}`, {
+        cache: "no-store",
+      });
+      data = await res.json();
+    }
+
+    setMessages(data.messages.map((m) => mapApiMessage(m)));
+    setOlderCursor(data.next_cursor);
+    channelSeqRef.current = data.seq;
+  }, [currentChannel]);
+
+  /* Catch Up After Reconnect: fetch only what changed since the last seq */
+  const syncChanges = useCallback(async () => {
+    if (!currentChannel) return;
 
-    const data: ApiMessage[] = await res.json();
+    let hasMore = true;
+    while (hasMore) {
+      const res = await fetch(
+        `${API_URL}/channels/${currentChannel.id}/changes?since=${channelSeqRef.current}`,
+        { cache: "no-store" }
+      );
+      if (!res.ok) return;
 
-    setMessages(data.map((m) => mapApiMessage(m)));
+      const data: ApiChannelChanges = await res.json();
+      const fresh = new Map(data.messages.map((m) => [m.id, mapApiMessage(m)]));
+      const updates = new Map(data.updates.map((u) => [u.id, u]));
+
+      setMessages((prev) => {
+        const patched = prev.map((m) => {
+          const update = updates.get(m.id);
+          if (update) {
+            return {
+              ...m,
+              reactions: update.reactions,
+              isPinned: update.isPinned,
+              pinnedBy: update.pinnedBy,
+            };
+          }
+          return fresh.get(m.id) ?? m;
+        });
+        const known = new Set(prev.map((m) => m.id));
+        return [...patched, ...[...fresh.values()].filter((m) => !known.has(m.id))];
+      });
+      channelSeqRef.current = data.seq;
+      hasMore = data.has_more;
+    }
   }, [currentChannel]);
 
+  /* Load Older Messages */
+  const loadOlderMessages = useCallback(async () => {
+    if (!currentChannel || !olderCursor || loadingOlder) return;
+
+    setLoadingOlder(true);
+    try {
+      const res = await fetch(
+        `${API_URL}/messages?channel_id=${currentChannel.id}&before=${encodeURIComponent(olderCursor)}`,
+        { cache: "no-store" }
+      );
+      if (!res.ok) return;
+
+      const data: ApiMessagePage = await res.json();
+      const older = data.messages.map((m) => mapApiMessage(m));
+
+      setMessages((prev) => {
+        const known = new Set(prev.map((m) => m.id));
+        return [...older.filter((m) => !known.has(m.id)), ...prev];
+      });
+      setOlderCursor(data.next_cursor);
+    } finally {
+      setLoadingOlder(false);
+    }
+  }, [currentChannel, olderCursor, loadingOlder]);
+
   /* WebSockets */
   useEffect(() => {
     const socket = io(API_URL, { transports: ["websocket"] });
     socketRef.current = socket;
 
-    socket.on("new-message", (msg: ApiMessage) => {
+    const seen = (seq: number) => {
+      channelSeqRef.current = Math.max(channelSeqRef.current, seq);
+    };
+
+    socket.on("new-message", (msg: ApiMessage & { seq: number }) => {
+      seen(msg.seq);
       const parsed = mapApiMessage(msg);
       setMessages((prev) => {
         if (prev.some((m) => m.id === parsed.id)) return prev;
@@ -437,7 +583,8 @@ export default function TeamChannelInterface({
 
     socket.on(
       "message-pinned",
-      (data: { message_id: string; is_pinned: boolean; pinned_by?: string }) => {
+      (data: { message_id: string; is_pinned: boolean; pinned_by?: string; seq: number }) => {
+        seen(data.seq);
         setMessages((prev) =>
           prev.map((m) =>
             m.id === data.message_id
@@ -448,14 +595,95 @@ export default function TeamChannelInterface({
       }
     );
 
-    socket.on("reaction-added", () => {
-      loadMessages();
+    socket.on("presence", (data: ApiPresenceChanges) => {
+      const statuses = new Map(data.changes.map((c) => [c.user_id, c.status]));
+      setMessages((prev) =>
+        prev.map((m) => {
+          const status = statuses.get(m.user.id);
+          return status && status !== m.user.status ? { ...m, user: { ...m.user, status } } : m;
+        })
+      );
+    });
+
+    socket.on("reaction-added", (data: ApiReactionDelta) => {
+      seen(data.seq);
+      setMessages((prev) =>
+        prev.map((m) =>
+          m.id === data.message_id ? { ...m, reactions: applyReactionDelta(m.reactions, data) } : m
+        )
+      );
     });
 
     return () => {
       socket.disconnect();
     };
-  }, [loadMessages]);
+  }, []);
+
+  /* Socket rooms: events are only delivered to the current channel's room */
+  useEffect(() => {
+    const socket = socketRef.current;
+    if (!socket || !currentChannel) return;
+
+    let connectedBefore = socket.connected;
+    const joinRooms = () => {
+      socket.emit("switch_channel", {
+        workspace_id: workspaceId,
+        channel_id: currentChannel.id,
+      });
+    };
+    const onConnect = () => {
+      if (!connectedBefore) {
+        connectedBefore = true;
+        joinRooms();
+        return;
+      }
+      // Reconnect: the server replays missed events from memory when it can,
+      // otherwise fetch just the changes since the last seq
+      socket.emit(
+        "switch_channel",
+        {
+          workspace_id: workspaceId,
+          channel_id: currentChannel.id,
+          since: channelSeqRef.current,
+        },
+        (ack?: { resumed: boolean }) => {
+          if (!ack?.resumed) syncChanges();
+        }
+      );
+    };
+
+    if (socket.connected) joinRooms();
+    socket.on("connect", onConnect);
+
+    return () => {
+      socket.off("connect", onConnect);
+    };
+  }, [currentChannel, workspaceId, syncChanges]);
+
+  /* Presence: identify this socket and report idle / active */
+  const currentUserId = currentUser?.id;
+  useEffect(() => {
+    const socket = socketRef.current;
+    if (!socket || !currentUserId) return;
+
+    const sendHeartbeat = () => {
+      socket.emit("heartbeat", {
+        user_id: currentUserId,
+        idle: document.visibilityState === "hidden",
+      });
+    };
+
+    if (socket.connected) sendHeartbeat();
+    socket.on("connect", sendHeartbeat);
+    document.addEventListener("visibilitychange", sendHeartbeat);
+    const interval = window.setInterval(sendHeartbeat, 60_000);
+
+    return () => {
+      socket.off("connect", sendHeartbeat);
+      document.removeEventListener("visibilitychange", sendHeartbeat);
+      window.clearInterval(interval);
+    };
+  }, [currentUserId]);
 
   /* Send Message */
   const handleSendMessage = async () => {
@@ -492,6 +720,7 @@ export default function TeamChannelInterface({
         content: rawContent,
         channel_id: currentChannel.id,
         user_id: currentUser.id,
+        attachment_id: attachment?.id,
       }),
     });
 
@@ -1280,6 +1509,19 @@ export default function TeamChannelInterface({
               ref={messageScrollRef}
               className="relative flex-1 overflow-y-auto px-3 py-4 space-y-3 sm:px-4 sm:space-y-4"
             >
+              {olderCursor && (
+                <div className="flex justify-center">
+                  <Button
+                    variant="outline"
+                    size="sm"
+                    onClick={loadOlderMessages}
+                    disabled={loadingOlder}
+                  >
+                    {loadingOlder && <Loader2 className="w-4 h-4 mr-2 animate-spin" />}
+                    Load older messages
+                  </Button>
+                </div>
+              )}
               {messages.map((message) => (
                 <div key={message.id} className="flex gap-3 group relative">
                   <img
@@ -57,6 +57,8 @@ export interface JoinWorkspaceResponse {
 
 export interface DeleteWorkspaceResponse {
   success: boolean;
+  job_id: string;
+  status: "pending" | "running" | "completed" | "failed";
 }
 
 /* ------------------------- API FUNCTIONS ------------------------- */